@@ -1,7 +1,42 @@
-from .ordbok import Ordbok
-from .config_file import ConfigFile
-from .config_env import ConfigEnv
-from .config_private import PrivateConfigFile
+import sys
+from importlib import import_module
 
 
-__all__ = ["Ordbok", "ConfigFile", "ConfigEnv", "PrivateConfigFile"]
+# the module each public name is defined in, which is only imported when
+# the name is first used, so that importing ordbok stays fast
+_EXPORTS = {
+    'Ordbok': '.ordbok',
+    'ConfigFile': '.config_file',
+    'ConfigEnv': '.config_env',
+    'PrivateConfigFile': '.config_private',
+    'ConfigSource': '.config_source',
+    'HTTPSource': '.config_source',
+    'ConsulSource': '.config_source',
+    'SQLiteSource': '.config_source',
+    'Schema': '.schema',
+    'Field': '.schema',
+}
+
+__all__ = ["Ordbok", "ConfigFile", "ConfigEnv", "PrivateConfigFile",
+           "ConfigSource", "HTTPSource", "ConsulSource", "SQLiteSource",
+           "Schema", "Field"]
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(
+            'module {!r} has no attribute {!r}'.format(__name__, name))
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+if sys.version_info < (3, 7):
+    # module __getattr__ (PEP 562) is not supported, so import eagerly
+    for _name in __all__:
+        __getattr__(_name)
+    del _name
@@ -0,0 +1,136 @@
+import hmac
+import struct
+import hashlib
+from . import serialize
+from .util import create_config_file, replace_file
+from .config_env import ConfigEnv
+from .lookup import ConfigFileLookup
+from .crypto import FORMAT_ORDBOK, encrypt, decrypt
+from .exceptions import OrdbokArtifactException
+
+
+ARTIFACT_VERSION = 1
+# magic, version, flags
+_HEADER = struct.Struct('>8sBB')
+_MAGIC = b'ORDBOKAR'
+_ENCRYPTED = 1
+
+
+def _env_references(config_env):
+    '''
+    The references earlier files made to the environment, as
+    `(key, reference)`, so they can be made again when loading.
+    '''
+    references = []
+    for key in config_env.required_keys:
+        reference = config_env.keyword
+        if key in config_env.keyword_lookup:
+            reference = '{}_{}'.format(
+                config_env.keyword, config_env.keyword_lookup[key])
+        references.append((key, reference))
+    return references
+
+
+def build_artifact(config, password=None, kdf=None, kdf_params=None):
+    '''
+    Load the config files of `config` (an unloaded `Ordbok`) and return
+    the resolved config as an artifact for `Ordbok.from_artifact`, which
+    is encrypted with `password` if it is given.
+
+    The environment is not read: the references to it are stored instead,
+    so it is applied on top of the config (and its required keys checked)
+    when the artifact is loaded. `PRIVATE_KEY_ORDBOK` is never stored.
+    '''
+    config._start_load()
+    config._init_config_files(
+        [create_config_file(f) for f in config.config_files])
+    lookup = ConfigFileLookup((f.keyword, f) for f in config.config_files)
+    references = []
+    for config_file in config.config_files:
+        if isinstance(config_file, ConfigEnv):
+            references = _env_references(config_file)
+        else:
+            config_file.load(lookup)
+    config.materialize()
+
+    values = dict(config)
+    values.pop('PRIVATE_KEY_ORDBOK', None)
+    environment = values.pop('ENVIRONMENT')
+    body = serialize.dumps({
+        'namespace': config.namespace,
+        'environment': environment,
+        'config': values,
+        'env': [list(reference) for reference in references],
+    })
+    if password:
+        return _HEADER.pack(_MAGIC, ARTIFACT_VERSION, _ENCRYPTED) + encrypt(
+            password, body, file_format=FORMAT_ORDBOK, kdf=kdf,
+            kdf_params=kdf_params, key_cache=config.key_cache)
+    header = _HEADER.pack(_MAGIC, ARTIFACT_VERSION, 0)
+    return header + hashlib.sha256(header + body).digest() + body
+
+
+def write_artifact(config, path, password=None, **kwargs):
+    '''
+    Write the artifact built by `build_artifact` to `path`, atomically and
+    readable only by its owner.
+    '''
+    replace_file(path, build_artifact(config, password, **kwargs))
+
+
+def read_artifact(data, password=None, key_cache=None, location=None):
+    '''
+    Check and decode an artifact, decrypting it with `password` if it is
+    encrypted, and return its content.
+    '''
+    try:
+        magic, version, flags = _HEADER.unpack_from(data)
+    except struct.error:
+        raise OrdbokArtifactException(location, 'missing header')
+    if magic != _MAGIC:
+        raise OrdbokArtifactException(location, 'not an ordbok artifact')
+    if version != ARTIFACT_VERSION:
+        raise OrdbokArtifactException(
+            location, 'unsupported version {}, please upgrade ordbok'.format(
+                version))
+    payload = data[_HEADER.size:]
+    if flags & _ENCRYPTED:
+        if not password:
+            raise OrdbokArtifactException(
+                location, 'the artifact is encrypted but no key was given')
+        body = decrypt(password, payload, key_cache)
+    else:
+        digest, body = payload[:32], payload[32:]
+        expected = hashlib.sha256(data[:_HEADER.size] + body).digest()
+        if not hmac.compare_digest(digest, expected):
+            raise OrdbokArtifactException(location, 'integrity check failed')
+    try:
+        return serialize.loads(body)
+    except (ValueError, EOFError, TypeError):
+        raise OrdbokArtifactException(location, 'corrupt content')
+
+
+def load_artifact(config, path, password=None):
+    '''
+    Load `config` (an unloaded `Ordbok`) from the artifact at `path`. Only
+    the environment is read on top of it, so a key set in the environment
+    still overrides the artifact. See `Ordbok.from_artifact`.
+    '''
+    if config.loaded:
+        raise Exception('Ordbok instance can only be loaded once.')
+    with open(path, 'rb') as f:
+        data = f.read()
+    content = read_artifact(
+        data, password or config._private_file_key(), config.key_cache,
+        path)
+    config.namespace = content['namespace']
+    config['ENVIRONMENT'] = content['environment']
+    config.update(content['config'])
+    config._env_references = [tuple(r) for r in content['env']]
+    config.config_files = []
+    # the artifact's values are the defaults every reload starts from, and
+    # the environment is the only config file
+    if config._start_load():
+        config._load_config_files([])
+        config._finish_load()
+    return config
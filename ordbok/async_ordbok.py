@@ -0,0 +1,55 @@
+import asyncio
+import functools
+import timeit
+from .ordbok import Ordbok
+from .config_env import ConfigEnv
+from .util import create_config_file, prefetch_config_file
+
+
+class AsyncOrdbok(Ordbok):
+    '''
+    An `Ordbok` which is loaded with `await config.load()`, for use in
+    asyncio applications. Every config file is read, decrypted and parsed
+    concurrently in `executor` (the event loop's default thread pool if it
+    is None, or e.g. a `concurrent.futures.ProcessPoolExecutor`), then the
+    results are applied in order in a worker thread, exactly as with
+    `Ordbok(parallel=...)`, so the event loop is never blocked on loading.
+    '''
+    def __init__(self, executor=None, **kwargs):
+        self.executor = executor
+        super(AsyncOrdbok, self).__init__(**kwargs)
+
+    async def load(self):
+        if self._start_load():
+            await self._load_config_files_async(
+                [create_config_file(f) for f in self.config_files])
+            self._finish_load()
+
+    async def _load_config_files_async(self, config_files):
+        loop = asyncio.get_running_loop()
+        report, start = self._init_config_files(config_files)
+        await asyncio.gather(*[
+            self._prefetch_config_file(loop, f) for f in self.config_files
+            if not isinstance(f, ConfigEnv)])
+        if report:
+            report.prefetch = timeit.default_timer() - start
+        # files whose prefetched result is stale are loaded again in order,
+        # which can mean decrypting them, so this is kept off the loop too
+        await loop.run_in_executor(None, functools.partial(
+            self._apply_config_files, report, start))
+
+    async def _prefetch_config_file(self, loop, config_file):
+        try:
+            config_file._prefetched = await loop.run_in_executor(
+                self.executor, prefetch_config_file, config_file)
+        except Exception:
+            # raised again, in order, when the file is applied
+            pass
+
+    async def reload(self):
+        '''
+        `Ordbok.reload` run in a worker thread, returning its `ConfigDiff`.
+        Subscribers are called from that thread.
+        '''
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._reload)
@@ -0,0 +1,324 @@
+import os
+import glob
+import base64
+import hashlib
+from collections import namedtuple
+from .ordbok import Ordbok
+from .config_private import PrivateConfigFile, open_wrapper
+from .crypto import (
+    FORMAT_SIMPLECRYPT, FORMAT_ORDBOK, detect_format, read_header,
+    ordbok_header, derive_key, to_bytes)
+from .util import replace_file
+from .exceptions import OrdbokException
+
+
+PRIVATE_SUFFIX = '.private'
+
+BatchResult = namedtuple('BatchResult', ['path', 'status', 'error'])
+
+CREATED = 'created'
+UP_TO_DATE = 'up to date'
+REKEYED = 'rekeyed'
+MIGRATED = 'migrated'
+FAILED = 'failed'
+
+
+def expand_paths(patterns):
+    '''
+    The (decrypted) paths of the private config files given by `patterns`:
+    file names, with or without `.private`, glob patterns and directories
+    (for every `.private` file in them), in order and without duplicates.
+    '''
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(glob.glob(
+                os.path.join(pattern, '*' + PRIVATE_SUFFIX)))
+        elif glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+        else:
+            matches = [pattern]
+        for path in matches:
+            if path.endswith(PRIVATE_SUFFIX):
+                path = path[:-len(PRIVATE_SUFFIX)]
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def _digest(content):
+    return hashlib.sha256(to_bytes(content)).digest()
+
+
+def _read(path, mode='rb'):
+    try:
+        with open_wrapper(path, mode) as f:
+            return f.read()
+    except IOError:
+        return None
+
+
+class PrivateFileBatch(object):
+    '''
+    Encrypt, decrypt, rekey or migrate many private config files with
+    `password`, in a pool of up to `workers` threads (or serially, for one
+    worker or where `concurrent.futures` is not available). Keys are
+    derived once per salt: every file encrypted in the `ordbok` format by
+    a batch shares one salt (with its own nonce), so encrypting a batch
+    derives a single key, and keys for the files a batch reads are derived
+    before they are processed.
+
+    Outputs are written atomically and only if they are out of date, by
+    comparing the content hash of the new output with what the existing
+    output decrypts to (or contains). Inputs are removed afterwards
+    unless `keep` is set, as with single files.
+
+    `file_format`, `kdf` and `kdf_params` of None keep those of each file
+    when rekeying. Files are encrypted in the `simplecrypt` format if
+    `file_format` is None.
+    '''
+    def __init__(self, password, file_format=None, kdf=None,
+                 kdf_params=None, index=False, workers=None, keep=False):
+        self.file_format = file_format
+        self.encrypt_format = file_format or FORMAT_SIMPLECRYPT
+        self.kdf = kdf
+        self.kdf_params = kdf_params
+        self.index = index
+        self.workers = workers
+        self.keep = keep
+        self.config = Ordbok(config_dir='', include_env=False)
+        self.config['PRIVATE_KEY_ORDBOK'] = password
+        self.header = None
+        if self.encrypt_format == FORMAT_ORDBOK:
+            self.header = ordbok_header(kdf, kdf_params)
+
+    @property
+    def password(self):
+        return self.config['PRIVATE_KEY_ORDBOK']
+
+    def _private_config_file(self, path, config=None, **kwargs):
+        options = dict(file_format=self.encrypt_format, kdf=self.kdf,
+                       kdf_params=self.kdf_params, index=self.index)
+        options.update(kwargs)
+        private_config_file = PrivateConfigFile(path, **options)
+        private_config_file.init_config(config or self.config)
+        return private_config_file
+
+    def _map(self, func, items):
+        workers = self.workers or min(len(items), 8)
+        if workers > 1:
+            try:
+                from concurrent import futures
+            except ImportError:  # Python 2 without the futures backport
+                futures = None
+            if futures is not None:
+                with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+                    return list(pool.map(func, items))
+        return [func(item) for item in items]
+
+    def _derive_keys(self, contents, new_headers=()):
+        '''
+        Derive the keys for the ordbok format `contents` (and for
+        `new_headers`, which files will be encrypted with) up front, once
+        for each distinct salt, so workers don't derive them concurrently.
+        '''
+        headers = []
+        for content in contents:
+            if content and detect_format(content) == FORMAT_ORDBOK:
+                try:
+                    header = read_header(content)[0]
+                except OrdbokException:
+                    continue
+                headers.append((self.config, header))
+        headers.extend(new_headers)
+        unique = {}
+        for config, header in headers:
+            unique[(id(config), header.get('salt'),
+                    repr(header.get('kdf_params')), header.get('kdf'),
+                    header.get('cipher'))] = (config, header)
+
+        def derive(item):
+            config, header = item
+            try:
+                derive_key(config['PRIVATE_KEY_ORDBOK'], header,
+                           config.key_cache)
+            except (OrdbokException, KeyError):
+                pass
+        self._map(derive, list(unique.values()))
+
+    def _run(self, paths, func, new_headers=()):
+        private_config_files = [self._private_config_file(path)
+                                for path in paths]
+        self._derive_keys(
+            [_read(f.config_file_path + PRIVATE_SUFFIX)
+             for f in private_config_files], new_headers)
+
+        def run(private_config_file):
+            try:
+                status = func(private_config_file)
+            except Exception as e:
+                return BatchResult(private_config_file.filename, FAILED, e)
+            return BatchResult(private_config_file.filename, status, None)
+        return self._map(run, private_config_files)
+
+    def encrypt(self, paths):
+        '''
+        Encrypt the files at `paths` (see `expand_paths`) to `.private`
+        files, returning a `BatchResult` for each.
+        '''
+        new_headers = []
+        if self.header is not None:
+            new_headers.append((self.config, self.header))
+        return self._run(paths, self._encrypt_file, new_headers)
+
+    def decrypt(self, paths):
+        '''
+        Decrypt the `.private` files of `paths`, returning a `BatchResult`
+        for each.
+        '''
+        return self._run(paths, self._decrypt_file)
+
+    def rekey(self, paths, new_password):
+        '''
+        Re-encrypt the `.private` files of `paths` from the batch's password
+        to `new_password` in memory, without writing the decrypted content
+        to disk, returning a `BatchResult` for each. Each file is decrypted
+        with `new_password` and compared with the original before it is
+        atomically replaced, so a failed file is left as it was.
+        '''
+        new_config = Ordbok(config_dir='', include_env=False)
+        new_config['PRIVATE_KEY_ORDBOK'] = new_password
+        return self._reencrypt(paths, new_config, self.file_format, REKEYED)
+
+    def migrate(self, paths):
+        '''
+        Re-encrypt the `.private` files of `paths` in the `ordbok` format,
+        with the batch's password, in memory and checked as with `rekey`,
+        returning a `BatchResult` for each.
+        '''
+        return self._reencrypt(paths, self.config, FORMAT_ORDBOK, MIGRATED)
+
+    def _reencrypt(self, paths, new_config, file_format, status):
+        private_config_files = [self._private_config_file(path)
+                                for path in paths]
+        encrypted = [_read(f.config_file_path + PRIVATE_SUFFIX)
+                     for f in private_config_files]
+
+        # files of the same format and kdf share a new salt
+        new_headers = {}
+        for content in encrypted:
+            options = self._rekey_options(content, file_format)
+            if options and options['file_format'] == FORMAT_ORDBOK:
+                group = repr((options['kdf'], options['kdf_params']))
+                if group not in new_headers:
+                    new_headers[group] = ordbok_header(
+                        options['kdf'], options['kdf_params'])
+        self._derive_keys(encrypted, [
+            (new_config, header) for header in new_headers.values()])
+
+        def run(item):
+            private_config_file, content = item
+            try:
+                self._rekey_file(private_config_file, content, new_config,
+                                 new_headers, file_format)
+            except Exception as e:
+                return BatchResult(private_config_file.filename, FAILED, e)
+            return BatchResult(private_config_file.filename, status, None)
+        return self._map(run, list(zip(private_config_files, encrypted)))
+
+    def _rekey_options(self, content, file_format=None):
+        '''
+        The format, kdf and index of a file re-encrypted from `content`:
+        `file_format` and the batch's kdf and index, or the file's own
+        where those are None.
+        '''
+        if content is None:
+            return None
+        try:
+            content_format = detect_format(content)
+            header = {}
+            if content_format == FORMAT_ORDBOK:
+                header = read_header(content)[0]
+        except OrdbokException:
+            return None
+        options = dict(file_format=file_format or content_format,
+                       kdf=self.kdf, kdf_params=self.kdf_params,
+                       index=self.index or 'index' in header)
+        if self.kdf is None and self.kdf_params is None and header:
+            options['kdf'] = header['kdf']
+            options['kdf_params'] = header['kdf_params']
+        if options['file_format'] == FORMAT_ORDBOK:
+            options['kdf_params'] = ordbok_header(
+                options['kdf'], options['kdf_params'])['kdf_params']
+        return options
+
+    def _rekey_file(self, private_config_file, encrypted, new_config,
+                    new_headers, file_format=None):
+        path = private_config_file.config_file_path + PRIVATE_SUFFIX
+        if encrypted is None:
+            private_config_file._load_encrypted_file()
+        content = private_config_file._decrypt_content(encrypted)
+        options = self._rekey_options(encrypted, file_format)
+        new_file = self._private_config_file(
+            private_config_file.filename, config=new_config, **options)
+        salt = None
+        if options['file_format'] == FORMAT_ORDBOK:
+            group = repr((options['kdf'], options['kdf_params']))
+            salt = base64.b64decode(new_headers[group]['salt'])
+        rekeyed = new_file._encrypt_content(content, salt=salt)
+        if _digest(new_file._decrypt_content(rekeyed)) != _digest(content):
+            raise OrdbokException(
+                '{} did not decrypt to its original content'.format(path))
+        replace_file(path, rekeyed, mode=os.stat(path).st_mode & 0o777)
+
+    def _encrypt_up_to_date(self, private_config_file, content, encrypted):
+        if (encrypted is None or
+                detect_format(encrypted) != self.encrypt_format):
+            return False
+        if self.encrypt_format == FORMAT_ORDBOK:
+            header = read_header(encrypted)[0]
+            if (header['kdf'], header['kdf_params']) != (
+                    self.header['kdf'], self.header['kdf_params']):
+                return False
+            if bool(self.index) != ('index' in header):
+                return False
+        try:
+            decrypted = private_config_file._decrypt_content(encrypted)
+        except Exception:
+            return False
+        return _digest(decrypted) == _digest(content)
+
+    def _encrypt_file(self, private_config_file):
+        path = private_config_file.config_file_path
+        content = private_config_file._load_decrypted_file()
+        output = path + PRIVATE_SUFFIX
+        encrypted = _read(output)
+        if self._encrypt_up_to_date(private_config_file, content, encrypted):
+            status = UP_TO_DATE
+        else:
+            salt = None
+            if self.header is not None:
+                salt = base64.b64decode(self.header['salt'])
+            encrypted = private_config_file._encrypt_content(
+                content, salt=salt)
+            mode = 0o600
+            if os.path.exists(output):
+                mode = os.stat(output).st_mode & 0o777
+            replace_file(output, encrypted, mode=mode)
+            status = CREATED
+        if not self.keep:
+            os.remove(path)
+        return status
+
+    def _decrypt_file(self, private_config_file):
+        path = private_config_file.config_file_path
+        content = private_config_file._load_and_decrypt_file()
+        existing = _read(path)
+        if existing is not None and _digest(existing) == _digest(content):
+            status = UP_TO_DATE
+        else:
+            replace_file(path, to_bytes(content))
+            status = CREATED
+        if not self.keep:
+            os.remove(path + PRIVATE_SUFFIX)
+        return status
@@ -0,0 +1,77 @@
+import os
+import sys
+import errno
+import hashlib
+from . import serialize
+from .util import replace_file
+
+
+CACHE_VERSION = 1
+
+
+class ConfigCache(object):
+    '''
+    On disk cache of the environment section of parsed config files.
+
+    Entries are keyed on the config file's path, mtime, size and the hash
+    of its content, as well as the environment that was selected from it,
+    so any change to the file or to ENVIRONMENT invalidates them.
+    '''
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def _entry_path(self, config_file_path, environment):
+        name = hashlib.sha1(u'{}\0{}'.format(
+            config_file_path, environment).encode('utf8')).hexdigest()
+        return os.path.join(self.cache_dir, name + '.cache')
+
+    def _read_entry(self, entry_path):
+        try:
+            with open(entry_path, 'rb') as f:
+                return serialize.loads(f.read())
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return None
+
+    def _write_entry(self, entry_path, entry):
+        try:
+            data = serialize.dumps(entry)
+        except ValueError:
+            return
+        try:
+            os.makedirs(self.cache_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                return
+        try:
+            replace_file(entry_path, data)
+        except (IOError, OSError):
+            pass
+
+    def load(self, config_file):
+        '''
+        Return the selected environment section of `config_file`, parsing
+        and caching it if there is no valid entry. Returns None if the
+        config file does not exist.
+        '''
+        path = config_file.config_file_path
+        environment = config_file.config['ENVIRONMENT']
+        try:
+            stat = os.stat(path)
+            with open(path, 'rb') as f:
+                content = f.read()
+        except (IOError, OSError):
+            return None
+
+        loader = config_file.config.yaml_loader
+        key = [CACHE_VERSION, list(sys.version_info[:2]),
+               getattr(loader, '__name__', None), path,
+               stat.st_mtime, stat.st_size,
+               hashlib.sha256(content).hexdigest(), environment]
+        entry_path = self._entry_path(path, environment)
+        entry = self._read_entry(entry_path)
+        if entry and entry[0] == key:
+            return entry[1]
+
+        c = config_file._parse_environment(content)
+        self._write_entry(entry_path, [key, c])
+        return c
@@ -1,42 +1,262 @@
 from __future__ import print_function
 import os
+import sys
+import json
 import argparse
 from .ordbok import Ordbok
 from .config_private import PrivateConfigFile
+from .batch import PrivateFileBatch, expand_paths
+from .util import replace_file
+from .artifact import write_artifact
+from .crypto import (
+    FORMAT_SIMPLECRYPT, FORMAT_ORDBOK, KDF_DEFAULTS, KDF_PBKDF2)
 
 
-def main():
-    parser = argparse.ArgumentParser()
+def crypto_options():
+    # defaults are suppressed so the options can be given before or after
+    # the command without one overriding the other
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(
+        "--format", dest="file_format", default=argparse.SUPPRESS,
+        choices=[FORMAT_SIMPLECRYPT, FORMAT_ORDBOK],
+        help="The format of the encrypted file written by `encrypt`. "
+             "`migrate` always writes the `ordbok` format.")
     parser.add_argument(
-        "command",
-        help="Available commands are `encrpyt` or `decrypt`.")
+        "--kdf", choices=sorted(KDF_DEFAULTS.keys()),
+        default=argparse.SUPPRESS,
+        help="The key derivation function used by the `ordbok` format.")
     parser.add_argument(
-        "file",
-        help=("The file to be encrypted or decrypted. the `.private` can be "
-              "left off when decrypting."))
+        "--iterations", type=int, default=argparse.SUPPRESS,
+        help="The number of iterations used by the pbkdf2-sha256 kdf.")
     parser.add_argument(
-        "key",
-        help="The key used to encrypt or decrypt the file.")
+        "--index", action="store_true", default=argparse.SUPPRESS,
+        help="Store the names (but not values) of the file's keys "
+             "unencrypted in the `ordbok` format header, so that lazy "
+             "loads can defer decrypting it.")
+    return parser
 
-    args = parser.parse_args()
 
-    filename = args.file
+def config_options():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(
+        "--config-dir", default="config",
+        help="The directory of the config files (default: config).")
+    parser.add_argument(
+        "--config-file", dest="config_files", action="append",
+        help="A config file to load, in order (default: config.yml and "
+             "local_config.yml).")
+    parser.add_argument(
+        "--private-config-file", dest="config_files", action="append",
+        type=PrivateConfigFile,
+        help="A private config file to load, in order with --config-file.")
+    parser.add_argument(
+        "--namespace", default="ordbok", help="The Ordbok namespace.")
+    parser.add_argument(
+        "--no-env", action="store_true",
+        help="Don't load config from the OS environment.")
+    return parser
+
 
-    private_config_file = PrivateConfigFile(filename)
-    ordbok = Ordbok(custom_config_class=[private_config_file], config_dir='')
-    ordbok['PRIVATE_KEY_ORDBOK'] = args.key
-    private_config_file.init_config(ordbok)
+def config_from_args(args, **kwargs):
+    return Ordbok(config_files=args.config_files, config_dir=args.config_dir,
+                  namespace=args.namespace, include_env=not args.no_env,
+                  **kwargs)
 
+
+def kdf_options(parser, args):
+    kdf = getattr(args, 'kdf', None)
+    kdf_params = None
+    if getattr(args, 'iterations', None):
+        if kdf not in (None, KDF_PBKDF2):
+            parser.error('--iterations can only be used with the {} kdf'
+                         ''.format(KDF_PBKDF2))
+        kdf, kdf_params = KDF_PBKDF2, {'iterations': args.iterations}
+    return kdf, kdf_params
+
+
+def report(results, suffix=''):
+    for result in results:
+        if result.error is not None:
+            print('{}{} failed: {!r}'.format(
+                result.path, suffix, result.error), file=sys.stderr)
+        else:
+            print('{}{} {}'.format(result.path, suffix, result.status))
+    if any(result.error is not None for result in results):
+        sys.exit(1)
+
+
+def crypto_command(parser, args):
+    kdf, kdf_params = kdf_options(parser, args)
+    paths = expand_paths(args.files)
+    if not paths:
+        parser.error('no private config files found')
+    batch = PrivateFileBatch(
+        args.key, file_format=getattr(args, 'file_format', FORMAT_SIMPLECRYPT),
+        kdf=kdf, kdf_params=kdf_params, index=getattr(args, 'index', False),
+        workers=args.workers, keep=args.keep)
     if args.command == "encrypt":
-        private_config_file._save_encrypted_file()
-        os.remove(private_config_file.config_file_path)
-        print('{}.private created'.format(private_config_file.filename))
-    elif args.command == "decrypt":
-        private_config_file._save_decrypted_file()
-        os.remove(private_config_file.config_file_path+'.private')
-        print('{} created'.format(filename))
+        report(batch.encrypt(paths), '.private')
     else:
-        print('unknown command')
+        report(batch.decrypt(paths))
+
+
+def rekey_command(parser, args):
+    kdf, kdf_params = kdf_options(parser, args)
+    paths = expand_paths(args.files)
+    if not paths:
+        parser.error('no private config files found')
+    batch = PrivateFileBatch(
+        args.key, file_format=getattr(args, 'file_format', None), kdf=kdf,
+        kdf_params=kdf_params, index=getattr(args, 'index', False),
+        workers=args.workers)
+    report(batch.rekey(paths, args.new_key), '.private')
+
+
+def migrate_command(parser, args):
+    kdf, kdf_params = kdf_options(parser, args)
+    paths = expand_paths(args.files)
+    if not paths:
+        parser.error('no private config files found')
+    batch = PrivateFileBatch(
+        args.key, kdf=kdf, kdf_params=kdf_params,
+        index=getattr(args, 'index', False), workers=args.workers)
+    report(batch.migrate(paths), '.private')
+
+
+def explain_command(parser, args):
+    ordbok = config_from_args(args, provenance=True)
+    if args.environment:
+        ordbok['ENVIRONMENT'] = args.environment.lower()
+    ordbok.load()
+    explanation = ordbok.explain(args.key)
+    print(explanation)
+    if not explanation.origins:
+        sys.exit(1)
+
+
+def compile_command(parser, args):
+    compiled = config_from_args(args).compile_environments(args.environments)
+    if not args.output_dir:
+        json.dump(compiled, sys.stdout, indent=2, sort_keys=True,
+                  default=str)
+        print()
+        return
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+    for environment, config in sorted(compiled.items()):
+        path = os.path.join(args.output_dir, '{}.json'.format(environment))
+        # may contain decrypted private config, so only the owner can
+        # read it
+        replace_file(path, json.dumps(
+            config, indent=2, sort_keys=True, default=str).encode('utf8'))
+        print('{} created'.format(path))
+
+
+def build_command(parser, args):
+    config = config_from_args(args)
+    if args.environment:
+        config['ENVIRONMENT'] = args.environment.lower()
+    password = None
+    if args.encrypt:
+        password = config.private_file_key
+    kdf, kdf_params = kdf_options(parser, args)
+    write_artifact(config, args.output, password, kdf=kdf,
+                   kdf_params=kdf_params)
+    print('{} created'.format(args.output))
+
+
+def main():
+    parser = argparse.ArgumentParser(parents=[crypto_options()])
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+    for command, help, func in [
+            ("encrypt", "Encrypt private config files.", crypto_command),
+            ("decrypt", "Decrypt private config files.", crypto_command),
+            ("migrate", "Re-encrypt private config files in the `ordbok` "
+                        "format.", migrate_command)]:
+        command_parser = commands.add_parser(
+            command, help=help, parents=[crypto_options()])
+        command_parser.add_argument(
+            "files", nargs="+", metavar="file",
+            help=("The files to be encrypted or decrypted, as names, glob "
+                  "patterns or directories (for every `.private` file in "
+                  "them). The `.private` can be left off when decrypting."))
+        command_parser.add_argument(
+            "key",
+            help="The key used to encrypt or decrypt the files.")
+        command_parser.set_defaults(func=func)
+        command_parser.add_argument(
+            "--workers", type=int,
+            help="The number of files to process at once.")
+        if func is crypto_command:
+            command_parser.add_argument(
+                "--keep", action="store_true",
+                help="Keep the input files rather than removing them.")
+
+    rekey_parser = commands.add_parser(
+        "rekey", parents=[crypto_options()],
+        help="Re-encrypt private config files with a new key, without "
+             "writing them decrypted to disk.")
+    rekey_parser.add_argument(
+        "files", nargs="+", metavar="file",
+        help="The files to be re-encrypted, as names, glob patterns or "
+             "directories.")
+    rekey_parser.add_argument(
+        "key", help="The key the files are encrypted with.")
+    rekey_parser.add_argument(
+        "new_key", help="The key to re-encrypt the files with.")
+    rekey_parser.add_argument(
+        "--workers", type=int,
+        help="The number of files to process at once.")
+    rekey_parser.set_defaults(func=rekey_command)
+
+    explain_parser = commands.add_parser(
+        "explain", parents=[config_options()],
+        help="Show where a config key was set and what it overrode.")
+    explain_parser.add_argument("key", help="The config key to explain.")
+    explain_parser.add_argument(
+        "--environment",
+        help="The environment to load (default: $ORDBOK_ENVIRONMENT or "
+             "development).")
+    explain_parser.set_defaults(func=explain_command)
+
+    compile_parser = commands.add_parser(
+        "compile", parents=[config_options()],
+        help="Resolve the config for many environments, reading each "
+             "config file once, and write it as JSON.")
+    compile_parser.add_argument(
+        "--environment", dest="environments", action="append",
+        help="An environment to resolve (default: every environment with "
+             "a section in the config files).")
+    compile_parser.add_argument(
+        "--output-dir",
+        help="Write each environment's config to <environment>.json in "
+             "this directory, rather than all of them to stdout.")
+    compile_parser.set_defaults(func=compile_command)
+
+    build_parser = commands.add_parser(
+        "build", parents=[config_options()],
+        help="Load the config for an environment and write it as an "
+             "artifact for `Ordbok.from_artifact`.")
+    build_parser.add_argument(
+        "output", help="The path to write the artifact to.")
+    build_parser.add_argument(
+        "--environment",
+        help="The environment to build (default: $ORDBOK_ENVIRONMENT or "
+             "development).")
+    build_parser.add_argument(
+        "--encrypt", action="store_true",
+        help="Encrypt the artifact with PRIVATE_KEY_ORDBOK.")
+    build_parser.add_argument(
+        "--kdf", choices=sorted(KDF_DEFAULTS.keys()),
+        help="The key derivation function used to encrypt the artifact.")
+    build_parser.add_argument(
+        "--iterations", type=int,
+        help="The number of iterations used by the pbkdf2-sha256 kdf.")
+    build_parser.set_defaults(func=build_command)
+
+    args = parser.parse_args()
+    args.func(parser, args)
 
 
 if __name__ == "__main__":
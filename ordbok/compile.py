@@ -0,0 +1,153 @@
+import copy
+import six
+from .util import create_config_file
+from .config_env import ConfigEnv
+from .config_source import ConfigSource
+from .lookup import ConfigFileLookup
+from .schema import as_schema
+
+
+def share_value(value, candidates):
+    '''
+    Return `value`, or an equal value from `candidates` if there is one.
+    Otherwise dicts are rebuilt with their values shared in the same way
+    with the candidates' values for the same key, so subtrees which are
+    the same in several configs are stored once.
+    '''
+    for candidate in candidates:
+        if type(candidate) is type(value) and candidate == value:
+            return candidate
+    if isinstance(value, dict):
+        candidates = [c for c in candidates if isinstance(c, dict)]
+        if candidates:
+            return dict(
+                (key, share_value(v, [c[key] for c in candidates
+                                      if key in c]))
+                for key, v in six.iteritems(value))
+    return value
+
+
+def _is_sectioned(document):
+    return bool(document) and all(
+        isinstance(value, dict) for value in document.values())
+
+
+class EnvironmentCompiler(object):
+    '''
+    Resolve the config of `config` (an unloaded or loaded `Ordbok`, whose
+    config files and options are used) for many environments at once.
+
+    Each config file is read, decrypted and parsed once (or once per
+    distinct `PRIVATE_KEY_ORDBOK`, if environments set it differently),
+    and every environment is then resolved from the parsed documents with
+    the usual precedence, reference and required key checks. Config
+    sources are fetched for each environment, as they are queried per
+    environment.
+    '''
+    def __init__(self, config):
+        self.config = config
+        self.config_files = [
+            create_config_file(f) for f in config.config_files
+            if not isinstance(f, ConfigEnv)]
+        # (index of the config file, private key) -> (content, parsed
+        # document)
+        self._documents = {}
+
+    def _defaults(self):
+        defaults = dict(getattr(self.config, '_defaults', self.config))
+        defaults.pop('ENVIRONMENT', None)
+        return defaults
+
+    def _stage(self, environment):
+        staged = copy.copy(self.config)
+        dict.clear(staged)
+        staged.update(self._defaults())
+        staged['ENVIRONMENT'] = environment
+        staged.lazy = staged.streaming = staged.instrument = False
+        staged.shared = False
+        staged.config_cache = None
+        staged.provenance = False
+        staged._subscribers = []
+        staged._watchers = []
+        staged._schema = as_schema(self.config.schema)
+        return staged
+
+    def _read(self, index, config_file):
+        cache_key = (index, config_file.config._private_file_key())
+        if cache_key not in self._documents:
+            content = document = config_file._read_content()
+            if content is not None:
+                document = config_file._parse_yaml(content)
+            self._documents[cache_key] = (content, document)
+        return self._documents[cache_key]
+
+    def _document(self, index, config_file):
+        return self._read(index, config_file)[1]
+
+    def environments(self):
+        '''
+        The environments with a section in any config file whose top
+        level values are all sections (dicts), lowercased. Sections merged
+        into (or aliased from) other sections, like a `COMMON: &common`
+        section included with `<<: *common`, are not environments.
+        '''
+        from .parser import merged_sections
+        environments = []
+        staged = self._stage(self.config.default_environment)
+        for index, config_file in enumerate(self._config_files(staged)):
+            if isinstance(config_file, (ConfigEnv, ConfigSource)):
+                continue
+            try:
+                content, document = self._read(index, config_file)
+            except Exception:
+                # e.g. a private config file whose key isn't set yet
+                continue
+            if _is_sectioned(document):
+                merged = merged_sections(content, self.config.yaml_loader)
+                for section in document:
+                    if section in merged:
+                        continue
+                    if section.lower() not in environments:
+                        environments.append(section.lower())
+        return environments
+
+    def _config_files(self, staged):
+        staged._init_config_files([copy.copy(f) for f in self.config_files])
+        return staged.config_files
+
+    def resolve(self, environment):
+        '''
+        The config for `environment`, as a plain dict.
+        '''
+        staged = self._stage(environment)
+        config_files = self._config_files(staged)
+        lookup = ConfigFileLookup((f.keyword, f) for f in config_files)
+        staged._errors = [] if staged._schema is not None else None
+        for index, config_file in enumerate(config_files):
+            if not (isinstance(config_file, (ConfigEnv, ConfigSource)) or
+                    config_file._skip_environment()):
+                document = self._document(index, config_file)
+                config_file._prefetched = (
+                    config_file._load_context(), None,
+                    config_file._select_environment(document))
+            config_file.load(lookup)
+        staged._apply_schema()
+        return dict(staged)
+
+    def compile(self, environments=None):
+        '''
+        Return a dict of each of `environments` (every environment found
+        by `environments()` if None) to its config. Values (and subtrees
+        of nested dicts) which are equal in several environments are
+        shared between them.
+        '''
+        if environments is None:
+            environments = self.environments()
+        compiled = {}
+        for environment in environments:
+            config = self.resolve(environment.lower())
+            compiled[environment.lower()] = dict(
+                (key, share_value(value, [c[key] for c in compiled.values()
+                                          if key in c]))
+                for key, value in six.iteritems(config))
+        return compiled
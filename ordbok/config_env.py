@@ -1,16 +1,19 @@
 import os
-import yaml
 from .config_file import ConfigFile
 from .exceptions import OrdbokTargetedEnvKeyException
 
 
 class ConfigEnv(ConfigFile):
-    def __init__(self, config):
+    def __init__(self, config, declared_only=False):
         self.config = config
+        self.declared_only = declared_only
         self.keyword = '{}_env_config'.format(self.config.namespace)
         self.required_keys = []
         self.keyword_lookup = {}
         self.loaded = False
+        # targeted keys whose environment variable was not set, which have
+        # been reported already
+        self._unset_keys = set()
 
     def add_required_key(self, key, value):
         if value == self.keyword:
@@ -19,24 +22,54 @@ class ConfigEnv(ConfigFile):
             self.keyword_lookup[key] = value.replace(self.keyword+'_', '')
             self.required_keys.append(key)
 
-    def _load(self):
-        environ = {
-            key.replace(self.config.namespace.upper()+'_', ''): value
+    def _environ(self):
+        prefix = self.config.namespace.upper()
+        if self.declared_only:
+            # only look up the keys earlier files declared with
+            # `<namespace>_env_config`, rather than sweeping os.environ
+            keys = [key for key in self.required_keys
+                    if key not in self.keyword_lookup]
+            environ = {key: os.environ.get(u'{}_{}'.format(prefix, key))
+                       for key in keys}
+            return {key: value for key, value in environ.items() if value}
+        return {
+            key.replace(prefix+'_', ''): value
             for key, value in os.environ.items() if value and
-            key.startswith(self.config.namespace.upper())}
-        for key, value in environ.items():
-            self.config[key] = yaml.load(value)
+            key.startswith(prefix)}
+
+    def _load_content(self):
+        from .parser import load_scalar
+        yaml_loader = self.config.yaml_loader
+        self._unset_keys = set()
+        c = dict((key, load_scalar(value, yaml_loader))
+                 for key, value in self._environ().items())
 
         for key, env_key in self.keyword_lookup.items():
             value = os.environ.get(env_key.upper(), None)
             if value is None:
-                raise OrdbokTargetedEnvKeyException(key, env_key)
+                self.config._report_error(
+                    OrdbokTargetedEnvKeyException(key, env_key))
+                self._unset_keys.add(key)
+                continue
+            c[key] = value
+        return c
+
+    def _load(self):
+        c = self._load_content()
+        self._retain_source((None, None, c))
+        provenance = self.config._provenance
+        for key, value in c.items():
             self.config[key] = value
+            if provenance is not None:
+                provenance.set(key, self.keyword, value)
+
+    def _key_section(self, key):
+        return self.keyword_lookup.get(key, u'{}_{}'.format(
+            self.config.namespace, key)).upper()
 
-    def _check_required_keys(self):
-        def custom_exception_gen(_, key):
-            return Exception(
-                '{} config key should be specified in the environment '
-                'but was not found.'.format(key))
-        return super(ConfigEnv, self)._check_required_keys(
-            custom_exception_gen=custom_exception_gen)
+    def _missing_key(self, key):
+        if key in self._unset_keys:
+            return None
+        return Exception(
+            '{} config key should be specified in the environment '
+            'but was not found.'.format(key))
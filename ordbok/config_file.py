@@ -1,14 +1,22 @@
 import os
-import yaml
 import six
+from .lookup import ConfigFileLookup
 from .exceptions import (
     OrdbokLowercaseKeyException, OrdbokMissingConfigFileException,
-    OrdbokAmbiguousConfigFileException, OrdbokSelfReferenceException,
+    OrdbokSelfReferenceException,
     OrdbokPreviouslyLoadedException, OrdbokNestedRequiredKeyException,
     OrdbokMissingKeyException)
 
 
 class ConfigFile(object):
+    cacheable = True
+    # (context, fingerprint, content) of the last time the file was read,
+    # kept to reload only the files which changed (see
+    # Ordbok._keeps_sources)
+    _source = None
+    # (environment section,) once a key was explained, until the next load
+    _section = None
+
     def __init__(self, filename, envs=None):
         self.filename = filename
         self.envs = envs
@@ -21,13 +29,44 @@ class ConfigFile(object):
         self.config_file_path = os.path.join(
             self.config.config_cwd, self.config.config_dir, self.filename)
         self.loaded = False
+        self._prefetched = None
 
     def load(self, config_files_lookup):
+        if not isinstance(config_files_lookup, ConfigFileLookup):
+            config_files_lookup = ConfigFileLookup(config_files_lookup)
         self.config_files_lookup = config_files_lookup
         self._load()
         self._check_required_keys()
         self.loaded = True
 
+    def prefetch(self):
+        '''
+        Read, decrypt and parse the config file ahead of `load` (which
+        must still be called, in order, to apply it). Returns the loaded
+        content along with the context it was loaded in, which `load`
+        checks is still current before using it.
+        '''
+        if self._skip_environment():
+            return None
+        return self._load_source()
+
+    def source_paths(self):
+        '''
+        The paths of the files this config file is read from.
+        '''
+        return [self.config_file_path]
+
+    def _fingerprint(self):
+        fingerprint = []
+        for path in self.source_paths():
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+            fingerprint.append((path, st.st_ino, st.st_size,
+                                getattr(st, 'st_mtime_ns', st.st_mtime)))
+        return fingerprint
+
     def add_required_key(self, key, value=None):
         self.required_keys.append(key)
 
@@ -37,15 +76,43 @@ class ConfigFile(object):
                 u'YAML file {} did not load as a dict.  Please '
                 u'check its formatting.'.format(self.config_file_path))
 
-    def _load_yaml(self):
+    def _parse_yaml(self, content):
+        from .parser import load_yaml
+        c = load_yaml(content, self.config.yaml_loader)
+        self._validate_yaml_content(c)
+        return c
+
+    def _read_file(self):
+        with open(self.config_file_path) as f:
+            return f.read()
+
+    def _read_content(self):
         try:
-            with open(self.config_file_path) as f:
-                c = yaml.load(f)
-                self._validate_yaml_content(c)
-                return c
+            return self._read_file()
         except IOError:
             return None
 
+    def _load_yaml(self):
+        content = self._read_content()
+        if content is None:
+            return None
+        return self._parse_yaml(content)
+
+    def _parse_environment(self, content):
+        '''
+        Parse `content` and return its section for the current environment.
+        With `Ordbok(streaming=True)` the other sections are skipped rather
+        than loaded.
+        '''
+        if self.config.streaming:
+            from .parser import load_environment
+            c = load_environment(
+                content, self.config['ENVIRONMENT'].upper(),
+                self.config.yaml_loader)
+            self._validate_yaml_content(c)
+            return c
+        return self._select_environment(self._parse_yaml(content))
+
     def _validate_key(self, key):
         if not key.isupper():
             raise OrdbokLowercaseKeyException(key, self)
@@ -56,17 +123,11 @@ class ConfigFile(object):
         if not value.startswith(self.config.namespace):
             return None
 
-        referenced_config_files = [k for k in self.config_files_lookup.keys()
-                                   if value.startswith(k)]
+        referenced_config_file = self.config_files_lookup.match(value)
 
-        if len(referenced_config_files) == 0:
+        if referenced_config_file is None:
             raise OrdbokMissingConfigFileException(key, self)
-        elif len(referenced_config_files) > 1:
-            raise OrdbokAmbiguousConfigFileException(referenced_config_files)
-
-        referenced_config_file = referenced_config_files[0]
-
-        if referenced_config_file == self.keyword:
+        elif referenced_config_file == self.keyword:
             raise OrdbokSelfReferenceException(key, self)
         elif self.config_files_lookup[referenced_config_file].loaded:
             raise OrdbokPreviouslyLoadedException(
@@ -77,8 +138,7 @@ class ConfigFile(object):
     def _validate_nested_keys(self, d):
         for key, value in d.items():
             if isinstance(value, six.string_types):
-                if any(True for k in self.config_files_lookup.keys() if
-                       value.startswith(k)):
+                if self.config_files_lookup.match(value):
                     raise OrdbokNestedRequiredKeyException(value)
             if isinstance(value, dict):
                 self._validate_nested_keys(value)
@@ -91,29 +151,109 @@ class ConfigFile(object):
         if isinstance(value, dict):
             self._validate_nested_keys(value)
         referenced_config_file = self._referenced_config_file(key, value)
+        provenance = self.config._provenance
         if referenced_config_file:
             self.config_files_lookup[referenced_config_file].add_required_key(
                 key, value)
+            if provenance is not None:
+                provenance.require(key, referenced_config_file, self.keyword)
         else:
             self.config[key] = value
+            if provenance is not None:
+                provenance.set(key, self.keyword, value)
+
+    def _select_environment(self, c):
+        if not c:
+            return c
+        return c.get(self.config['ENVIRONMENT'].upper(), c)
+
+    def _load_context(self):
+        return self.config['ENVIRONMENT']
+
+    def _load_source(self):
+        '''
+        Return the content of the config file with the context and file
+        fingerprint it was loaded with, reusing the previous content if
+        neither has changed since the file was last read.
+        '''
+        context = self._load_context()
+        fingerprint = self._fingerprint()
+        if (fingerprint is not None and self._source is not None and
+                self._source[:2] == (context, fingerprint)):
+            return self._source
+        return (context, fingerprint, self._load_content())
+
+    def _load_prefetched(self):
+        prefetched, self._prefetched = self._prefetched, None
+        if prefetched is None or prefetched[0] != self._load_context():
+            prefetched = self._load_source()
+        self._retain_source(prefetched)
+        return prefetched[2]
+
+    def _retain_source(self, source):
+        '''
+        Keep the `source` the file was loaded from, to compare with the
+        file when reloading, unless the config is not expected to be
+        reloaded, so parsed content isn't kept alive for nothing.
+        '''
+        self._section = None
+        self._source = source if self.config._keeps_sources() else None
+
+    def _skip_environment(self):
+        return self.envs and self.config['ENVIRONMENT'] not in self.envs
+
+    def _load_content(self):
+        if self.cacheable and self.config.config_cache:
+            return self.config.config_cache.load(self)
+        if self.config.streaming:
+            content = self._read_content()
+            if content is None:
+                return None
+            return self._parse_environment(content)
+        return self._select_environment(self._load_yaml())
 
     def _load(self):
-        if self.envs and self.config['ENVIRONMENT'] not in self.envs:
+        if self._skip_environment():
             return
 
-        c = self._load_yaml()
+        c = self._load_prefetched()
         if not c:
             return
 
-        c = c.get(self.config['ENVIRONMENT'].upper(), c)
-
         for key, value in c.items():
             self._process_key_value(key, value)
 
     def _check_required_keys(self, custom_exception_gen=None):
         for key in self.required_keys:
-            if self.config.get(key) is None:
+            if not self.config._has_value(key):
                 if custom_exception_gen:
-                    raise custom_exception_gen(self, key)
+                    error = custom_exception_gen(self, key)
                 else:
-                    raise OrdbokMissingKeyException(key, self)
+                    error = self._missing_key(key)
+                if error is not None:
+                    self.config._report_error(error)
+
+    def _key_section(self, key):
+        '''
+        The environment section of the file the current environment's
+        config was selected from, or None if it is the whole file. Only
+        used to explain keys, so it is looked up once the first key is
+        explained, rather than recorded when loading, and then kept until
+        the file is loaded again.
+        '''
+        if self._section is None:
+            self._section = (self._environment_section(),)
+        return self._section[0]
+
+    def _environment_section(self):
+        try:
+            c = self._load_yaml()
+        except Exception:
+            return None
+        section = self.config['ENVIRONMENT'].upper()
+        if c and section in c:
+            return section
+        return None
+
+    def _missing_key(self, key):
+        return OrdbokMissingKeyException(key, self)
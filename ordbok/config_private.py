@@ -1,8 +1,10 @@
 import os
 import six
-import yaml
-import simplecrypt
 from .config_file import ConfigFile
+from .crypto import (
+    FORMAT_SIMPLECRYPT, FORMAT_ORDBOK, encrypt, decrypt, detect_format,
+    read_header)
+from .lazy import build_index, select_index
 from .exceptions import (
     OrdbokMissingPrivateConfigFile, OrdbokMissingEncryptedPrivateConfigFile)
 
@@ -16,11 +18,33 @@ def open_wrapper(*args, **kwargs):
 
 
 class PrivateConfigFile(ConfigFile):
-    def _load_yaml(self):
-        content = self._load_and_decrypt_file()
-        c = yaml.load(content)
-        self._validate_yaml_content(c)
-        return c
+    # decrypted content is never written to the on disk cache
+    cacheable = False
+
+    # key the file was deferred with by a lazy load
+    _deferred_key = None
+
+    def __init__(self, filename, envs=None, file_format=FORMAT_SIMPLECRYPT,
+                 kdf=None, kdf_params=None, index=False):
+        super(PrivateConfigFile, self).__init__(filename, envs=envs)
+        self.file_format = file_format
+        self.kdf = kdf
+        self.kdf_params = kdf_params
+        self.index = index
+
+    def prefetch(self):
+        if self.config.lazy:
+            return None
+        return super(PrivateConfigFile, self).prefetch()
+
+    def source_paths(self):
+        return [self.config_file_path + '.private']
+
+    def _load_context(self):
+        return (self.config['ENVIRONMENT'], self.config._private_file_key())
+
+    def _read_content(self):
+        return self._load_and_decrypt_file()
 
     def _load_encrypted_file(self):
         try:
@@ -54,12 +78,69 @@ class PrivateConfigFile(ConfigFile):
         content = self._load_encrypted_file()
         return self._decrypt_content(content)
 
-    def _decrypt_content(self, content):
-        content = simplecrypt.decrypt(self.config.private_file_key, content)
+    def _load_index(self):
+        '''
+        The keys the file sets in the current environment, from the index
+        in its header, or None if it has no index.
+        '''
+        content = self._load_encrypted_file()
+        if detect_format(content) != FORMAT_ORDBOK:
+            return None
+        index = read_header(content)[0].get('index')
+        if index is None:
+            return None
+        return select_index(index, self.config['ENVIRONMENT'])
+
+    def _load(self):
+        if self.config.lazy and not self._skip_environment():
+            index = self._load_index()
+            if index is not None:
+                return self._defer(index)
+        self._deferred_key = None
+        return super(PrivateConfigFile, self)._load()
+
+    def _defer(self, index):
+        '''
+        Register the keys in `index` with the config without decrypting
+        the file. References to other config files are processed as usual.
+        '''
+        self._deferred_key = self.config.private_file_key
+        for key, entry in index.items():
+            if isinstance(entry, six.string_types):
+                self._process_key_value(key, entry)
+            else:
+                self._validate_key(key)
+                self.config._defer_key(key, self, bool(entry))
+
+    def _load_deferred(self):
+        '''
+        Decrypt the file for a lazy load, with the key it was deferred
+        with, and return its selected environment section.
+        '''
+        content = self._decrypt_content(
+            self._load_encrypted_file(), self._deferred_key)
+        return self._parse_environment(content)
+
+    def _decrypt_content(self, content, key=None):
+        content = decrypt(
+            key or self.config.private_file_key, content,
+            self.config.key_cache)
         if six.PY2:
             return content
         else:
             return str(content.decode('utf8'))
 
-    def _encrypt_content(self, content):
-        return simplecrypt.encrypt(self.config.private_file_key, content)
+    def _encrypt_content(self, content, file_format=None, salt=None):
+        file_format = file_format or self.file_format
+        if file_format == FORMAT_ORDBOK:
+            index = None
+            if self.index:
+                index = build_index(
+                    self._parse_yaml(content), self.config.namespace)
+            return encrypt(self.config.private_file_key, content,
+                           file_format=file_format, kdf=self.kdf,
+                           kdf_params=self.kdf_params, index=index,
+                           salt=salt, key_cache=self.config.key_cache)
+        return encrypt(self.config.private_file_key, content,
+                       file_format=file_format,
+                       key_cache=self.config.key_cache)
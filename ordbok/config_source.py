@@ -0,0 +1,287 @@
+import base64
+import json
+import threading
+import time
+from contextlib import contextmanager
+import six
+from .config_file import ConfigFile
+from .exceptions import OrdbokConfigSourceException
+
+
+class ConnectionPool(object):
+    '''
+    Thread safe pool of connections made by `create()`. Up to `max_idle`
+    connections are kept open between uses; a connection which raises
+    while in use is closed rather than returned to the pool.
+    '''
+    def __init__(self, create, max_idle=4):
+        self.create = create
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self.create()
+        try:
+            yield conn
+        except Exception:
+            conn.close()
+            raise
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, create):
+    '''
+    The `ConnectionPool` for `key`, shared by every source (and reload)
+    in the process connecting to the same place.
+    '''
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(create)
+        return _pools[key]
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def http_get(url, headers=None, timeout=10):
+    '''
+    GET `url` over a pooled keep-alive connection, returning the response
+    status and body. A request on a pooled connection the server has
+    since closed is retried once on a new one.
+    '''
+    import socket
+    from six.moves import http_client
+    from six.moves.urllib.parse import urlsplit
+    parts = urlsplit(url)
+    if parts.scheme == 'https':
+        connection_class = http_client.HTTPSConnection
+    elif parts.scheme == 'http':
+        connection_class = http_client.HTTPConnection
+    else:
+        raise ValueError('Unsupported URL scheme: {}'.format(url))
+    pool = get_pool(
+        (parts.scheme, parts.netloc, timeout),
+        lambda: connection_class(parts.netloc, timeout=timeout))
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    for attempt in (0, 1):
+        try:
+            with pool.connection() as conn:
+                conn.request('GET', path, headers=headers or {})
+                response = conn.getresponse()
+                return response.status, response.read()
+        except (http_client.HTTPException, socket.error):
+            if attempt:
+                raise
+
+
+class ConfigSource(ConfigFile):
+    '''
+    Config loaded from a key-value store rather than a file. Subclasses
+    implement `fetch()`, returning every key of the source in a single
+    round trip. Sources are named, so earlier files can require keys from
+    them as with config files (e.g. `'ordbok_consul'` for a source named
+    `consul`), and the current environment's section is selected as for
+    config files.
+
+    With `ttl` (in seconds), fetched content is reused by loads and reloads
+    within `ttl` seconds of fetching it.
+    '''
+    cacheable = False
+    # (context, expiry, content) of the last fetch
+    _fetched = None
+
+    def __init__(self, name, envs=None, ttl=None):
+        self.name = name
+        self.filename = name
+        self.envs = envs
+        self.ttl = ttl
+
+    @property
+    def location(self):
+        return self.name
+
+    def init_config(self, config):
+        self.config = config
+        self.keyword = '{}_{}'.format(self.config.namespace, self.name)
+        self.required_keys = []
+        self.config_file_path = self.location
+        self.loaded = False
+        self._prefetched = None
+
+    def fetch(self):
+        raise NotImplementedError
+
+    def source_paths(self):
+        return []
+
+    def _fingerprint(self):
+        # remote content can't be checked for changes without fetching it
+        return None
+
+    def _environment_section(self):
+        try:
+            c = self.fetch()
+        except Exception:
+            return None
+        section = self.config['ENVIRONMENT'].upper()
+        if isinstance(c, dict) and section in c:
+            return section
+        return None
+
+    def _format_prefix(self, prefix):
+        return prefix.format(namespace=self.config.namespace,
+                             environment=self.config['ENVIRONMENT'])
+
+    def _parse_value(self, value):
+        # values in key-value stores are text, parsed like env variables
+        if isinstance(value, six.binary_type):
+            value = value.decode('utf-8')
+        if not isinstance(value, six.string_types):
+            return value
+        from .parser import load_scalar
+        return load_scalar(value, self.config.yaml_loader)
+
+    def _load_content(self):
+        context = self._load_context()
+        now = time.time()
+        fetched = self._fetched
+        if fetched is not None and fetched[0] == context and now < fetched[1]:
+            return fetched[2]
+        c = self.fetch()
+        if not isinstance(c, dict):
+            raise OrdbokConfigSourceException(
+                self.location, 'content is not a dict')
+        c = self._select_environment(c)
+        if self.ttl:
+            self._fetched = (context, now + self.ttl, c)
+        return c
+
+
+class HTTPSource(ConfigSource):
+    '''
+    Config served as a JSON object by an HTTP endpoint.
+    '''
+    def __init__(self, name, url, headers=None, timeout=10, **kwargs):
+        super(HTTPSource, self).__init__(name, **kwargs)
+        self.url = url
+        self.headers = headers
+        self.timeout = timeout
+
+    @property
+    def location(self):
+        return self.url
+
+    def fetch(self):
+        status, body = http_get(self.url, dict(
+            self.headers or {}, Accept='application/json'), self.timeout)
+        if status != 200:
+            raise OrdbokConfigSourceException(
+                self.url, 'HTTP status {}'.format(status))
+        return json.loads(body.decode('utf-8'))
+
+
+class ConsulSource(ConfigSource):
+    '''
+    Config stored in Consul's KV store (or anything serving its API) under
+    `prefix`, which is formatted with `namespace` and `environment`. Every
+    key under the prefix is fetched with a single recursive request.
+    '''
+    def __init__(self, name, url='http://127.0.0.1:8500',
+                 prefix='{namespace}/{environment}/', token=None,
+                 timeout=10, **kwargs):
+        super(ConsulSource, self).__init__(name, **kwargs)
+        self.url = url.rstrip('/')
+        self.prefix = prefix
+        self.token = token
+        self.timeout = timeout
+
+    @property
+    def location(self):
+        return self.url
+
+    def fetch(self):
+        from six.moves.urllib.parse import quote
+        prefix = self._format_prefix(self.prefix)
+        headers = {'X-Consul-Token': self.token} if self.token else None
+        status, body = http_get(
+            '{}/v1/kv/{}?recurse=true'.format(self.url, quote(prefix)),
+            headers, self.timeout)
+        if status == 404:
+            return {}
+        elif status != 200:
+            raise OrdbokConfigSourceException(
+                self.url, 'HTTP status {}'.format(status))
+        c = {}
+        for entry in json.loads(body.decode('utf-8')):
+            key = entry['Key'][len(prefix):]
+            if not key or key.endswith('/'):
+                continue
+            value = entry.get('Value')
+            c[key] = (None if value is None else
+                      self._parse_value(base64.b64decode(value)))
+        return c
+
+
+class SQLiteSource(ConfigSource):
+    '''
+    Config stored in a `key`/`value` table of a SQLite database, a local
+    stand-in for a remote key-value store. Keys are selected by `prefix`
+    as for `ConsulSource`.
+    '''
+    def __init__(self, name, path, table='config',
+                 prefix='{namespace}/{environment}/', **kwargs):
+        super(SQLiteSource, self).__init__(name, **kwargs)
+        self.path = path
+        self.table = table
+        self.prefix = prefix
+
+    @property
+    def location(self):
+        return self.path
+
+    def source_paths(self):
+        return [self.path]
+
+    def fetch(self):
+        import sqlite3
+        prefix = self._format_prefix(self.prefix)
+        pool = get_pool(('sqlite', self.path), lambda: sqlite3.connect(
+            self.path, check_same_thread=False))
+        try:
+            with pool.connection() as conn:
+                rows = conn.execute(
+                    'SELECT key, value FROM "{}" WHERE substr(key, 1, ?) = ?'
+                    ''.format(self.table), (len(prefix), prefix)).fetchall()
+        except sqlite3.Error as e:
+            raise OrdbokConfigSourceException(self.path, e)
+        return dict(
+            (key[len(prefix):],
+             None if value is None else self._parse_value(value))
+            for key, value in rows if key[len(prefix):])
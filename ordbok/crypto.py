@@ -0,0 +1,407 @@
+import os
+import sys
+import hmac
+import json
+import stat
+import base64
+import struct
+import hashlib
+import threading
+from . import serialize
+from .util import LazyModule, replace_file
+from .exceptions import OrdbokDecryptionException
+
+
+# simplecrypt imports the Crypto package, the slowest part of importing
+# ordbok, so it is only imported once a file is encrypted or decrypted
+simplecrypt = LazyModule('simplecrypt')
+
+FORMAT_SIMPLECRYPT = 'simplecrypt'
+FORMAT_ORDBOK = 'ordbok'
+
+
+def to_bytes(data):
+    if isinstance(data, bytes):
+        return data
+    return data.encode('utf8')
+
+
+def pbkdf2_sha256(password, salt, count, length):
+    if hasattr(hashlib, 'pbkdf2_hmac'):
+        return hashlib.pbkdf2_hmac(
+            'sha256', to_bytes(password), salt, count, length)
+    return simplecrypt._pbkdf2(to_bytes(password), salt, length, count)
+
+
+# derived keys are shared by every KeyCache in the process
+_derived_keys = {}
+_derived_keys_lock = threading.Lock()
+
+
+class KeyCache(object):
+    '''
+    Cache of key material derived from a password and salt, so files
+    encrypted with the same password and salt only pay for the key
+    derivation once per process.
+
+    If `path` is given, derived keys are also persisted to that file so
+    they are shared by every process on the host. The file is created
+    readable only by its owner and is ignored if its permissions are any
+    looser than that, as anyone who can read it can decrypt the files
+    without knowing the password.
+    '''
+    def __init__(self, path=None):
+        self.path = path
+        self._file_keys = None
+
+    def _cache_key(self, password, salt, params):
+        return hmac.new(to_bytes(password),
+                        salt + to_bytes(repr(params)),
+                        hashlib.sha256).hexdigest()
+
+    def _read_file(self):
+        try:
+            st = os.stat(self.path)
+            if (st.st_mode & (stat.S_IRWXG | stat.S_IRWXO) or
+                    st.st_uid != os.getuid()):
+                return {}
+            with open(self.path, 'rb') as f:
+                keys = serialize.loads(f.read())
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return {}
+        return keys if isinstance(keys, dict) else {}
+
+    def _write_file(self, cache_key, keys):
+        file_keys = self._read_file()
+        file_keys[cache_key] = keys
+        try:
+            replace_file(self.path, serialize.dumps(file_keys))
+        except (IOError, OSError):
+            pass
+
+    def derive(self, password, salt, params, kdf):
+        '''
+        Return the key material for `password` and `salt`, calling
+        `kdf(password, salt)` to derive it if it is not cached. `params`
+        identifies the key derivation function and its parameters.
+        '''
+        cache_key = self._cache_key(password, salt, params)
+        with _derived_keys_lock:
+            keys = _derived_keys.get(cache_key)
+            if keys is None and self.path:
+                if self._file_keys is None:
+                    self._file_keys = self._read_file()
+                keys = self._file_keys.get(cache_key)
+                if keys is not None:
+                    _derived_keys[cache_key] = keys
+        if keys is not None:
+            return keys
+
+        keys = kdf(password, salt)
+        with _derived_keys_lock:
+            _derived_keys[cache_key] = keys
+            if self.path:
+                self._write_file(cache_key, keys)
+                self._file_keys[cache_key] = keys
+        return keys
+
+
+def _assert_password(password):
+    # as simplecrypt does, rather than deriving a key from no password
+    if not password:
+        raise ValueError('Missing password.')
+
+
+def _simplecrypt_kdf(count):
+    def kdf(password, salt):
+        return pbkdf2_sha256(password, salt, count,
+                             2 * simplecrypt.AES_KEY_LEN // 8)
+    return kdf
+
+
+def simplecrypt_decrypt(password, data, key_cache=None):
+    '''
+    Equivalent to `simplecrypt.decrypt`, but with the (deliberately slow)
+    key derivation going through `key_cache`.
+    '''
+    _assert_password(password)
+    simplecrypt._assert_not_unicode(data)
+    simplecrypt._assert_header_prefix(data)
+    version = simplecrypt._assert_header_version(data)
+    simplecrypt._assert_decrypt_length(data, version)
+    count = simplecrypt.EXPANSION_COUNT[version]
+    raw = data[simplecrypt.HEADER_LEN:]
+    salt = raw[:simplecrypt.SALT_LEN[version] // 8]
+
+    key_cache = key_cache or KeyCache()
+    keys = key_cache.derive(password, salt, ('simplecrypt', count),
+                            _simplecrypt_kdf(count))
+    key_len = simplecrypt.AES_KEY_LEN // 8
+    hmac_key, cipher_key = keys[:key_len], keys[key_len:]
+
+    digest = raw[-simplecrypt.HASH.digest_size:]
+    digest2 = simplecrypt._hmac(
+        hmac_key, data[:-simplecrypt.HASH.digest_size])
+    simplecrypt._assert_hmac(hmac_key, digest, digest2)
+    counter = simplecrypt.Counter.new(
+        simplecrypt.HALF_BLOCK, prefix=salt[:simplecrypt.HALF_BLOCK // 8])
+    cipher = simplecrypt.AES.new(
+        cipher_key, simplecrypt.AES.MODE_CTR, counter=counter)
+    return cipher.decrypt(
+        raw[simplecrypt.SALT_LEN[version] // 8:
+            -simplecrypt.HASH.digest_size])
+
+
+def simplecrypt_encrypt(password, data, key_cache=None):
+    '''
+    Equivalent to `simplecrypt.encrypt`, using the much faster hashlib
+    implementation of PBKDF2 when it is available. The key is added to
+    `key_cache`, if given, so decrypting the result doesn't derive it again.
+    '''
+    _assert_password(password)
+    data = to_bytes(data)
+    simplecrypt._assert_encrypt_length(data)
+    version = simplecrypt.LATEST
+    count = simplecrypt.EXPANSION_COUNT[version]
+    header = simplecrypt.HEADER[version]
+    salt = os.urandom(simplecrypt.SALT_LEN[version] // 8)
+    if key_cache is None:
+        keys = _simplecrypt_kdf(count)(password, salt)
+    else:
+        keys = key_cache.derive(password, salt, ('simplecrypt', count),
+                                _simplecrypt_kdf(count))
+    key_len = simplecrypt.AES_KEY_LEN // 8
+    hmac_key, cipher_key = keys[:key_len], keys[key_len:]
+    counter = simplecrypt.Counter.new(
+        simplecrypt.HALF_BLOCK, prefix=salt[:simplecrypt.HALF_BLOCK // 8])
+    cipher = simplecrypt.AES.new(
+        cipher_key, simplecrypt.AES.MODE_CTR, counter=counter)
+    encrypted = cipher.encrypt(data)
+    digest = simplecrypt._hmac(hmac_key, header + salt + encrypted)
+    return header + salt + encrypted + digest
+
+
+# The ordbok format is
+#
+#   MAGIC | version (1 byte) | header length (2 bytes) | header | ciphertext
+#
+# where header is a JSON object recording the key derivation function, its
+# parameters and the cipher, all of which are authenticated along with the
+# ciphertext.
+MAGIC = b'ordbok'
+VERSION = 1
+_PREFIX = struct.Struct('>6sBH')
+
+KDF_PBKDF2 = 'pbkdf2-sha256'
+KDF_SCRYPT = 'scrypt'
+CIPHER_AES_GCM = 'aes-256-gcm'
+CIPHER_AES_CTR_HMAC = 'aes-256-ctr-hmac-sha256'
+
+KDF_DEFAULTS = {
+    KDF_PBKDF2: {'iterations': 100000},
+    KDF_SCRYPT: {'n': 2 ** 14, 'r': 8, 'p': 1},
+}
+DEFAULT_KDF = KDF_SCRYPT if hasattr(hashlib, 'scrypt') else KDF_PBKDF2
+_KEY_LENGTHS = {CIPHER_AES_GCM: 32, CIPHER_AES_CTR_HMAC: 64}
+_NONCE_LENGTHS = {CIPHER_AES_GCM: 12, CIPHER_AES_CTR_HMAC: 8}
+_TAG_LENGTH = 16
+_SALT_LENGTH = 16
+
+
+def default_cipher():
+    '''
+    AES-GCM where the installed Crypto package supports it.
+    '''
+    if hasattr(simplecrypt.AES, 'MODE_GCM'):
+        return CIPHER_AES_GCM
+    return CIPHER_AES_CTR_HMAC
+
+
+if sys.version_info < (3, 7):
+    DEFAULT_CIPHER = default_cipher()
+else:
+    def __getattr__(name):
+        # DEFAULT_CIPHER depends on the Crypto package, which is only
+        # imported when it is first used
+        if name == 'DEFAULT_CIPHER':
+            return default_cipher()
+        raise AttributeError(
+            'module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def detect_format(data):
+    if data[:len(MAGIC)] == MAGIC:
+        return FORMAT_ORDBOK
+    return FORMAT_SIMPLECRYPT
+
+
+def _b64encode(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def _b64decode(data):
+    return base64.b64decode(data.encode('ascii'))
+
+
+def _kdf(header, length):
+    kdf = header['kdf']
+    params = header['kdf_params']
+    if kdf == KDF_PBKDF2:
+        def derive(password, salt):
+            return pbkdf2_sha256(password, salt, params['iterations'], length)
+    elif kdf == KDF_SCRYPT:
+        if not hasattr(hashlib, 'scrypt'):
+            raise OrdbokDecryptionException(
+                'scrypt is not available in this version of Python')
+
+        def derive(password, salt):
+            return hashlib.scrypt(
+                to_bytes(password), salt=salt, n=params['n'], r=params['r'],
+                p=params['p'], dklen=length,
+                maxmem=128 * params['r'] * (2 * params['n'] + params['p']) +
+                2 ** 20)
+    else:
+        raise OrdbokDecryptionException('unknown kdf {}'.format(kdf))
+    return derive
+
+
+def _derive_key(password, salt, header, key_cache):
+    cipher = header['cipher']
+    if cipher not in _KEY_LENGTHS:
+        raise OrdbokDecryptionException('unknown cipher {}'.format(cipher))
+    length = _KEY_LENGTHS[cipher]
+    params = (header['kdf'], sorted(header['kdf_params'].items()), length)
+    key_cache = key_cache or KeyCache()
+    return key_cache.derive(password, salt, params, _kdf(header, length))
+
+
+def _ctr_cipher(key, nonce):
+    counter = simplecrypt.Counter.new(64, prefix=nonce)
+    return simplecrypt.AES.new(key, simplecrypt.AES.MODE_CTR, counter=counter)
+
+
+def _seal(cipher, key, nonce, aad, data):
+    if cipher == CIPHER_AES_GCM:
+        aes = simplecrypt.AES.new(key, simplecrypt.AES.MODE_GCM, nonce=nonce)
+        aes.update(aad)
+        encrypted, tag = aes.encrypt_and_digest(data)
+        return encrypted + tag
+    encrypted = _ctr_cipher(key[:32], nonce).encrypt(data)
+    tag = hmac.new(key[32:], aad + encrypted, hashlib.sha256).digest()
+    return encrypted + tag[:_TAG_LENGTH]
+
+
+def _open(cipher, key, nonce, aad, data):
+    encrypted, tag = data[:-_TAG_LENGTH], data[-_TAG_LENGTH:]
+    if cipher == CIPHER_AES_GCM:
+        aes = simplecrypt.AES.new(key, simplecrypt.AES.MODE_GCM, nonce=nonce)
+        aes.update(aad)
+        try:
+            return aes.decrypt_and_verify(encrypted, tag)
+        except ValueError:
+            raise OrdbokDecryptionException(
+                'bad password or corrupt / modified data')
+    expected = hmac.new(key[32:], aad + encrypted, hashlib.sha256).digest()
+    if not hmac.compare_digest(expected[:_TAG_LENGTH], tag):
+        raise OrdbokDecryptionException(
+            'bad password or corrupt / modified data')
+    return _ctr_cipher(key[:32], nonce).decrypt(encrypted)
+
+
+def ordbok_header(kdf=None, kdf_params=None, cipher=None, salt=None):
+    '''
+    The key derivation and cipher part of the header `ordbok_encrypt`
+    writes, with a new random salt unless `salt` is given.
+    '''
+    kdf = kdf or DEFAULT_KDF
+    if kdf not in KDF_DEFAULTS:
+        raise ValueError('unknown kdf {}'.format(kdf))
+    params = dict(KDF_DEFAULTS[kdf])
+    params.update(kdf_params or {})
+    return {
+        'kdf': kdf,
+        'kdf_params': params,
+        'salt': _b64encode(salt or os.urandom(_SALT_LENGTH)),
+        'cipher': cipher or default_cipher(),
+    }
+
+
+def derive_key(password, header, key_cache=None):
+    '''
+    The key for `password` and an ordbok format `header`, through
+    `key_cache`, e.g. to derive a key once before encrypting or decrypting
+    many files with the same salt.
+    '''
+    return _derive_key(
+        password, _b64decode(header['salt']), header, key_cache)
+
+
+def ordbok_encrypt(password, data, kdf=None, kdf_params=None, cipher=None,
+                   key_cache=None, index=None, salt=None):
+    '''
+    Encrypt `data` in the ordbok format. `kdf` is one of `KDF_PBKDF2` or
+    `KDF_SCRYPT` and `kdf_params` overrides its default parameters (e.g.
+    `{'iterations': 500000}`), trading load time for brute force cost.
+    `index` is stored in the (authenticated but unencrypted) header.
+
+    A new random salt is used unless `salt` is given. Files encrypted with
+    the same password and salt share a derived key (each still has its own
+    random nonce), so it is only derived once for all of them.
+    '''
+    header = ordbok_header(kdf, kdf_params, cipher, salt)
+    cipher = header['cipher']
+    nonce = os.urandom(_NONCE_LENGTHS[cipher])
+    header['nonce'] = _b64encode(nonce)
+    if index is not None:
+        header['index'] = index
+    header_bytes = json.dumps(header, sort_keys=True).encode('utf8')
+    aad = _PREFIX.pack(MAGIC, VERSION, len(header_bytes)) + header_bytes
+    key = derive_key(password, header, key_cache)
+    return aad + _seal(cipher, key, nonce, aad, to_bytes(data))
+
+
+def read_header(data):
+    try:
+        magic, version, header_length = _PREFIX.unpack_from(data)
+    except struct.error:
+        raise OrdbokDecryptionException('missing header')
+    if magic != MAGIC:
+        raise OrdbokDecryptionException('bad header')
+    if version != VERSION:
+        raise OrdbokDecryptionException(
+            'unsupported format version {}, please upgrade ordbok'.format(
+                version))
+    end = _PREFIX.size + header_length
+    try:
+        header = json.loads(data[_PREFIX.size:end].decode('utf8'))
+    except ValueError:
+        raise OrdbokDecryptionException('corrupt header')
+    return header, data[:end], data[end:]
+
+
+def ordbok_decrypt(password, data, key_cache=None):
+    header, aad, encrypted = read_header(data)
+    if len(encrypted) < _TAG_LENGTH:
+        raise OrdbokDecryptionException('missing data')
+    key = _derive_key(
+        password, _b64decode(header['salt']), header, key_cache)
+    return _open(header['cipher'], key, _b64decode(header['nonce']), aad,
+                 encrypted)
+
+
+def encrypt(password, data, file_format=FORMAT_SIMPLECRYPT, **kwargs):
+    if file_format == FORMAT_ORDBOK:
+        return ordbok_encrypt(password, data, **kwargs)
+    elif file_format == FORMAT_SIMPLECRYPT:
+        return simplecrypt_encrypt(password, data, kwargs.get('key_cache'))
+    raise ValueError('unknown private file format {}'.format(file_format))
+
+
+def decrypt(password, data, key_cache=None):
+    '''
+    Decrypt `data`, detecting whether it was encrypted in the ordbok or
+    the simple-crypt format.
+    '''
+    if detect_format(data) == FORMAT_ORDBOK:
+        return ordbok_decrypt(password, data, key_cache)
+    return simplecrypt_decrypt(password, data, key_cache)
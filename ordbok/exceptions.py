@@ -18,19 +18,19 @@ class OrdbokMissingConfigFileException(OrdbokKeyException):
 class OrdbokLowercaseKeyException(OrdbokKeyException):
     def __repr__(self):
         return '{} config key in {} must be uppercase.'.format(
-            self.key, self.config_filename)
+            self.key, self.config_file_path)
 
 
 class OrdbokMissingKeyException(OrdbokKeyException):
     def __repr__(self):
         return ('{} config key should be specified in {} but was not found.'
-                ''.format(self.key, self.config_filename))
+                ''.format(self.key, self.config_file_path))
 
 
 class OrdbokSelfReferenceException(OrdbokKeyException):
     def __repr__(self):
         return ('Cannot require {} to be required in its own file ({}).'
-                ''.format(self.key, self.config_filename))
+                ''.format(self.key, self.config_file_path))
 
 
 class OrdbokAmbiguousConfigFileException(OrdbokException):
@@ -95,3 +95,72 @@ class OrdbokMissingEncryptedPrivateConfigFile(OrdbokMissingPrivateConfigFile):
         return ("Encrypted version of private config file '{0}' not found. "
                 "Please run `ordbok encrypt {0}`.".format(
                     self.config_file_path))
+
+
+class OrdbokDecryptionException(OrdbokException):
+    def __init__(self, reason):
+        self.reason = reason
+
+    def __repr__(self):
+        return 'Unable to decrypt private config file: {}'.format(self.reason)
+
+
+class OrdbokConfigSourceException(OrdbokException):
+    def __init__(self, location, reason):
+        self.location = location
+        self.reason = reason
+
+    def __repr__(self):
+        return 'Unable to load config from {}: {}'.format(
+            self.location, self.reason)
+
+
+class OrdbokArtifactException(OrdbokException):
+    def __init__(self, location, reason):
+        self.location = location
+        self.reason = reason
+
+    def __repr__(self):
+        return 'Unable to load config artifact {}: {}'.format(
+            self.location, self.reason)
+
+
+class OrdbokSharedConfigException(OrdbokException):
+    def __init__(self, path, reason):
+        self.path = path
+        self.reason = reason
+
+    def __repr__(self):
+        return 'Unable to attach shared config {}: {}'.format(
+            self.path, self.reason)
+
+
+class OrdbokRequiredValueException(OrdbokException):
+    def __init__(self, key):
+        self.key = key
+
+    def __repr__(self):
+        return ('{} config key is required by the schema but was not set.'
+                ''.format(self.key))
+
+
+class OrdbokInvalidValueException(OrdbokException):
+    def __init__(self, key, value, type_name, reason):
+        self.key = key
+        self.value = value
+        self.type_name = type_name
+        self.reason = reason
+
+    def __repr__(self):
+        return '{} config key must be a valid {}: {}'.format(
+            self.key, self.type_name, self.reason)
+
+
+class OrdbokSchemaException(OrdbokException):
+    def __init__(self, errors):
+        self.errors = errors
+
+    def __repr__(self):
+        return 'Invalid config ({} errors):\n{}'.format(
+            len(self.errors),
+            '\n'.join('  ' + repr(error) for error in self.errors))
@@ -7,7 +7,15 @@ class FlaskOrdbok(Ordbok):
             self.init_app(app)
         return super(FlaskOrdbok, self).__init__(**kwargs)
 
-    def init_app(self, app):
+    def init_app(self, app, shared=None):
+        '''
+        Register with `app`. If `shared` is given it overrides the `shared`
+        option, so an app factory can opt in to loading from a config
+        segment published by the server's master process (see
+        `Ordbok.share`).
+        '''
+        if shared is not None:
+            self.shared = shared
         if not hasattr(app, 'extensions'):
             app.extensions = {}
         app.extensions['ordbok'] = self
@@ -0,0 +1,131 @@
+import re
+import six
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # Python 2
+    from collections import Mapping
+
+
+_IDENTIFIER = re.compile(r'^[A-Za-z][A-Za-z0-9_]*\Z')
+
+
+def freeze_value(value):
+    '''
+    Return an immutable equivalent of `value`: mappings become
+    `FrozenDict`s, lists and tuples become tuples and sets become
+    frozensets, recursively. Other values are returned as they are.
+    '''
+    if isinstance(value, FrozenDict):
+        return value
+    elif isinstance(value, Mapping):
+        return FrozenDict(value)
+    elif isinstance(value, (list, tuple)):
+        return tuple(freeze_value(v) for v in value)
+    elif isinstance(value, (set, frozenset)):
+        return frozenset(freeze_value(v) for v in value)
+    return value
+
+
+class FrozenDict(Mapping):
+    '''
+    Immutable, hashable mapping with nested values frozen by
+    `freeze_value`. Keys which are valid identifiers (and do not clash
+    with a method) can also be read as attributes; these are stored on the
+    instance when it is created, so attribute reads are plain lookups.
+    '''
+    def __init__(self, *args, **kwargs):
+        data = dict((key, freeze_value(value)) for key, value in
+                    six.iteritems(dict(*args, **kwargs)))
+        attrs = self.__dict__
+        attrs['_data'] = data
+        attrs['_hash'] = None
+        for key, value in six.iteritems(data):
+            if (isinstance(key, six.string_types) and
+                    _IDENTIFIER.match(key) and not hasattr(type(self), key)):
+                attrs[key] = value
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def __eq__(self, other):
+        if isinstance(other, FrozenDict):
+            return self._data == other._data
+        elif isinstance(other, Mapping):
+            return self._data == dict(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        if self._hash is None:
+            self.__dict__['_hash'] = hash(frozenset(six.iteritems(self._data)))
+        return self._hash
+
+    def __setattr__(self, key, value):
+        raise AttributeError(
+            "'{}' object is immutable".format(type(self).__name__))
+
+    def __delattr__(self, key):
+        raise AttributeError(
+            "'{}' object is immutable".format(type(self).__name__))
+
+    def __reduce__(self):
+        return (type(self), (self._data,))
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self._data)
+
+    def thaw(self):
+        '''
+        Return a mutable copy, with nested `FrozenDict`s as dicts and
+        tuples as lists.
+        '''
+        return thaw_value(self)
+
+
+def thaw_value(value):
+    if isinstance(value, FrozenDict):
+        return dict((key, thaw_value(v)) for key, v in
+                    six.iteritems(value._data))
+    elif isinstance(value, tuple):
+        return [thaw_value(v) for v in value]
+    return value
+
+
+class FrozenConfig(FrozenDict):
+    '''
+    Snapshot of a loaded `Ordbok` returned by `Ordbok.freeze()`. Its
+    `generation` is that of the instance when it was frozen, so comparing
+    it with the instance's current `generation` shows whether the config
+    has been reloaded since.
+    '''
+    def __init__(self, *args, **kwargs):
+        generation = kwargs.pop('generation', 0)
+        super(FrozenConfig, self).__init__(*args, **kwargs)
+        self.__dict__['generation'] = generation
+
+    def __reduce__(self):
+        return (_frozen_config, (self._data, self.generation))
+
+    def __repr__(self):
+        return '{}({!r}, generation={})'.format(
+            type(self).__name__, self._data, self.generation)
+
+
+def _frozen_config(data, generation):
+    return FrozenConfig(data, generation=generation)
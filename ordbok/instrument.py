@@ -0,0 +1,169 @@
+import timeit
+from collections import OrderedDict
+
+
+# Stages of loading a config file. `source` is time spent getting its
+# content other than reading, decrypting and parsing it (checking whether
+# it changed and the on disk cache), and `merge` is time spent loading it
+# other than getting its content and validating it.
+STAGES = ('source', 'read', 'decrypt', 'parse', 'validate', 'merge')
+
+_STAGE_METHODS = (
+    ('read', ('_read_file', '_load_encrypted_file', '_environ')),
+    ('decrypt', ('_decrypt_content',)),
+    ('parse', ('_parse_yaml', '_parse_environment')),
+    ('validate', ('_validate_key', '_validate_nested_keys',
+                  '_referenced_config_file', '_check_required_keys')),
+    ('content', ('_load_prefetched',)),
+    ('total', ('load',)),
+)
+
+
+class ConfigFileReport(object):
+    def __init__(self, name):
+        self.name = name
+        self.stages = OrderedDict((stage, 0.0) for stage in STAGES)
+        self.total = 0.0
+        self.keys = 0
+        self.bytes = 0
+
+    def as_dict(self):
+        return {'name': self.name, 'stages': dict(self.stages),
+                'total': self.total, 'keys': self.keys, 'bytes': self.bytes}
+
+
+class LoadReport(object):
+    '''
+    Timings and counters for one load or reload of an `Ordbok` instance:
+    the seconds spent in each stage of loading each config file, how many
+    keys each one set and how many bytes were read for it. Config files
+    loaded with `parallel` are mostly loaded while prefetching, which is
+    only timed as a whole.
+    '''
+    def __init__(self):
+        self.files = OrderedDict()
+        self.prefetch = 0.0
+        self.total = 0.0
+
+    def config_file(self, name):
+        if name not in self.files:
+            self.files[name] = ConfigFileReport(name)
+        return self.files[name]
+
+    @property
+    def stages(self):
+        '''
+        Seconds spent in each stage, summed over every config file.
+        '''
+        return OrderedDict(
+            (stage, sum(f.stages[stage] for f in self.files.values()))
+            for stage in STAGES)
+
+    def as_dict(self):
+        return {
+            'total': self.total,
+            'prefetch': self.prefetch,
+            'stages': dict(self.stages),
+            'files': [f.as_dict() for f in self.files.values()],
+        }
+
+    def metrics(self):
+        '''
+        Yield `(name, value, tags)` for every measurement in the report,
+        for exporting to a metrics system.
+        '''
+        yield 'load.seconds', self.total, {}
+        if self.prefetch:
+            yield 'prefetch.seconds', self.prefetch, {}
+        for stage, seconds in self.stages.items():
+            yield 'stage.seconds', seconds, {'stage': stage}
+        for f in self.files.values():
+            yield 'file.seconds', f.total, {'file': f.name}
+            for stage, seconds in f.stages.items():
+                yield 'file.stage.seconds', seconds, {
+                    'file': f.name, 'stage': stage}
+            yield 'file.keys', f.keys, {'file': f.name}
+            yield 'file.bytes', f.bytes, {'file': f.name}
+
+
+def _timed(method, times, depths, key, counter=None):
+    # only the outermost of nested (e.g. recursive) calls in a stage is timed
+    timer = timeit.default_timer
+
+    def wrapper(*args, **kwargs):
+        depths[key] += 1
+        start = timer()
+        try:
+            result = method(*args, **kwargs)
+        finally:
+            depths[key] -= 1
+            if not depths[key]:
+                times[key] += timer() - start
+        if counter is not None:
+            counter(result)
+        return result
+    return wrapper
+
+
+def instrument_config_file(config_file, report):
+    '''
+    Wrap the methods for each stage of loading `config_file` to record
+    their timings in `report`. The wrappers are set on the instance, so
+    config files which are not instrumented are not slowed down at all.
+    Returns a function which removes them and completes the report.
+    '''
+    file_report = report.config_file(getattr(
+        config_file, 'filename', config_file.keyword))
+    times = dict.fromkeys(['content', 'total'] + list(STAGES), 0.0)
+    depths = dict.fromkeys(times, 0)
+
+    def count_bytes(content):
+        file_report.bytes += len(content or ())
+
+    def count_keys(content):
+        file_report.keys += len(content or ())
+
+    counters = {
+        '_read_file': count_bytes, '_load_encrypted_file': count_bytes,
+        '_environ': count_keys, '_load_prefetched': count_keys}
+    wrapped = []
+    for stage, method_names in _STAGE_METHODS:
+        for method_name in method_names:
+            method = getattr(config_file, method_name, None)
+            if method is None:
+                continue
+            setattr(config_file, method_name, _timed(
+                method, times, depths, stage, counters.get(method_name)))
+            wrapped.append(method_name)
+
+    def finish():
+        for method_name in wrapped:
+            delattr(config_file, method_name)
+        stages = file_report.stages
+        for stage in ('read', 'decrypt', 'parse', 'validate'):
+            stages[stage] += times[stage]
+        # ConfigEnv reads the environment without `_load_prefetched`
+        content = times['read'] + times['decrypt'] + times['parse']
+        stages['source'] += max(0.0, times['content'] - content)
+        stages['merge'] += max(0.0, times['total'] - times['validate'] -
+                               max(times['content'], content))
+        file_report.total += times['total']
+    return finish
+
+
+def statsd_exporter(client, prefix='ordbok'):
+    '''
+    Return an exporter sending a load report to a statsd `client` (any
+    object with `timing(name, milliseconds)` and `gauge(name, value)`
+    methods), with tags appended to metric names.
+    '''
+    def export(report):
+        for name, value, tags in report.metrics():
+            metric = '.'.join([prefix, name] + [
+                '{}_{}'.format(tag, tags[tag]).replace('.', '_')
+                for tag in sorted(tags)])
+            if name.endswith('.seconds'):
+                client.timing(metric, value * 1000)
+            else:
+                client.gauge(metric, value)
+    return export
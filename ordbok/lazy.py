@@ -0,0 +1,176 @@
+import six
+
+
+def _index_entry(value, namespace):
+    if value is None:
+        return 0
+    elif (isinstance(value, six.string_types) and
+            value.startswith(namespace)):
+        # references to other config files are kept, as they are not
+        # secret and have to be registered when the file is loaded
+        return value
+    return 1
+
+
+def build_index(content, namespace):
+    '''
+    Index the keys of a private config file's (parsed) `content`, for each
+    environment section and for the file as a whole. Each key is mapped
+    to 0 if its value is None, the value itself if it references another
+    config file and 1 otherwise, so the file can be loaded without being
+    decrypted until one of its values is read.
+    '''
+    return {
+        'keys': dict((key, _index_entry(value, namespace))
+                     for key, value in content.items()),
+        'sections': dict(
+            (key, dict((k, _index_entry(v, namespace))
+                       for k, v in value.items()))
+            for key, value in content.items() if isinstance(value, dict)),
+    }
+
+
+def select_index(index, environment):
+    '''
+    The part of `index` for `environment`, mirroring
+    `ConfigFile._select_environment`, or None if it can't be selected.
+    '''
+    section = environment.upper()
+    if section in index['sections']:
+        return index['sections'][section]
+    elif section in index['keys']:
+        return None
+    return index['keys']
+
+
+class LazyOrdbokMixin(object):
+    '''
+    Behaviour of an `Ordbok` instance while some of its keys are deferred
+    (see `Ordbok(lazy=True)` and `Ordbok(shared=True)`). Instances only use
+    it while they have deferred keys, so eager instances pay nothing for
+    it.
+
+    Deferred keys are not stored in the dict until the file setting them
+    is decrypted (or the shared segment value decoded), which happens the
+    first time one of them is read. Every
+    operation on the dict as a whole (iterating it, copying it, comparing
+    it) materializes every deferred key first.
+    '''
+    def __missing__(self, key):
+        deferred = self._deferred.get(key)
+        if deferred is None:
+            raise KeyError(key)
+        self._materialize_file(deferred[0], key)
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        if key in self._deferred:
+            return self[key]
+        return dict.get(self, key, default)
+
+    def __contains__(self, key):
+        return key in self._deferred or dict.__contains__(self, key)
+
+    def __len__(self):
+        return dict.__len__(self) + len(self._deferred)
+
+    def __setitem__(self, key, value):
+        if self._deferred.pop(key, None) is not None:
+            self._check_materialized()
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        if self._deferred.pop(key, None) is not None:
+            self._check_materialized()
+            dict.pop(self, key, None)
+        else:
+            dict.__delitem__(self, key)
+
+    def pop(self, key, *default):
+        if key in self._deferred:
+            self[key]
+        return dict.pop(self, key, *default)
+
+    def setdefault(self, key, default=None):
+        if key in self._deferred:
+            return self[key]
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        self._deferred.clear()
+        self._check_materialized()
+        dict.clear(self)
+
+    def __iter__(self):
+        self.materialize()
+        return dict.__iter__(self)
+
+    def keys(self):
+        self.materialize()
+        return dict.keys(self)
+
+    def values(self):
+        self.materialize()
+        return dict.values(self)
+
+    def items(self):
+        self.materialize()
+        return dict.items(self)
+
+    if six.PY2:
+        def iterkeys(self):
+            self.materialize()
+            return dict.iterkeys(self)
+
+        def itervalues(self):
+            self.materialize()
+            return dict.itervalues(self)
+
+        def iteritems(self):
+            self.materialize()
+            return dict.iteritems(self)
+
+    def popitem(self):
+        self.materialize()
+        return dict.popitem(self)
+
+    def copy(self):
+        self.materialize()
+        return dict.copy(self)
+
+    def __eq__(self, other):
+        self.materialize()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        self.materialize()
+        return dict.__ne__(self, other)
+
+    __hash__ = None
+
+    def __reduce_ex__(self, protocol):
+        # the lazy class can't be pickled by name
+        self.materialize()
+        return self.__reduce_ex__(protocol)
+
+    def __repr__(self):
+        self.materialize()
+        return dict.__repr__(self)
+
+
+_lazy_classes = {}
+
+
+def lazy_class(cls):
+    '''
+    The subclass of `cls` an instance uses while it has deferred keys.
+    '''
+    if cls not in _lazy_classes:
+        _lazy_classes[cls] = type(
+            'Lazy' + cls.__name__, (LazyOrdbokMixin, cls),
+            {'_eager_class': cls})
+    return _lazy_classes[cls]
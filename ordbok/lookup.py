@@ -0,0 +1,30 @@
+from bisect import bisect_right
+from .exceptions import OrdbokAmbiguousConfigFileException
+
+
+class ConfigFileLookup(dict):
+    '''
+    Mapping of config file keywords (e.g. `ordbok_local_config`) to config
+    files, indexed so the keyword a value references can be found without
+    checking every keyword.
+
+    Keywords are kept sorted. Since no keyword may be a prefix of another,
+    the only keyword which can be a prefix of a value is the greatest
+    keyword sorting before it, so a lookup is a single bisect.
+    '''
+    def __init__(self, *args, **kwargs):
+        super(ConfigFileLookup, self).__init__(*args, **kwargs)
+        self._keywords = sorted(self.keys())
+        for keyword, next_keyword in zip(self._keywords, self._keywords[1:]):
+            if next_keyword.startswith(keyword):
+                raise OrdbokAmbiguousConfigFileException(
+                    [keyword, next_keyword])
+
+    def match(self, value):
+        '''
+        Return the keyword `value` references, or None.
+        '''
+        i = bisect_right(self._keywords, value)
+        if i and value.startswith(self._keywords[i - 1]):
+            return self._keywords[i - 1]
+        return None
@@ -1,14 +1,36 @@
 import os
+import copy
+import timeit
+import threading
 import six
-from .util import create_config_file
+from .util import create_config_file, prefetch_config_file
+from .cache import ConfigCache
+from .crypto import KeyCache
 from .config_env import ConfigEnv
-from .exceptions import OrdbokMissingPrivateKeyException
+from .config_source import ConfigSource
+from .lookup import ConfigFileLookup
+from .reload import ConfigDiff, ConfigWatcher
+from .frozen import FrozenConfig
+from .overlay import ConfigOverlay
+from .instrument import LoadReport, instrument_config_file
+from .lazy import lazy_class
+from .provenance import Provenance, KeyOrigin, KeyExplanation, value_at
+from .schema import as_schema
+from .shared import (
+    SharedConfig, publish, default_shared_path, unpublish_at_exit)
+from .exceptions import (
+    OrdbokMissingPrivateKeyException, OrdbokSharedConfigException,
+    OrdbokSchemaException)
 
 
 class Ordbok(dict):
     def __init__(self, config_files=None, config_dir='config',
                  include_env=True, namespace='ordbok',
-                 default_environment='development', **kwargs):
+                 default_environment='development', cache_dir=None,
+                 yaml_loader=None, key_cache_path=None, parallel=None,
+                 max_workers=None, declared_env_only=False, shared=False,
+                 instrument=False, lazy=False, streaming=False,
+                 provenance=False, schema=None, **kwargs):
         self.config_files = config_files
         if not self.config_files:
             self.config_files = ['config.yml', 'local_config.yml']
@@ -16,7 +38,42 @@ class Ordbok(dict):
         self.include_env = include_env
         self.namespace = namespace
         self.default_environment = default_environment
+        self.cache_dir = cache_dir
+        self.yaml_loader = yaml_loader
+        self.key_cache = KeyCache(key_cache_path)
+        self.parallel = parallel
+        self.max_workers = max_workers
+        self.declared_env_only = declared_env_only
+        self.shared = shared
+        self.shared_config = None
+        self.shared_path = None
+        self.instrument = instrument
+        self.lazy = lazy
+        self.streaming = streaming
+        self.provenance = provenance
+        self.schema = schema
+        # the compiled schema, and errors collected while loading with one
+        self._schema = None
+        self._errors = None
+        # (key, reference) of the references to the environment of config
+        # loaded from an artifact, which are made again on each load
+        self._env_references = ()
+        # keys set by private config files which have not been decrypted
+        # yet (or by a shared segment, not decoded yet), mapped to (config
+        # file or segment, whether the value is not None)
+        self._deferred = {}
+        # where each key was set, for reloading incrementally and explaining
+        # keys, with provenance=True; None once keys have been deferred, as
+        # they are set without it
+        self._provenance = None
+        self.load_report = None
+        self._exporters = []
+        self.config_cache = None
         self.loaded = False
+        self.generation = 0
+        self._reload_lock = threading.RLock()
+        self._subscribers = []
+        self._watchers = []
         return super(Ordbok, self).__init__(**kwargs)
 
     @property
@@ -30,12 +87,37 @@ class Ordbok(dict):
         return (
             [getattr(config_file, 'config_file_path', None)
              for config_file in self.config_files if
-             hasattr(config_file, 'config_file_path')] +
+             hasattr(config_file, 'config_file_path') and
+             not isinstance(config_file, ConfigSource)] +
             [config_file for config_file in self.config_files if
              isinstance(config_file, six.string_types)]
         )
 
+    @classmethod
+    def from_artifact(cls, path, password=None, **kwargs):
+        '''
+        Return a loaded instance of the config in the artifact at `path`,
+        built with `ordbok build` (or `ordbok.artifact.write_artifact`).
+        No config files are read, parsed or validated: only the
+        environment is applied on top of the artifact, as usual.
+        Encrypted artifacts are decrypted with `password`, which defaults
+        to `PRIVATE_KEY_ORDBOK` from the environment. `kwargs` are passed
+        to `Ordbok`.
+        '''
+        from .artifact import load_artifact
+        return load_artifact(cls(**kwargs), path, password)
+
     def load(self):
+        if self._start_load():
+            self._load_config_files(
+                [create_config_file(f) for f in self.config_files])
+            self._finish_load()
+
+    def _start_load(self):
+        '''
+        Set up a first load, returning False if the config was attached to
+        a shared segment instead and there are no config files to load.
+        '''
         if self.loaded:
             raise Exception('Ordbok instance can only be loaded once.')
         if not self.get('ENVIRONMENT'):
@@ -43,28 +125,610 @@ class Ordbok(dict):
                 '{}_ENVIRONMENT'.format(self.namespace.upper()),
                 self.default_environment).lower()
 
-        self.config_files = [create_config_file(f) for f in self.config_files]
+        # values set before loading, which every reload starts from
+        self._defaults = dict(self)
+        self._schema = as_schema(self.schema)
+        if self.shared and self._attach_shared_config():
+            return False
 
+        if self.cache_dir:
+            self.config_cache = ConfigCache(self.cache_dir)
+        return True
+
+    def _finish_load(self):
+        self.generation += 1
+        self.loaded = True
+        if self.shared:
+            self.share()
+        self._export_load_report()
+
+    def _load_config_files(self, config_files):
+        report, start = self._init_config_files(config_files)
+        if self.parallel:
+            self._prefetch_config_files()
+            if report:
+                report.prefetch = timeit.default_timer() - start
+        self._apply_config_files(report, start)
+
+    def _init_config_files(self, config_files):
+        report = LoadReport() if self.instrument else None
+        start = timeit.default_timer()
+        self._deferred = {}
+        self._provenance = Provenance() if self.provenance else None
+        self.config_files = config_files
         for f in self.config_files:
             f.init_config(self)
 
         if self.include_env:
-            self.config_files.append(ConfigEnv(self))
+            config_env = ConfigEnv(self, declared_only=self.declared_env_only)
+            for key, reference in self._env_references:
+                config_env.add_required_key(key, reference)
+            self.config_files.append(config_env)
+        return report, start
+
+    def _apply_config_files(self, report, start):
+        config_files_lookup = ConfigFileLookup(
+            (cf.keyword, cf) for cf in self.config_files)
+        if report:
+            finishers = [instrument_config_file(cf, report)
+                         for cf in self.config_files]
+        try:
+            self._errors = [] if self._schema is not None else None
+            for config_file in self.config_files:
+                config_file.load(config_files_lookup)
+            self._apply_schema()
+        finally:
+            self._errors = None
+            if report:
+                for finish in finishers:
+                    finish()
+                report.total = timeit.default_timer() - start
+                self.load_report = report
+
+    def reload(self):
+        '''
+        Load the config files again and swap the result in, returning a
+        `ConfigDiff` of the keys which changed. With provenance, or once
+        the config is watched or has subscribers, files which have not
+        changed since they were last read are not parsed again.
+
+        With provenance, only the keys set by files which changed are
+        recomputed, and only their required key checks are run again,
+        unless a file's references to other files changed (in which case
+        every file is loaded again). The new config is loaded and
+        validated separately, so if loading it raises the current config
+        is left untouched. The new and changed values are then set and
+        removed keys deleted after them, so a thread reading several keys
+        during a reload can see some old and some new values (read them
+        from a `freeze()` snapshot, which never changes, instead).
+        Subscribers are called with the instance and the diff if anything
+        changed.
+        '''
+        return self._reload()
+
+    def _reload(self):
+        if not self.loaded:
+            raise Exception('Ordbok instance must be loaded before reload.')
+        with self._reload_lock:
+            if self.shared_config is not None:
+                staged = SharedConfig(self.shared_config.path)
+                diff = self._apply_shared_config(staged)
+                self.shared_config.close()
+                self.shared_config = staged
+            else:
+                self.materialize()
+                diff = self._reload_changed_files()
+                if diff is None:
+                    diff = self._reload_all()
+            if diff:
+                self.generation += 1
+                if self.shared_config is None and self.shared_path:
+                    self.share(self.shared_path)
+            subscribers = list(self._subscribers)
+        self._export_load_report()
+        if diff:
+            for callback in subscribers:
+                callback(self, diff)
+        return diff
+
+    def _apply_staged(self, staged):
+        diff = ConfigDiff.compare(self, staged)
+        self._swap_values(
+            dict((key, staged[key]) for key in diff.added | diff.changed),
+            diff.removed)
+        return diff
+
+    def _swap_values(self, values, removed):
+        dict.update(self, values)
+        for key in removed:
+            dict.pop(self, key, None)
+
+    def _apply_shared_config(self, staged):
+        '''
+        Switch to the shared segment `staged`, comparing the encoded values
+        of the current segment's keys to find those which changed, so none
+        are decoded. Changed keys are deferred to be decoded from `staged`.
+        '''
+        defaults = self._check_shared_config(staged)
+        current = self.shared_config
+        diff = ConfigDiff(
+            added=set(key for key in staged if key not in current),
+            removed=set(key for key in current if key not in staged),
+            changed=set(key for key in staged if key in current and
+                        staged.raw(key) != current.raw(key)))
+        for key in diff.removed:
+            self._deferred.pop(key, None)
+            dict.pop(self, key, None)
+        dict.update(self, defaults)
+        for key in staged:
+            if key in diff.added or key in diff.changed or (
+                    key in self._deferred):
+                self._defer_key(key, staged, staged.has_value(key))
+        self._check_materialized()
+        return diff
 
-        config_files_lookup = {cf.keyword: cf for cf in self.config_files}
+    def _reload_all(self):
+        staged = copy.copy(self)
+        staged.clear()
+        staged.update(self._defaults)
+        # copies don't keep these, but the staged files only keep their
+        # content if there are any
+        staged._subscribers = self._subscribers
+        staged._watchers = self._watchers
+        staged._load_config_files([
+            copy.copy(f) for f in self.config_files
+            if not isinstance(f, ConfigEnv)])
+        for config_file in staged.config_files:
+            config_file.config = self
+        self.config_files = staged.config_files
+        self._provenance = staged._provenance
+        self.load_report = staged.load_report
+        return self._apply_staged(staged)
+
+    def _split_references(self, config_file, content):
+        if isinstance(config_file, ConfigEnv):
+            return content, {}
+        values, references = {}, {}
+        for key, value in content.items():
+            if (isinstance(value, six.string_types) and
+                    value.startswith(self.namespace)):
+                references[key] = value
+            else:
+                values[key] = value
+        return values, references
+
+    def _reload_changed_files(self):
+        '''
+        Reload the config files which changed since they were loaded and
+        recompute only the keys they set (or used to set), returning the
+        diff. Returns None, without changing anything, if the config has to
+        be loaded in full: if it was loaded without provenance (lazily or
+        instrumented), a file's references changed or the environment or
+        private key files are loaded with changed.
+        '''
+        provenance = self._provenance
+        if provenance is None or self.instrument:
+            return None
+        order = dict((f.keyword, i) for i, f in enumerate(self.config_files))
+        sources, contents, affected = [], {}, set()
         for config_file in self.config_files:
-            config_file.load(config_files_lookup)
+            if isinstance(config_file, ConfigEnv):
+                source = (None, None, config_file._load_content())
+            elif config_file._skip_environment():
+                continue
+            else:
+                source = config_file._load_source()
+            old_source = config_file._source
+            if old_source is None:
+                return None
+            if source is old_source:
+                continue
+            sources.append((config_file, source))
+            if source[2] == old_source[2]:
+                continue
+            old_values, old_references = self._split_references(
+                config_file, old_source[2] or {})
+            values, references = self._split_references(
+                config_file, source[2] or {})
+            if references != old_references:
+                return None
+            if not isinstance(config_file, ConfigEnv):
+                for key, value in values.items():
+                    config_file._validate_key(key)
+                    if isinstance(value, dict):
+                        config_file._validate_nested_keys(value)
+            contents[config_file.keyword] = values
+            affected.update(old_values, values)
+        if affected & set(['ENVIRONMENT', 'PRIVATE_KEY_ORDBOK']):
+            return None
+
+        setters = provenance.replace(affected, contents, order)
+        config_files = dict((f.keyword, f) for f in self.config_files)
+        errors = [] if self._schema is not None else None
+        for key in affected:
+            for keyword, _ in provenance.required.get(key, ()):
+                if value_at(setters[key], order[keyword], order,
+                            self._defaults.get(key)) is None:
+                    error = config_files[keyword]._missing_key(key)
+                    if error is None:
+                        continue
+                    elif errors is None:
+                        raise error
+                    errors.append(error)
+
+        values = {}
+        for key in affected:
+            if setters[key]:
+                values[key] = setters[key][-1][1]
+            elif key in self._defaults:
+                values[key] = self._defaults[key]
+        if self._schema is not None:
+            values.update(self._schema.coerce(values, errors, keys=affected))
+            if errors:
+                raise OrdbokSchemaException(errors)
+
+        diff = ConfigDiff(set(), set(), set())
+        for key in affected:
+            if key not in values:
+                if key in self:
+                    diff.removed.add(key)
+            elif key not in self:
+                diff.added.add(key)
+            elif self[key] != values[key]:
+                diff.changed.add(key)
+
+        for config_file, source in sources:
+            config_file._retain_source(source)
+        provenance.update(setters)
+        self._swap_values(
+            dict((key, values[key]) for key in diff.added | diff.changed),
+            diff.removed)
+        return diff
+
+    def _report_error(self, error):
+        '''
+        Raise `error`, or with a schema, collect it to be raised with every
+        other error by `_apply_schema`.
+        '''
+        if self._errors is None:
+            raise error
+        self._errors.append(error)
+
+    def _apply_schema(self):
+        '''
+        Coerce the declared keys to their types and raise every error
+        collected while loading at once.
+        '''
+        errors, self._errors = self._errors, None
+        if self._schema is None:
+            return
+        coerced = self._schema.coerce(self, errors, deferred=dict(
+            (key, has_value) for key, (_, has_value)
+            in self._deferred.items()))
+        if errors:
+            raise OrdbokSchemaException(errors)
+        dict.update(self, coerced)
+
+    def _defer_key(self, key, config_file, has_value):
+        self._provenance = None
+        if not self._deferred:
+            self.__class__ = lazy_class(type(self))
+        dict.pop(self, key, None)
+        self._deferred[key] = (config_file, has_value)
+
+    def _has_value(self, key):
+        deferred = self._deferred.get(key)
+        if deferred is not None:
+            return deferred[1]
+        return dict.get(self, key) is not None
+
+    def _check_materialized(self):
+        if not self._deferred and hasattr(self, '_eager_class'):
+            self.__class__ = self._eager_class
+
+    def _materialize_file(self, config_file, key=None):
+        '''
+        Set the deferred keys of `config_file`, decrypting it. Values of a
+        shared segment are decoded separately, so only `key` is set if it
+        is given.
+        '''
+        with self._reload_lock:
+            if isinstance(config_file, SharedConfig):
+                self._materialize_shared(config_file, key)
+                return
+            keys = [key for key, (f, _) in self._deferred.items()
+                    if f is config_file]
+            if not keys:
+                return
+            content = config_file._load_deferred()
+            values = dict((key, content.get(key)) for key in keys)
+            for value in values.values():
+                if isinstance(value, dict):
+                    config_file._validate_nested_keys(value)
+            if self._schema is not None:
+                errors = []
+                values.update(self._schema.coerce(values, errors, keys=keys))
+                if errors:
+                    raise OrdbokSchemaException(errors)
+            for key, value in values.items():
+                dict.__setitem__(self, key, value)
+                del self._deferred[key]
+            self._check_materialized()
+
+    def _materialize_shared(self, shared_config, key=None):
+        keys = [k for k, (f, _) in self._deferred.items()
+                if f is shared_config and (key is None or k == key)]
+        values = dict((k, shared_config[k]) for k in keys)
+        if self._schema is not None:
+            # the publisher may have loaded with another schema
+            errors = []
+            values.update(self._schema.coerce(values, errors, keys=keys))
+            if errors:
+                raise OrdbokSchemaException(errors)
+        for k, value in values.items():
+            dict.__setitem__(self, k, value)
+            del self._deferred[k]
+        self._check_materialized()
+
+    def _check_shared_config(self, shared_config):
+        '''
+        Check the keys the schema requires are set in `shared_config`,
+        without decoding them, returning the defaults of the optional keys
+        which aren't.
+        '''
+        if self._schema is None:
+            return {}
+        errors = []
+        defaults = self._schema.coerce({}, errors, deferred=dict(
+            (key, shared_config.has_value(key)) for key in shared_config))
+        if errors:
+            raise OrdbokSchemaException(errors)
+        return defaults
+
+    def materialize(self):
+        '''
+        Decrypt every private config file deferred by a lazy load and set
+        its keys. Returns the instance.
+        '''
+        with self._reload_lock:
+            config_files = dict(
+                (id(f), f) for f, _ in self._deferred.values())
+            for config_file in config_files.values():
+                self._materialize_file(config_file)
+        return self
+
+    def explain(self, key):
+        '''
+        Return a `KeyExplanation` of where `key` was set: the value each
+        config file set for it (and its value before loading, if it had
+        one), in load order, and the config files which earlier files
+        required to set it.
+        '''
+        if self._provenance is None:
+            raise Exception('Ordbok instance was loaded without '
+                            'provenance=True (or lazily), so keys can not '
+                            'be explained.')
+        config_files = dict((f.keyword, f) for f in self.config_files)
+
+        def source(keyword):
+            config_file = config_files[keyword]
+            return getattr(config_file, 'filename', keyword)
+
+        origins = []
+        if key in self._defaults:
+            origins.append(KeyOrigin('defaults', None, self._defaults[key]))
+        for keyword, value in self._provenance.setters(key):
+            origins.append(KeyOrigin(
+                source(keyword), config_files[keyword]._key_section(key),
+                value))
+        required = [(source(keyword), source(required_by))
+                    for keyword, required_by
+                    in self._provenance.required.get(key, ())]
+        return KeyExplanation(key, origins, required)
+
+    def freeze(self):
+        '''
+        Return an immutable `FrozenConfig` snapshot of the config, tagged
+        with the current `generation`. Reading a snapshot takes no locks
+        and a reload never changes it, so it can be shared between threads.
+        '''
+        with self._reload_lock:
+            return FrozenConfig(self, generation=self.generation)
+
+    def compile_environments(self, environments=None):
+        '''
+        Resolve the config for each of `environments` (every environment
+        with a section in the config files if None) in one pass over the
+        config files, returning a dict of environment to config. See
+        `ordbok.compile.EnvironmentCompiler`.
+        '''
+        from .compile import EnvironmentCompiler
+        return EnvironmentCompiler(self).compile(environments)
+
+    def overlay(self, overrides=None):
+        '''
+        Return a `ConfigOverlay` of `overrides` on top of the config, which
+        shares its storage and follows its reloads.
+        '''
+        return ConfigOverlay(self, overrides)
+
+    def subscribe(self, callback):
+        '''
+        Call `callback(ordbok, diff)` after each reload which changes the
+        config.
+        '''
+        self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def add_exporter(self, exporter):
+        '''
+        Call `exporter(load_report)` after each load and reload, e.g. with
+        `ordbok.instrument.statsd_exporter(client)`. Enables `instrument`.
+        '''
+        self.instrument = True
+        self._exporters.append(exporter)
+        return exporter
+
+    def _export_load_report(self):
+        if self.load_report is not None:
+            for exporter in self._exporters:
+                exporter(self.load_report)
+
+    @property
+    def shared_env_var(self):
+        return '{}_SHARED_CONFIG'.format(self.namespace.upper())
+
+    def share(self, path=None):
+        '''
+        Publish the loaded config as a memory mapped segment at `path`
+        (by default in /dev/shm), which is removed when this process exits.
+        The path is set in the `<NAMESPACE>_SHARED_CONFIG` environment
+        variable, so child processes loading with `shared=True` attach to
+        it instead of loading the config files themselves.
+        '''
+        if not self.loaded:
+            raise Exception('Ordbok instance must be loaded before share.')
+        if path is None:
+            path = self.shared_path or default_shared_path(self.namespace)
+        with self._reload_lock:
+            publish(self, path, self.generation, self._shared_options())
+        if path != self.shared_path:
+            unpublish_at_exit(path)
+            self.shared_path = path
+        os.environ[self.shared_env_var] = path
+        return path
+
+    def _shared_options(self):
+        '''
+        The options which decide what config is loaded, which must be the
+        same as those of the process which published a segment to attach
+        to it.
+        '''
+        config_files = [create_config_file(f) for f in self.config_files
+                        if not isinstance(f, ConfigEnv)]
+        return [os.path.abspath(os.path.join(self.config_cwd,
+                                             self.config_dir)),
+                [[type(f).__name__, f.filename] for f in config_files],
+                self.include_env, self.declared_env_only,
+                self['ENVIRONMENT']]
+
+    def _attach_shared_config(self):
+        '''
+        Attach to the segment published by a parent process, if there is
+        one. Its keys are deferred, so each value is only decoded (into
+        this process' memory) the first time it is read, and coerced with
+        the schema then. Returns False, so the config files are loaded as
+        usual, if it is missing or unreadable, or was published by a
+        process loading other config files (or another environment).
+        '''
+        path = os.environ.get(self.shared_env_var)
+        if not path or path == self.shared_path:
+            return False
+        try:
+            shared_config = SharedConfig(path)
+        except OrdbokSharedConfigException:
+            return False
+        if shared_config.options != self._shared_options():
+            shared_config.close()
+            return False
+        defaults = self._check_shared_config(shared_config)
+        self.shared_config = shared_config
+        for key in shared_config:
+            self._defer_key(key, shared_config, shared_config.has_value(key))
+        dict.update(self, defaults)
+        self.generation += 1
         self.loaded = True
+        return True
 
     @property
-    def private_file_key(self):
-        key = self.get(
+    def watched_paths(self):
+        if self.shared_config is not None:
+            return [self.shared_config.path]
+        return [path for config_file in self.config_files
+                if not isinstance(config_file, ConfigEnv)
+                for path in config_file.source_paths()]
+
+    def watch(self, interval=1.0, use_inotify=True):
+        '''
+        Start a background thread which reloads the config whenever one of
+        its files changes. Returns the watcher; call `stop()` on it to stop
+        watching.
+        '''
+        if not self.loaded:
+            raise Exception('Ordbok instance must be loaded before watch.')
+        watcher = ConfigWatcher(self, interval=interval,
+                                use_inotify=use_inotify)
+        self._watchers.append(watcher)
+        watcher.start()
+        return watcher
+
+    def _keeps_sources(self):
+        '''
+        Whether config files keep the content they were loaded from, so
+        reloads only read the files which changed: with provenance, or
+        once the config has a watcher or subscribers.
+        '''
+        return bool(self._provenance is not None or self._subscribers or
+                    self._watchers)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_reload_lock', None)
+        state.pop('_subscribers', None)
+        state.pop('_watchers', None)
+        state.pop('_exporters', None)
+        state['shared_config'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reload_lock = threading.RLock()
+        self._subscribers = []
+        self._watchers = []
+        self._exporters = []
+
+    def _prefetch_config_files(self):
+        '''
+        Read, decrypt and parse every config file concurrently. Results are
+        applied in order by `ConfigFile.load`, which loads the file itself
+        if prefetching it failed or its result is stale (e.g. an earlier
+        file set PRIVATE_KEY_ORDBOK), so errors are raised in the same
+        order as a serial load.
+        '''
+        from concurrent import futures
+        if self.parallel == 'process':
+            executor_class = futures.ProcessPoolExecutor
+        elif self.parallel in (True, 'thread'):
+            executor_class = futures.ThreadPoolExecutor
+        else:
+            raise ValueError(
+                "Ordbok.parallel must be 'thread' or 'process'")
+
+        config_files = [f for f in self.config_files
+                        if not isinstance(f, ConfigEnv)]
+        with executor_class(max_workers=self.max_workers or
+                            len(config_files) or 1) as executor:
+            results = [(f, executor.submit(prefetch_config_file, f))
+                       for f in config_files]
+        for config_file, result in results:
+            if result.exception() is None:
+                config_file._prefetched = result.result()
+
+    def _private_file_key(self):
+        return self.get(
             'PRIVATE_KEY_ORDBOK',
             os.environ.get(
                 'ORDBOK_PRIVATE_KEY_ORDBOK',
                 os.environ.get('PRIVATE_KEY_ORDBOK')
             )
         )
+
+    @property
+    def private_file_key(self):
+        key = self._private_file_key()
         if not key:
             raise OrdbokMissingPrivateKeyException
         return key
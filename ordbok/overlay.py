@@ -0,0 +1,130 @@
+import six
+
+try:
+    from collections.abc import Mapping, MutableMapping
+except ImportError:  # Python 2
+    from collections import Mapping, MutableMapping
+
+
+_MISSING = object()
+
+
+def merge_value(base, override):
+    '''
+    `override` merged over `base`: nested mappings are merged key by key,
+    anything else replaces the base value. Only the dicts along the path
+    of an override are new, unchanged subtrees are shared with `base`.
+    '''
+    if isinstance(base, Mapping) and isinstance(override, Mapping):
+        merged = dict(base)
+        for key, value in six.iteritems(override):
+            merged[key] = merge_value(base.get(key, _MISSING), value)
+        return merged
+    return override
+
+
+def _revision(config):
+    if isinstance(config, ConfigOverlay):
+        return config.revision
+    return getattr(config, 'generation', None)
+
+
+class ConfigOverlay(MutableMapping):
+    '''
+    Copy-on-write layer of overrides on top of a `base` config (an
+    `Ordbok` or another `ConfigOverlay`), e.g. per tenant. Only the
+    overrides are stored in the layer; nested dicts are merged into the
+    base's, sharing their unchanged subtrees.
+
+    Reading a key is a dict lookup in the layer, falling back to the base.
+    Merged overrides and the flattened view used to iterate the layer are
+    cached until the layer is changed or its base is reloaded (its
+    `generation` changes). Setting keys on an `Ordbok` base directly,
+    rather than by reloading it, is not picked up by cached layers.
+    '''
+    def __init__(self, base, overrides=None):
+        self.base = base
+        self._delta = {}
+        self._removed = set()
+        self._version = 0
+        # [revision, merged overrides, flattened view or None]
+        self._cache = None
+        if overrides:
+            self.update(overrides)
+
+    @property
+    def revision(self):
+        '''
+        Changes whenever the layer or any layer below it changes.
+        '''
+        return (self._version, _revision(self.base))
+
+    @property
+    def overrides(self):
+        return dict(self._delta)
+
+    def _merged(self):
+        revision = self.revision
+        cache = self._cache
+        if cache is None or cache[0] != revision:
+            merged = dict(
+                (key, merge_value(self.base.get(key, _MISSING), value))
+                for key, value in six.iteritems(self._delta))
+            cache = self._cache = [revision, merged, None]
+        return cache
+
+    def _view(self):
+        cache = self._merged()
+        if cache[2] is None:
+            view = self.base.copy()
+            for key in self._removed:
+                view.pop(key, None)
+            view.update(cache[1])
+            cache[2] = view
+        return cache[2]
+
+    def _changed(self):
+        self._version += 1
+
+    def __getitem__(self, key):
+        merged = self._merged()[1]
+        if key in merged:
+            return merged[key]
+        elif key in self._removed:
+            raise KeyError(key)
+        return self.base[key]
+
+    def __contains__(self, key):
+        return key in self._delta or (
+            key not in self._removed and key in self.base)
+
+    def __setitem__(self, key, value):
+        self._delta[key] = value
+        self._removed.discard(key)
+        self._changed()
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._delta.pop(key, None)
+        if key in self.base:
+            self._removed.add(key)
+        self._changed()
+
+    def __iter__(self):
+        return iter(self._view())
+
+    def __len__(self):
+        return len(self._view())
+
+    def copy(self):
+        return dict(self._view())
+
+    def overlay(self, overrides=None):
+        '''
+        Return a new layer on top of this one.
+        '''
+        return ConfigOverlay(self, overrides)
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self._delta)
@@ -0,0 +1,206 @@
+import re
+import yaml
+from yaml.composer import Composer, ComposerError
+from yaml.events import (
+    NodeEvent, AliasEvent, CollectionStartEvent, CollectionEndEvent,
+    MappingStartEvent, MappingEndEvent, StreamEndEvent)
+from yaml.nodes import ScalarNode, MappingNode, CollectionNode
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # PyYAML was built without libyaml
+    from yaml import SafeLoader
+
+
+def load_yaml(content, loader=None):
+    '''
+    Parse YAML `content` (a string, bytes or file object) with `loader`.
+    Defaults to the libyaml backed safe loader when it is available and
+    the pure Python safe loader otherwise.
+    '''
+    return yaml.load(content, Loader=loader or SafeLoader)
+
+
+# Plain scalars the YAML 1.1 resolver would turn into bools, nulls, ints,
+# floats and strings, restricted to forms whose conversion is unambiguous
+# so they can be converted without running the parser. Anything else
+# (including every value which looks structured) is parsed as YAML.
+_BOOLS = {
+    u'yes': True, u'Yes': True, u'YES': True,
+    u'true': True, u'True': True, u'TRUE': True,
+    u'on': True, u'On': True, u'ON': True,
+    u'no': False, u'No': False, u'NO': False,
+    u'false': False, u'False': False, u'FALSE': False,
+    u'off': False, u'Off': False, u'OFF': False,
+}
+_NULLS = frozenset([u'~', u'null', u'Null', u'NULL'])
+_INT = re.compile(u'^[-+]?(?:0|[1-9][0-9]*)\\Z')
+_FLOAT = re.compile(u'^[-+]?[0-9]+\\.[0-9]+\\Z')
+_STRING = re.compile(u'^[A-Za-z][A-Za-z0-9_\\-./:@]*\\Z')
+_SAFE_LOADERS = (None, yaml.SafeLoader, SafeLoader)
+
+
+def load_scalar(value, loader=None):
+    '''
+    Equivalent to `load_yaml(value, loader)` for a single string value, but
+    plain ints, floats, bools, nulls and bare strings are converted without
+    the YAML parser when using a safe loader.
+    '''
+    if loader in _SAFE_LOADERS:
+        if value in _BOOLS:
+            return _BOOLS[value]
+        elif value in _NULLS:
+            return None
+        elif _STRING.match(value):
+            if not value.endswith(u':'):
+                return value
+        elif _INT.match(value):
+            return int(value)
+        elif _FLOAT.match(value):
+            return float(value)
+    return load_yaml(value, loader)
+
+
+def merged_sections(content, loader=None):
+    '''
+    The top level keys of a mapping document whose values are merged into
+    (or aliased from) other values, such as a `COMMON: &common` section
+    which the other sections include with `<<: *common`.
+    '''
+    document = yaml.compose(content, Loader=loader or SafeLoader)
+    if not isinstance(document, MappingNode):
+        return set()
+    referenced = set()
+    seen = set()
+    stack = [value_node for _, value_node in document.value]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen or not isinstance(node, CollectionNode):
+            continue
+        seen.add(id(node))
+        if isinstance(node, MappingNode):
+            children = [child for pair in node.value for child in pair]
+        else:
+            children = node.value
+        referenced.update(id(child) for child in children)
+        stack.extend(children)
+    return set(key_node.value for key_node, value_node in document.value
+               if id(value_node) in referenced)
+
+
+class _StreamComposer(object):
+    '''
+    Composes nodes one at a time from a loader's events, so that a document
+    can be walked without composing all of it. Mixed into loaders (like
+    the libyaml backed ones) which only compose whole documents.
+    '''
+    def __init__(self, *args, **kwargs):
+        super(_StreamComposer, self).__init__(*args, **kwargs)
+        self.anchors = {}
+
+    compose_node = Composer.__dict__['compose_node']
+    compose_scalar_node = Composer.__dict__['compose_scalar_node']
+    compose_sequence_node = Composer.__dict__['compose_sequence_node']
+    compose_mapping_node = Composer.__dict__['compose_mapping_node']
+
+
+_stream_loaders = {}
+
+
+def _stream_loader(loader):
+    if loader not in _stream_loaders:
+        _stream_loaders[loader] = type(
+            'Stream' + loader.__name__, (_StreamComposer, loader), {})
+    return _stream_loaders[loader]
+
+
+def _has_anchor(event):
+    return (isinstance(event, NodeEvent) and
+            not isinstance(event, AliasEvent) and event.anchor is not None)
+
+
+def _skip_node(loader):
+    '''
+    Consume the events of the next node without composing it, other than
+    any anchored nodes within it, which later nodes may refer to.
+    '''
+    depth = 0
+    while True:
+        event = loader.peek_event()
+        if _has_anchor(event):
+            loader.compose_node(None, None)
+        else:
+            loader.get_event()
+            if isinstance(event, CollectionStartEvent):
+                depth += 1
+            elif isinstance(event, CollectionEndEvent):
+                depth -= 1
+        if not depth:
+            return
+
+
+def load_environment(content, environment, loader=None):
+    '''
+    Equivalent to `load_yaml(content, loader).get(environment, ...)` (as in
+    `ConfigFile._select_environment`), but the sections of a mapping
+    document other than `environment` are skipped without being composed
+    or constructed, and the selected section is constructed one key at a
+    time. Documents without an `environment` section whose other sections
+    had to be skipped are loaded again in full.
+    '''
+    if hasattr(content, 'read'):
+        content = content.read()
+    stream = _stream_loader(loader or SafeLoader)(content)
+    try:
+        stream.get_event()
+        if stream.check_event(StreamEndEvent):
+            return None
+        stream.get_event()
+        if (not stream.check_event(MappingStartEvent) or
+                _has_anchor(stream.peek_event())):
+            return _select(load_yaml(content, loader), environment)
+        stream.get_event()
+
+        top_level = []
+        section = None
+        skipped = False
+        while not stream.check_event(MappingEndEvent):
+            key_node = stream.compose_node(None, None)
+            key = (key_node.value if isinstance(key_node, ScalarNode)
+                   else None)
+            if key == environment:
+                section = stream.compose_node(None, None)
+            elif (stream.check_event(MappingStartEvent) and
+                    not _has_anchor(stream.peek_event())):
+                _skip_node(stream)
+                skipped = True
+            else:
+                top_level.append((key_node, stream.compose_node(None, None)))
+
+        stream.get_event()
+        stream.get_event()
+        if not stream.check_event(StreamEndEvent):
+            raise ComposerError(
+                'expected a single document in the stream', None,
+                'but found another document', stream.get_event().start_mark)
+
+        if section is None:
+            if skipped:
+                return _select(load_yaml(content, loader), environment)
+            section = MappingNode(u'tag:yaml.org,2002:map', top_level)
+        if not isinstance(section, MappingNode):
+            return stream.construct_document(section)
+        stream.flatten_mapping(section)
+        c = {}
+        for key_node, value_node in section.value:
+            c[stream.construct_document(key_node)] = (
+                stream.construct_document(value_node))
+        return c
+    finally:
+        stream.dispose()
+
+
+def _select(c, environment):
+    if not c or not isinstance(c, dict):
+        return c
+    return c.get(environment, c)
@@ -0,0 +1,163 @@
+from array import array
+from collections import namedtuple
+
+
+_MISSING = object()
+
+
+class KeyOrigin(namedtuple('KeyOrigin', ['source', 'section', 'value'])):
+    '''
+    A value set for a key: the config file (or `defaults`) which set it,
+    the environment section or environment variable it was set in, if
+    any, and the value.
+    '''
+    def __str__(self):
+        if self.section:
+            return '{} [{}]: {!r}'.format(self.source, self.section,
+                                          self.value)
+        return '{}: {!r}'.format(self.source, self.value)
+
+
+class KeyExplanation(namedtuple('KeyExplanation',
+                                ['key', 'origins', 'required'])):
+    '''
+    Where a key was set: every value set for it in load order (so the last
+    is the value in effect), and `(config file, required by)` for every
+    config file an earlier file required to set it.
+    '''
+    @property
+    def value(self):
+        return self.origins[-1].value if self.origins else None
+
+    def __str__(self):
+        if not self.origins:
+            lines = ['{} is not set'.format(self.key)]
+        else:
+            lines = ['{} = {!r}'.format(self.key, self.value)]
+            lines.extend('  overridden: {}'.format(origin)
+                         for origin in self.origins[:-1])
+            lines.append('  set by: {}'.format(self.origins[-1]))
+        lines.extend('  required in {} by {}'.format(source, required_by)
+                     for source, required_by in self.required)
+        return '\n'.join(lines)
+
+
+class Provenance(object):
+    '''
+    Where each key of a loaded config came from: the config files which
+    set it, in load order, with the value each one set, and the config
+    files earlier files required to set it (by referencing them with e.g.
+    `'ordbok_local_config'`). `Ordbok(provenance=True)` keeps one so that
+    a reload only recomputes the keys set by the config files which
+    changed, and so `Ordbok.explain` can trace a key.
+
+    Values are recorded in flat arrays, chaining the values of each key
+    from the last one set, but every key still needs an entry in `_last`
+    (and in `required`, if it is required), so a config takes around half
+    as much memory again, and a little longer to load, with one.
+    '''
+    def __init__(self):
+        self.keywords = []
+        self._keyword_ids = {}
+        # for each value recorded: the config file which set it and the
+        # index of the value previously set for the same key (or -1)
+        self._files = array('H')
+        self._previous = array('i')
+        self._values = []
+        # key -> index of the last value set for it
+        self._last = {}
+        self._garbage = 0
+        # key -> [(keyword, required by keyword), ...]
+        self.required = {}
+
+    def _keyword_id(self, keyword):
+        keyword_id = self._keyword_ids.get(keyword)
+        if keyword_id is None:
+            keyword_id = self._keyword_ids[keyword] = len(self.keywords)
+            self.keywords.append(keyword)
+        return keyword_id
+
+    def set(self, key, keyword, value):
+        self._files.append(self._keyword_id(keyword))
+        self._previous.append(self._last.get(key, -1))
+        self._last[key] = len(self._values)
+        self._values.append(value)
+
+    def require(self, key, keyword, required_by):
+        self.required.setdefault(key, []).append((keyword, required_by))
+
+    def __contains__(self, key):
+        return key in self._last
+
+    def __len__(self):
+        return len(self._last)
+
+    def setters(self, key):
+        '''
+        `(keyword, value)` for each value set for `key`, in load order.
+        '''
+        setters = []
+        i = self._last.get(key, -1)
+        while i >= 0:
+            setters.append((self.keywords[self._files[i]], self._values[i]))
+            i = self._previous[i]
+        setters.reverse()
+        return setters
+
+    def replace(self, keys, contents, order):
+        '''
+        Return the setters of `keys` with those of the config files in
+        `contents` (keyword -> content set by the file) replaced, ordered
+        by `order` (keyword -> position in load order).
+        '''
+        setters = {}
+        for key in keys:
+            key_setters = [s for s in self.setters(key)
+                           if s[0] not in contents]
+            for keyword, content in contents.items():
+                value = content.get(key, _MISSING)
+                if value is not _MISSING:
+                    key_setters.append((keyword, value))
+            key_setters.sort(key=lambda s: order[s[0]])
+            setters[key] = key_setters
+        return setters
+
+    def update(self, setters):
+        '''
+        Replace the setters of the keys in `setters` (e.g. as returned by
+        `replace`). The values they replace are dropped once they make up
+        most of the recorded values.
+        '''
+        for key, key_setters in setters.items():
+            i = self._last.pop(key, -1)
+            while i >= 0:
+                self._garbage += 1
+                i = self._previous[i]
+            for keyword, value in key_setters:
+                self.set(key, keyword, value)
+        if self._garbage * 2 > len(self._values):
+            self._compact()
+
+    def _compact(self):
+        setters = dict((key, self.setters(key)) for key in self._last)
+        self._files = array('H')
+        self._previous = array('i')
+        self._values = []
+        self._last = {}
+        self._garbage = 0
+        for key, key_setters in setters.items():
+            for keyword, value in key_setters:
+                self.set(key, keyword, value)
+
+
+def value_at(setters, position, order, default=_MISSING):
+    '''
+    The value of a key once the config file at `position` in load order
+    was loaded, given its setters, or `default` if none had set it.
+    '''
+    value = default
+    for keyword, setter_value in setters:
+        if order[keyword] > position:
+            break
+        value = setter_value
+    return value
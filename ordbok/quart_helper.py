@@ -0,0 +1,28 @@
+from .async_ordbok import AsyncOrdbok
+
+
+class QuartOrdbok(AsyncOrdbok):
+    def __init__(self, app=None, **kwargs):
+        super(QuartOrdbok, self).__init__(**kwargs)
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app, shared=None):
+        '''
+        Register with `app` (a Quart, or any app with Flask's `config` and
+        `before_serving`) and load the config into `app.config` before it
+        starts serving, unless it was already loaded. `shared` is as for
+        `FlaskOrdbok.init_app`.
+        '''
+        if shared is not None:
+            self.shared = shared
+        if not hasattr(app, 'extensions'):
+            app.extensions = {}
+        app.extensions['ordbok'] = self
+        self._root_path = app.config.root_path
+
+        async def load_config():
+            if not self.loaded:
+                await self.load()
+                app.config.update(self)
+        app.before_serving(load_config)
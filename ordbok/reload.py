@@ -0,0 +1,190 @@
+import os
+import errno
+import select
+import struct
+import logging
+import threading
+from collections import namedtuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigDiff(namedtuple('ConfigDiff', ['added', 'removed', 'changed'])):
+    '''
+    The keys added, removed and changed by a reload.
+    '''
+    @classmethod
+    def compare(cls, old, new):
+        old_keys, new_keys = set(old), set(new)
+        return cls(
+            added=new_keys - old_keys,
+            removed=old_keys - new_keys,
+            changed=set(key for key in old_keys & new_keys
+                        if old[key] != new[key]))
+
+    @property
+    def keys(self):
+        return self.added | self.removed | self.changed
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+    __nonzero__ = __bool__
+
+
+class PollingWatcher(object):
+    '''
+    Detects changes to `paths` by comparing their stat results every
+    `interval` seconds.
+    '''
+    def __init__(self, paths, interval=1.0):
+        self.paths = list(paths)
+        self.interval = interval
+        self._stats = self._stat()
+
+    def _stat(self):
+        stats = []
+        for path in self.paths:
+            try:
+                st = os.stat(path)
+                stats.append((st.st_ino, st.st_size,
+                              getattr(st, 'st_mtime_ns', st.st_mtime)))
+            except OSError:
+                stats.append(None)
+        return stats
+
+    def wait(self, stop_event):
+        '''
+        Block until one of the paths changes (returning True) or
+        `stop_event` is set (returning False).
+        '''
+        while not stop_event.wait(self.interval):
+            stats = self._stat()
+            if stats != self._stats:
+                self._stats = stats
+                return True
+        return False
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    '''
+    Detects changes to `paths` with inotify, watching their directories so
+    that files replaced by a rename (as most editors and deploy tools do)
+    are picked up.
+    '''
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_NONBLOCK = 0x00000800
+    IN_CLOEXEC = 0x00080000
+    MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+            IN_MOVED_TO | IN_CREATE | IN_DELETE)
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self, paths, interval=1.0):
+        import ctypes
+        import ctypes.util
+        self.interval = interval
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError(errno.ENOSYS, 'libc not found')
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        self._fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._watches = {}
+        self._filenames = {}
+        for path in paths:
+            directory, filename = os.path.split(os.path.abspath(path))
+            self._filenames.setdefault(directory, set()).add(filename)
+        for directory in self._filenames:
+            wd = libc.inotify_add_watch(
+                self._fd, directory.encode('utf8'), self.MASK)
+            if wd < 0:
+                self.close()
+                raise OSError(ctypes.get_errno(), 'inotify_add_watch failed')
+            self._watches[wd] = directory
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, 65536)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, _, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            events.append((wd, name.decode('utf8')))
+        return events
+
+    def wait(self, stop_event):
+        while not stop_event.is_set():
+            readable, _, _ = select.select([self._fd], [], [], self.interval)
+            if not readable:
+                continue
+            for wd, name in self._read_events():
+                if name in self._filenames.get(self._watches.get(wd), ()):
+                    # let a burst of writes settle before reloading
+                    stop_event.wait(0.05)
+                    self._read_events()
+                    return True
+        return False
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class ConfigWatcher(threading.Thread):
+    '''
+    Background thread which reloads `ordbok` whenever one of its config
+    files changes, using inotify where it is available and polling the
+    files every `interval` seconds otherwise.
+    '''
+    def __init__(self, ordbok, interval=1.0, use_inotify=True):
+        super(ConfigWatcher, self).__init__(name='ordbok-watcher')
+        self.daemon = True
+        self.ordbok = ordbok
+        self._stop_event = threading.Event()
+        paths = ordbok.watched_paths
+        self.watcher = None
+        if use_inotify:
+            try:
+                self.watcher = InotifyWatcher(paths, interval)
+            except (OSError, AttributeError):
+                logger.debug('inotify unavailable, polling config files')
+        if self.watcher is None:
+            self.watcher = PollingWatcher(paths, interval)
+
+    def run(self):
+        try:
+            while self.watcher.wait(self._stop_event):
+                try:
+                    self.ordbok._reload()
+                except Exception:
+                    logger.exception('Failed to reload Ordbok config, '
+                                     'keeping the previous config.')
+        finally:
+            self.watcher.close()
+            if self in self.ordbok._watchers:
+                self.ordbok._watchers.remove(self)
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
@@ -0,0 +1,164 @@
+import six
+from .exceptions import (
+    OrdbokInvalidValueException, OrdbokRequiredValueException)
+
+_TRUE = frozenset(['true', 'yes', 'on', '1', 'y'])
+_FALSE = frozenset(['false', 'no', 'off', '0', 'n', ''])
+
+
+def coerce_bool(value):
+    if isinstance(value, bool):
+        return value
+    elif isinstance(value, six.string_types):
+        lowered = value.strip().lower()
+        if lowered in _TRUE:
+            return True
+        elif lowered in _FALSE:
+            return False
+    elif isinstance(value, six.integer_types) and value in (0, 1):
+        return bool(value)
+    raise ValueError('not a boolean')
+
+
+def coerce_int(value):
+    if isinstance(value, bool):
+        raise ValueError('not an integer')
+    elif isinstance(value, six.integer_types):
+        return value
+    elif isinstance(value, float) and value.is_integer():
+        return int(value)
+    elif isinstance(value, six.string_types):
+        return int(value.strip())
+    raise ValueError('not an integer')
+
+
+def coerce_float(value):
+    if isinstance(value, bool):
+        raise ValueError('not a number')
+    elif isinstance(value, float):
+        return value
+    elif isinstance(value, six.integer_types + six.string_types):
+        return float(value)
+    raise ValueError('not a number')
+
+
+def coerce_str(value):
+    if isinstance(value, six.string_types):
+        return value
+    elif isinstance(value, (bool, float) + six.integer_types):
+        return six.text_type(value)
+    raise ValueError('not a string')
+
+
+def coerce_list(value):
+    if isinstance(value, list):
+        return value
+    elif isinstance(value, tuple):
+        return list(value)
+    elif isinstance(value, six.string_types):
+        return [item.strip() for item in value.split(',') if item.strip()]
+    raise ValueError('not a list')
+
+
+def coerce_dict(value):
+    if isinstance(value, dict):
+        return value
+    elif isinstance(value, six.string_types):
+        from .parser import load_yaml
+        value = load_yaml(value)
+        if isinstance(value, dict):
+            return value
+    raise ValueError('not a mapping')
+
+
+COERCERS = {
+    bool: coerce_bool,
+    int: coerce_int,
+    float: coerce_float,
+    str: coerce_str,
+    six.text_type: coerce_str,
+    list: coerce_list,
+    dict: coerce_dict,
+}
+
+
+class Field(object):
+    '''
+    The declared type of a config key. `type` is one of `bool`, `int`,
+    `float`, `str`, `list` or `dict`, whose values are coerced from the
+    strings environment variables are read as (e.g. `'yes'` for `bool`,
+    `'a, b'` for `list` or a YAML/JSON mapping for `dict`), or any callable
+    which converts a value, raising `ValueError` or `TypeError` if it is
+    invalid. A key which is unset (or None) is set to `default` unless it
+    is `required`.
+    '''
+    def __init__(self, type=str, default=None, required=False):
+        self.type = type
+        self.default = default
+        self.required = required
+
+    @property
+    def type_name(self):
+        return getattr(self.type, '__name__', repr(self.type))
+
+    def compile(self):
+        '''
+        Return a function coercing a value to the field's type.
+        '''
+        return COERCERS.get(self.type, self.type)
+
+
+class Schema(object):
+    '''
+    The declared fields of a config, mapping keys to `Field`s (or just a
+    type, for an optional field without a default). Fields are compiled
+    when the schema is created, to a coercing function for each key.
+    '''
+    def __init__(self, fields):
+        self.fields = dict(
+            (key, field if isinstance(field, Field) else Field(field))
+            for key, field in six.iteritems(fields))
+        self._compiled = [
+            (key, field, field.compile())
+            for key, field in sorted(six.iteritems(self.fields))]
+
+    def __contains__(self, key):
+        return key in self.fields
+
+    def coerce(self, values, errors, keys=None, deferred=()):
+        '''
+        Return the declared keys of `values` (only those in `keys`, if
+        given) coerced to their types, with defaults for unset optional
+        keys. Invalid and missing required values are appended to
+        `errors` rather than raised, so every error can be reported at
+        once. Keys in `deferred` are only checked to be set, as their
+        values are not known yet.
+        '''
+        coerced = {}
+        for key, field, coerce in self._compiled:
+            if keys is not None and key not in keys:
+                continue
+            if key in deferred:
+                # deferred maps keys to whether their value is not None
+                if field.required and not deferred[key]:
+                    errors.append(OrdbokRequiredValueException(key))
+                continue
+            value = values.get(key)
+            if value is None:
+                if field.required:
+                    errors.append(OrdbokRequiredValueException(key))
+                elif field.default is not None:
+                    coerced[key] = field.default
+                continue
+            try:
+                coerced[key] = coerce(value)
+            except (ValueError, TypeError) as e:
+                errors.append(OrdbokInvalidValueException(
+                    key, value, field.type_name, e))
+        return coerced
+
+
+def as_schema(schema):
+    if schema is None or isinstance(schema, Schema):
+        return schema
+    return Schema(schema)
@@ -0,0 +1,58 @@
+import marshal
+import datetime
+
+
+# marshal is fast and compact but only knows about builtin types. Everything
+# YAML can produce that marshal can't store is wrapped in a tagged tuple, and
+# since YAML never produces tuples on its own, any tuple in the encoded data
+# is one of our tags.
+MARSHAL_VERSION = 2
+_TUPLE = 't'
+_DATE = 'd'
+_DATETIME = 'dt'
+
+
+def _encode(value):
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [_encode(v) for v in value]
+    elif isinstance(value, tuple):
+        return (_TUPLE, [_encode(v) for v in value])
+    elif isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            raise ValueError('timezone aware datetimes can not be serialized')
+        return (_DATETIME, value.year, value.month, value.day, value.hour,
+                value.minute, value.second, value.microsecond)
+    elif isinstance(value, datetime.date):
+        return (_DATE, value.year, value.month, value.day)
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        return {k: _decode(v) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [_decode(v) for v in value]
+    elif isinstance(value, tuple):
+        tag = value[0]
+        if tag == _TUPLE:
+            return tuple(_decode(v) for v in value[1])
+        elif tag == _DATETIME:
+            return datetime.datetime(*value[1:])
+        elif tag == _DATE:
+            return datetime.date(*value[1:])
+        raise ValueError('unknown serialized tag {}'.format(tag))
+    return value
+
+
+def dumps(value):
+    '''
+    Serialize a loaded config value to bytes. Raises ValueError if the
+    value contains objects which can not be serialized.
+    '''
+    return marshal.dumps(_encode(value), MARSHAL_VERSION)
+
+
+def loads(data):
+    return _decode(marshal.loads(data))
@@ -0,0 +1,131 @@
+import os
+import mmap
+import struct
+import atexit
+from . import serialize
+from .util import replace_file
+from .exceptions import OrdbokSharedConfigException
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # Python 2
+    from collections import Mapping
+
+
+SHARED_CONFIG_VERSION = 2
+# magic, version, generation, index length
+_HEADER = struct.Struct('>8sBQI')
+_MAGIC = b'ORDBOKSC'
+_NONE = serialize.dumps(None)
+
+
+def default_shared_path(namespace):
+    '''
+    Path of the shared config segment published by this process, in
+    /dev/shm (so it is never written to disk) where it is available.
+    '''
+    directory = '/dev/shm'
+    if not os.path.isdir(directory):
+        import tempfile
+        directory = tempfile.gettempdir()
+    return os.path.join(
+        directory, 'ordbok-{}-{}.shm'.format(namespace, os.getpid()))
+
+
+def publish(config, path, generation=0, options=None):
+    '''
+    Write the resolved `config` to `path` as a shared config segment. Each
+    value is serialized separately behind an index of keys, so processes
+    attaching to the segment only decode the values they read. The file is
+    replaced atomically, so processes already attached keep the previous
+    segment, and is only readable by its owner since it may contain
+    decrypted private config. `options` are stored with the index, to
+    describe how the config was loaded.
+    '''
+    index = {}
+    values = []
+    offset = 0
+    for key, value in config.items():
+        data = serialize.dumps(value)
+        index[key] = [offset, len(data)]
+        values.append(data)
+        offset += len(data)
+    index_data = serialize.dumps([options, index])
+    replace_file(path, b''.join(
+        [_HEADER.pack(_MAGIC, SHARED_CONFIG_VERSION, generation,
+                      len(index_data)), index_data] + values))
+
+
+def unpublish_at_exit(path):
+    '''
+    Remove the segment at `path` when this process exits. Processes which
+    are attached to it keep working, and forked children exiting do not
+    remove it.
+    '''
+    pid = os.getpid()
+
+    def unpublish():
+        if os.getpid() == pid and os.path.exists(path):
+            os.remove(path)
+    atexit.register(unpublish)
+
+
+class SharedConfig(Mapping):
+    '''
+    Read-only view of a config segment written by `publish`. The segment
+    is memory mapped, so its pages are shared by every process attached to
+    it, and values are decoded on first access.
+    '''
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, 'rb') as f:
+                self._mmap = mmap.mmap(
+                    f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError) as e:
+            raise OrdbokSharedConfigException(path, e)
+        if len(self._mmap) < _HEADER.size:
+            raise OrdbokSharedConfigException(path, 'segment is truncated')
+        magic, version, self.generation, index_length = _HEADER.unpack(
+            self._mmap[:_HEADER.size])
+        if magic != _MAGIC or version != SHARED_CONFIG_VERSION:
+            raise OrdbokSharedConfigException(
+                path, 'not a version {} shared config segment'.format(
+                    SHARED_CONFIG_VERSION))
+        self._base = _HEADER.size + index_length
+        self.options, self._index = serialize.loads(
+            self._mmap[_HEADER.size:self._base])
+        self._values = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        value = serialize.loads(self.raw(key))
+        self._values[key] = value
+        return value
+
+    def raw(self, key):
+        '''
+        The encoded value of `key`, which is compared to tell if a value
+        changed without decoding it.
+        '''
+        offset, length = self._index[key]
+        start = self._base + offset
+        return self._mmap[start:start + length]
+
+    def has_value(self, key):
+        return self.raw(key) != _NONE
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def close(self):
+        self._mmap.close()
@@ -1,7 +1,28 @@
+import os
+import importlib
 import six
 from .config_file import ConfigFile
 
 
+class LazyModule(object):
+    '''
+    Stands in for the module `name` until one of its attributes is used,
+    when the module is imported, so optional and slow to import backends
+    are only loaded by the programs which use them.
+    '''
+    def __init__(self, name):
+        self.__name = name
+        self.__module = None
+
+    def __getattr__(self, attr):
+        if self.__module is None:
+            self.__module = importlib.import_module(self.__name)
+        return getattr(self.__module, attr)
+
+    def __repr__(self):
+        return '<LazyModule {}>'.format(self.__name)
+
+
 def create_config_file(f):
     if isinstance(f, ConfigFile):
         return f
@@ -10,4 +31,30 @@ def create_config_file(f):
     else:
         raise TypeError(
             'Ordbok.config_files can only be derived from '
-            'ordbok.ConfigFile or the filename of a config file')
+            'ordbok.ConfigFile (or ordbok.ConfigSource) or the filename of '
+            'a config file')
+
+
+def prefetch_config_file(config_file):
+    return config_file.prefetch()
+
+
+def replace_file(path, content, mode=None):
+    '''
+    Atomically replace the file at `path` with `content` (bytes) by writing
+    to a temporary file in the same directory and renaming it into place.
+    The new file is only readable by its owner unless `mode` is given.
+    '''
+    import tempfile
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.ordbok-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        getattr(os, 'replace', os.rename)(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -22,7 +22,7 @@ setup(
     include_package_data=True,
     platforms='any',
     install_requires=[
-        'pyyaml >=3.0, <4.a0',
+        'pyyaml >=3.0, <7.a0',
         'six>= 1.9.0, <2.a0',
         'simple-crypt>=4.0.0, <5.a0'
     ],
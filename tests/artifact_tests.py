@@ -0,0 +1,113 @@
+import os
+import stat
+import mock
+
+from ordbok import Ordbok, PrivateConfigFile
+from ordbok.artifact import write_artifact
+from ordbok.cli import main
+from ordbok.exceptions import (
+    OrdbokArtifactException, OrdbokDecryptionException)
+
+from tests.files import ConfigDirTestCase
+
+
+class ArtifactTestCase(ConfigDirTestCase):
+    def setUp(self):
+        super(ArtifactTestCase, self).setUp()
+        self.path = os.path.join(self.tmp_dir, 'config.ordbok')
+        self.write_config_file(u'config.yml', u"""
+DEVELOPMENT:
+  DEBUG: True
+PRODUCTION:
+  DEBUG: False
+  PORT: 'ordbok_env_config_port'
+  SECRET_KEY: 'ordbok_private_config'
+  REDIS_URL: 'ordbok_env_config'
+""")
+        self.write_config_file(u'private_config.yml', u"""
+SECRET_KEY: 'keep out!'
+""")
+        private_config_file = PrivateConfigFile('private_config.yml')
+        config = Ordbok(config_dir=self.tmp_dir)
+        config['PRIVATE_KEY_ORDBOK'] = 'foobarbaz'
+        private_config_file.init_config(config)
+        private_config_file._save_encrypted_file()
+        os.remove(private_config_file.config_file_path)
+        self.environ = mock.patch.dict('os.environ', {
+            u'PRIVATE_KEY_ORDBOK': u'foobarbaz', u'PORT': u'8080',
+            u'ORDBOK_REDIS_URL': u'redis://'})
+        self.environ.start()
+
+    def tearDown(self):
+        self.environ.stop()
+
+    def ordbok(self):
+        config = Ordbok(config_dir=self.tmp_dir, config_files=[
+            'config.yml', PrivateConfigFile('private_config.yml')])
+        config['ENVIRONMENT'] = 'production'
+        return config
+
+    def test_from_artifact(self):
+        with mock.patch.dict('os.environ', {u'PORT': u'1'}):
+            write_artifact(self.ordbok(), self.path)
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        with open(self.path, 'rb') as f:
+            self.assertNotIn(b'foobarbaz', f.read())
+
+        with mock.patch('ordbok.parser.load_yaml') as load_yaml:
+            config = Ordbok.from_artifact(self.path)
+        self.assertFalse(load_yaml.called)
+        self.assertTrue(config.loaded)
+        self.assertEqual(config['ENVIRONMENT'], 'production')
+        self.assertEqual(config['SECRET_KEY'], 'keep out!')
+        self.assertEqual(config['DEBUG'], False)
+        # the environment is read when loading the artifact
+        self.assertEqual(config['PORT'], '8080')
+        self.assertEqual(config['REDIS_URL'], 'redis://')
+        loaded = self.ordbok()
+        loaded.load()
+        self.assertEqual(dict(config), dict(loaded))
+
+    def test_required_env_keys(self):
+        write_artifact(self.ordbok(), self.path)
+        with mock.patch.dict('os.environ', {u'ORDBOK_REDIS_URL': u''}):
+            with self.assertRaises(Exception):
+                Ordbok.from_artifact(self.path)
+
+    def test_encrypted(self):
+        write_artifact(self.ordbok(), self.path, 'foobarbaz')
+        with open(self.path, 'rb') as f:
+            self.assertNotIn(b'keep out!', f.read())
+        config = Ordbok.from_artifact(self.path)
+        self.assertEqual(config['SECRET_KEY'], 'keep out!')
+        with self.assertRaises(OrdbokDecryptionException):
+            Ordbok.from_artifact(self.path, password='wrong')
+
+    def test_integrity(self):
+        write_artifact(self.ordbok(), self.path)
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        with open(self.path, 'wb') as f:
+            f.write(data[:-1] + b'x')
+        with self.assertRaises(OrdbokArtifactException):
+            Ordbok.from_artifact(self.path)
+
+    def test_reload(self):
+        write_artifact(self.ordbok(), self.path)
+        config = Ordbok.from_artifact(self.path)
+        with mock.patch.dict('os.environ', {u'ORDBOK_DEBUG': u'true'}):
+            diff = config.reload()
+        self.assertEqual(diff.changed, set(['DEBUG']))
+        self.assertEqual(config['SECRET_KEY'], 'keep out!')
+
+    @mock.patch('sys.stdout')
+    def test_cli_build(self, mock_stdout):
+        argv = ['ordbok', 'build', self.path, '--config-dir', self.tmp_dir,
+                '--config-file', 'config.yml',
+                '--private-config-file', 'private_config.yml',
+                '--environment', 'production', '--encrypt',
+                '--iterations', '1000']
+        with mock.patch('sys.argv', argv):
+            main()
+        self.assertEqual(
+            Ordbok.from_artifact(self.path)['SECRET_KEY'], 'keep out!')
@@ -0,0 +1,80 @@
+import os
+import unittest
+import mock
+import fudge
+import six
+from copy import deepcopy
+
+from ordbok import Ordbok, ConfigFile
+from ordbok.exceptions import OrdbokMissingKeyException
+
+from tests.files import fudged_config_files, fake_file_factory
+
+if six.PY3:
+    import asyncio
+    from ordbok.async_ordbok import AsyncOrdbok
+    from ordbok.quart_helper import QuartOrdbok
+
+
+@unittest.skipIf(six.PY2, 'asyncio requires Python 3')
+class AsyncOrdbokTestCase(unittest.TestCase):
+    @fudge.patch('six.moves.builtins.open')
+    def test_load(self, fudged_open):
+        fudged_open.is_callable().calls(fake_file_factory(fudged_config_files))
+        ordbok = Ordbok()
+        ordbok.load()
+        async_ordbok = AsyncOrdbok()
+        self.assertIsNone(asyncio.run(async_ordbok.load()))
+        self.assertTrue(async_ordbok.loaded)
+        self.assertEqual(dict(async_ordbok), dict(ordbok))
+
+    @fudge.patch('six.moves.builtins.open')
+    def test_load_uses_executor(self, fudged_open):
+        fudged_open.is_callable().calls(fake_file_factory(fudged_config_files))
+        from concurrent import futures
+        with futures.ThreadPoolExecutor(max_workers=1) as executor:
+            submit = mock.Mock(wraps=executor.submit)
+            executor.submit = submit
+            ordbok = AsyncOrdbok(executor=executor)
+            with mock.patch.object(ConfigFile, '_load_content',
+                                   wraps=lambda: {}) as mock_load_content:
+                asyncio.run(ordbok.load())
+        self.assertEqual(submit.call_count, 2)
+        self.assertEqual(mock_load_content.call_count, 2)
+
+    @fudge.patch('six.moves.builtins.open')
+    def test_missing_key(self, fudged_open):
+        fudged_config_files_copy = deepcopy(fudged_config_files)
+        fudged_config_files_copy.update({
+            u'config.yml': u"""
+            FOO: 'ordbok_local_config'
+            """})
+        fudged_open.is_callable().calls(
+            fake_file_factory(fudged_config_files_copy))
+        with self.assertRaises(OrdbokMissingKeyException):
+            asyncio.run(AsyncOrdbok().load())
+
+    @fudge.patch('six.moves.builtins.open')
+    def test_reload(self, fudged_open):
+        fudged_open.is_callable().calls(fake_file_factory(fudged_config_files))
+        ordbok = AsyncOrdbok()
+        asyncio.run(ordbok.load())
+        diff = asyncio.run(ordbok.reload())
+        self.assertFalse(diff)
+        self.assertEqual(ordbok.generation, 1)
+
+    @fudge.patch('six.moves.builtins.open')
+    def test_quart_helper(self, fudged_open):
+        fudged_open.is_callable().calls(fake_file_factory(fudged_config_files))
+        app = mock.Mock(spec=['config', 'before_serving'])
+        app.config = {}
+        app.config = mock.MagicMock(wraps=app.config, root_path=os.getcwd())
+        ordbok = QuartOrdbok(app)
+        self.assertIs(app.extensions['ordbok'], ordbok)
+        load_config = app.before_serving.call_args[0][0]
+        asyncio.run(load_config())
+        self.assertTrue(ordbok.loaded)
+        app.config.update.assert_called_once_with(ordbok)
+        # loading is skipped if the app loaded the config itself
+        asyncio.run(load_config())
+        self.assertEqual(app.config.update.call_count, 1)
@@ -10,6 +10,7 @@ from flask import Flask
 from ordbok.flask_helper import FlaskOrdbok
 from ordbok import Ordbok, ConfigFile, PrivateConfigFile
 from ordbok.util import create_config_file
+from ordbok.lookup import ConfigFileLookup
 from ordbok.exceptions import (
     OrdbokLowercaseKeyException, OrdbokMissingConfigFileException,
     OrdbokAmbiguousConfigFileException, OrdbokSelfReferenceException,
@@ -213,6 +214,40 @@ class OrdbokTestCase(unittest.TestCase):
             self.ordbok.load()
 
 
+class OrdbokConfigEnvTestCase(unittest.TestCase):
+    @fudge.patch('six.moves.builtins.open')
+    @mock.patch.dict('os.environ', patched_environ)
+    def test_declared_env_only(self, fudged_open):
+        fudged_config_files_copy = deepcopy(fudged_config_files)
+        fudged_config_files_copy.update({
+            u'config.yml': u"""
+            SECRET_KEY: 'ordbok_env_config'
+            REDIS_URL: 'ordbok_env_config_rediscloud_url'
+            """})
+        fudged_open.is_callable().calls(
+            fake_file_factory(fudged_config_files_copy))
+        ordbok = Ordbok(declared_env_only=True)
+        ordbok.load()
+        self.assertEqual(ordbok['SECRET_KEY'],
+                         '7a1fa63d-f33a-11e3-aab5-b88d12179d58')
+        self.assertEqual(ordbok['REDIS_URL'], 'why-not-zoidberg?')
+        self.assertIsNone(ordbok.get('TEST_INT'))
+        self.assertIsNone(ordbok.get('TEST_BOOLEAN'))
+
+    @fudge.patch('six.moves.builtins.open')
+    @mock.patch.dict('os.environ', {})
+    def test_declared_env_only_missing(self, fudged_open):
+        fudged_config_files_copy = deepcopy(fudged_config_files)
+        fudged_config_files_copy.update({
+            u'config.yml': u"""
+            SECRET_KEY: 'ordbok_env_config'
+            """})
+        fudged_open.is_callable().calls(
+            fake_file_factory(fudged_config_files_copy))
+        with self.assertRaises(Exception):
+            Ordbok(declared_env_only=True).load()
+
+
 class OrdbokConfigFileTestCase(unittest.TestCase):
     def setUp(self):
         self.ordbok = Ordbok()
@@ -245,6 +280,27 @@ class OrdbokConfigFileTestCase(unittest.TestCase):
             create_config_file(['foo', 'bar'])
 
 
+class OrdbokConfigFileLookupTestCase(unittest.TestCase):
+    def setUp(self):
+        self.lookup = ConfigFileLookup(
+            (keyword, None) for keyword in
+            ['ordbok_config', 'ordbok_local_config', 'ordbok_env_config'])
+
+    def test_match(self):
+        self.assertEqual(self.lookup.match('ordbok_local_config'),
+                         'ordbok_local_config')
+        self.assertEqual(self.lookup.match('ordbok_env_config_redis_url'),
+                         'ordbok_env_config')
+        self.assertIsNone(self.lookup.match('ordbok_foo_config'))
+        self.assertIsNone(self.lookup.match('ordbok'))
+        self.assertIsNone(self.lookup.match(''))
+
+    def test_ambiguous(self):
+        with self.assertRaises(OrdbokAmbiguousConfigFileException):
+            ConfigFileLookup((keyword, None) for keyword in
+                             ['ordbok_config', 'ordbok_config_extra'])
+
+
 class OrdbokPrivateConfigFileTestCase(unittest.TestCase):
     def setUp(self):
         self.private_config_file = PrivateConfigFile(
@@ -0,0 +1,214 @@
+import os
+import stat
+import mock
+
+from ordbok import Ordbok, PrivateConfigFile, crypto
+from ordbok.batch import (
+    PrivateFileBatch, expand_paths, CREATED, UP_TO_DATE, FAILED, REKEYED,
+    MIGRATED)
+from ordbok.cli import main
+
+from tests.files import ConfigDirTestCase
+
+
+class BatchTestCase(ConfigDirTestCase):
+    def setUp(self):
+        super(BatchTestCase, self).setUp()
+        self.paths = []
+        for name in ['a.yml', 'b.yml', 'c.yml']:
+            path = os.path.join(self.tmp_dir, name)
+            with open(path, 'w') as f:
+                f.write(u'SECRET_KEY: {}\n'.format(name))
+            self.paths.append(path)
+        crypto._derived_keys.clear()
+
+    def tearDown(self):
+        crypto._derived_keys.clear()
+
+    def batch(self, **kwargs):
+        kwargs.setdefault('file_format', crypto.FORMAT_ORDBOK)
+        kwargs.setdefault('kdf', crypto.KDF_PBKDF2)
+        kwargs.setdefault('kdf_params', {'iterations': 1000})
+        return PrivateFileBatch('foobarbaz', **kwargs)
+
+    def test_expand_paths(self):
+        for path in self.paths[:2]:
+            open(path + '.private', 'w').close()
+        self.assertEqual(expand_paths([self.tmp_dir]), self.paths[:2])
+        self.assertEqual(
+            expand_paths([os.path.join(self.tmp_dir, '*.yml'),
+                          self.paths[0] + '.private']),
+            self.paths)
+
+    def test_encrypt_derives_one_key(self):
+        with mock.patch.object(crypto, 'pbkdf2_sha256',
+                               wraps=crypto.pbkdf2_sha256) as kdf:
+            results = self.batch().encrypt(self.paths)
+        self.assertEqual([r.status for r in results], [CREATED] * 3)
+        self.assertEqual(kdf.call_count, 1)
+        for path in self.paths:
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual(
+                stat.S_IMODE(os.stat(path + '.private').st_mode), 0o600)
+
+        crypto._derived_keys.clear()
+        results = self.batch().decrypt(self.paths)
+        self.assertEqual([r.status for r in results], [CREATED] * 3)
+        with open(self.paths[1]) as f:
+            self.assertEqual(f.read(), u'SECRET_KEY: b.yml\n')
+
+    def test_skips_up_to_date(self):
+        self.batch(keep=True).encrypt(self.paths)
+        with open(self.paths[0] + '.private', 'rb') as f:
+            encrypted = f.read()
+        with open(self.paths[2], 'w') as f:
+            f.write(u'SECRET_KEY: changed\n')
+        results = self.batch(keep=True).encrypt(self.paths)
+        self.assertEqual([r.status for r in results],
+                         [UP_TO_DATE, UP_TO_DATE, CREATED])
+        with open(self.paths[0] + '.private', 'rb') as f:
+            self.assertEqual(f.read(), encrypted)
+
+        results = self.batch(keep=True).decrypt(self.paths)
+        self.assertEqual([r.status for r in results], [UP_TO_DATE] * 3)
+        # a different kdf is not up to date
+        results = self.batch(kdf_params={'iterations': 2000}).encrypt(
+            self.paths)
+        self.assertEqual([r.status for r in results], [CREATED] * 3)
+
+    def test_serial_without_futures(self):
+        with mock.patch.dict('sys.modules', {'concurrent': None}):
+            results = self.batch(workers=4).encrypt(self.paths)
+            self.assertEqual([r.status for r in results], [CREATED] * 3)
+            results = self.batch(workers=1).decrypt(self.paths)
+            self.assertEqual([r.status for r in results], [CREATED] * 3)
+
+    def test_failures_are_reported(self):
+        os.remove(self.paths[1])
+        results = self.batch().encrypt(self.paths)
+        self.assertEqual([r.status for r in results],
+                         [CREATED, FAILED, CREATED])
+        self.assertIsNotNone(results[1].error)
+
+    @mock.patch('sys.stdout')
+    def test_cli(self, mock_stdout):
+        argv = ['ordbok', 'encrypt', os.path.join(self.tmp_dir, '*.yml'),
+                'foobarbaz', '--format', 'ordbok', '--iterations', '1000',
+                '--workers', '2']
+        with mock.patch('sys.argv', argv):
+            main()
+        for path in self.paths:
+            self.assertTrue(os.path.exists(path + '.private'))
+        argv = ['ordbok', 'decrypt', self.tmp_dir, 'foobarbaz', '--keep']
+        with mock.patch('sys.argv', argv):
+            main()
+        for path in self.paths:
+            self.assertTrue(os.path.exists(path))
+            self.assertTrue(os.path.exists(path + '.private'))
+        output = ''.join(
+            call[0][0] for call in mock_stdout.write.call_args_list)
+        self.assertIn('a.yml created', output)
+
+    def test_rekey(self):
+        self.batch(index=True).encrypt(self.paths[:2])
+        PrivateFileBatch('foobarbaz').encrypt(self.paths[2:])
+        os.chmod(self.paths[0] + '.private', 0o640)
+        crypto._derived_keys.clear()
+        with mock.patch.object(crypto, 'pbkdf2_sha256',
+                               wraps=crypto.pbkdf2_sha256) as kdf:
+            results = self.batch(
+                file_format=None, kdf=None, kdf_params=None).rekey(
+                    self.paths, 'bazbarfoo')
+        self.assertEqual([r.status for r in results], [REKEYED] * 3)
+        # the old and new keys of the ordbok files (which share a salt) and
+        # of the simplecrypt file
+        self.assertEqual(kdf.call_count, 4)
+        for path in self.paths:
+            self.assertFalse(os.path.exists(path))
+        self.assertEqual(
+            stat.S_IMODE(os.stat(self.paths[0] + '.private').st_mode), 0o640)
+        with open(self.paths[0] + '.private', 'rb') as f:
+            header = crypto.read_header(f.read())[0]
+        self.assertEqual(header['kdf_params'], {'iterations': 1000})
+        self.assertIn('index', header)
+        with open(self.paths[2] + '.private', 'rb') as f:
+            self.assertEqual(crypto.detect_format(f.read()),
+                             crypto.FORMAT_SIMPLECRYPT)
+
+        private_config_file = PrivateConfigFile(self.paths[1])
+        ordbok = Ordbok(config_dir='', include_env=False,
+                        config_files=[private_config_file])
+        ordbok['PRIVATE_KEY_ORDBOK'] = 'bazbarfoo'
+        ordbok.load()
+        self.assertEqual(ordbok['SECRET_KEY'], 'b.yml')
+
+    def test_rekey_keeps_format(self):
+        self.batch().encrypt(self.paths[:1])
+        results = PrivateFileBatch('foobarbaz').rekey(
+            self.paths[:1], 'bazbarfoo')
+        self.assertEqual(results[0].status, REKEYED)
+        with open(self.paths[0] + '.private', 'rb') as f:
+            encrypted = f.read()
+        self.assertEqual(crypto.detect_format(encrypted),
+                         crypto.FORMAT_ORDBOK)
+        self.assertEqual(crypto.read_header(encrypted)[0]['kdf_params'],
+                         {'iterations': 1000})
+
+    def test_rekey_wrong_key(self):
+        self.batch().encrypt(self.paths)
+        with open(self.paths[0] + '.private', 'rb') as f:
+            encrypted = f.read()
+        results = PrivateFileBatch('wrong', file_format=None).rekey(
+            self.paths[:1], 'bazbarfoo')
+        self.assertEqual(results[0].status, FAILED)
+        with open(self.paths[0] + '.private', 'rb') as f:
+            self.assertEqual(f.read(), encrypted)
+
+    def test_migrate(self):
+        PrivateFileBatch('foobarbaz').encrypt(self.paths)
+        os.remove(self.paths[1] + '.private')
+        with open(self.paths[2] + '.private', 'rb') as f:
+            encrypted = f.read()
+        results = self.batch(file_format=None).migrate(self.paths)
+        self.assertEqual([r.status for r in results],
+                         [MIGRATED, FAILED, MIGRATED])
+        with open(self.paths[0] + '.private', 'rb') as f:
+            header = crypto.read_header(f.read())[0]
+        self.assertEqual(header['kdf_params'], {'iterations': 1000})
+        with open(self.paths[2] + '.private', 'rb') as f:
+            self.assertNotEqual(f.read(), encrypted)
+        results = self.batch(keep=True).decrypt(self.paths[2:])
+        self.assertEqual([r.status for r in results], [CREATED])
+        with open(self.paths[2]) as f:
+            self.assertEqual(f.read(), u'SECRET_KEY: c.yml\n')
+
+    @mock.patch('sys.stderr')
+    @mock.patch('sys.stdout')
+    def test_cli_migrate(self, mock_stdout, mock_stderr):
+        PrivateFileBatch('foobarbaz').encrypt(self.paths[:2])
+        argv = ['ordbok', 'migrate', self.tmp_dir, self.paths[2],
+                'foobarbaz', '--iterations', '1000']
+        with mock.patch('sys.argv', argv):
+            with self.assertRaises(SystemExit):
+                main()
+        for path in self.paths[:2]:
+            with open(path + '.private', 'rb') as f:
+                self.assertEqual(crypto.detect_format(f.read()),
+                                 crypto.FORMAT_ORDBOK)
+        output = ''.join(
+            call[0][0] for call in mock_stdout.write.call_args_list)
+        self.assertIn('a.yml.private migrated', output)
+        errors = ''.join(
+            call[0][0] for call in mock_stderr.write.call_args_list)
+        self.assertIn('c.yml.private failed', errors)
+
+    @mock.patch('sys.stdout')
+    def test_cli_rekey(self, mock_stdout):
+        self.batch().encrypt(self.paths)
+        argv = ['ordbok', 'rekey', self.tmp_dir, 'foobarbaz', 'bazbarfoo']
+        with mock.patch('sys.argv', argv):
+            main()
+        results = self.batch(keep=True).decrypt(self.paths)
+        self.assertEqual([r.status for r in results], [FAILED] * 3)
+        results = PrivateFileBatch('bazbarfoo').decrypt(self.paths)
+        self.assertEqual([r.status for r in results], [CREATED] * 3)
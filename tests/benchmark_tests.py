@@ -0,0 +1,135 @@
+from __future__ import print_function
+import os
+import sys
+import unittest
+import mock
+import yaml
+
+from ordbok import Ordbok, parser
+from ordbok.config_env import ConfigEnv
+from ordbok.lookup import ConfigFileLookup
+
+from tests.files import ConfigDirTestCase
+from tests.benchmarks import (
+    BenchmarkSuite, compare, generate_yaml, generate_environ, best_of,
+    import_times)
+
+
+@unittest.skipIf(not os.environ.get('BENCHMARK_TESTS'),
+                 'set BENCHMARK_TESTS to run benchmarks')
+class ParserBenchmarkTestCase(unittest.TestCase):
+    sizes = (1000, 10000, 100000)
+
+    @unittest.skipIf(not yaml.__with_libyaml__, 'libyaml not available')
+    def test_libyaml_safe_loader(self):
+        for n_keys in self.sizes:
+            content = generate_yaml(n_keys)
+            pure = best_of(
+                lambda: parser.load_yaml(content, loader=yaml.SafeLoader))
+            libyaml = best_of(
+                lambda: parser.load_yaml(content, loader=yaml.CSafeLoader))
+            print('\n{:>7} keys: SafeLoader {:.3f}s, CSafeLoader {:.3f}s '
+                  '({:.1f}x)'.format(n_keys, pure, libyaml, pure / libyaml))
+            self.assertLess(libyaml, pure)
+
+
+@unittest.skipIf(not os.environ.get('BENCHMARK_TESTS'),
+                 'set BENCHMARK_TESTS to run benchmarks')
+class LookupBenchmarkTestCase(unittest.TestCase):
+    def test_config_file_lookup(self):
+        keywords = ['ordbok_config_{:03d}'.format(i) for i in range(100)]
+        lookup = ConfigFileLookup((k, None) for k in keywords)
+        values = ['ordbok_config_{:03d}_url'.format(i % 150)
+                  for i in range(10000)]
+
+        def scan():
+            for value in values:
+                [k for k in lookup.keys() if value.startswith(k)]
+
+        def index():
+            for value in values:
+                lookup.match(value)
+
+        scan_time = best_of(scan)
+        index_time = best_of(index)
+        print('\n10000 values, 100 config files: scan {:.4f}s, '
+              'index {:.4f}s ({:.1f}x)'.format(
+                  scan_time, index_time, scan_time / index_time))
+        self.assertLess(index_time, scan_time)
+
+
+@unittest.skipIf(not os.environ.get('BENCHMARK_TESTS'),
+                 'set BENCHMARK_TESTS to run benchmarks')
+class ConfigEnvBenchmarkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.ordbok = Ordbok()
+        self.ordbok['ENVIRONMENT'] = 'development'
+        self.environ = generate_environ(5000, 500)
+
+    def test_config_env_load(self):
+        def yaml_sweep():
+            environ = {
+                key.replace('ORDBOK_', ''): value
+                for key, value in os.environ.items()
+                if value and key.startswith('ORDBOK')}
+            for key, value in environ.items():
+                self.ordbok[key] = parser.load_yaml(value)
+
+        config_env = ConfigEnv(self.ordbok)
+        declared_config_env = ConfigEnv(self.ordbok, declared_only=True)
+        for i in range(0, 500, 10):
+            declared_config_env.add_required_key(
+                'KEY_{}'.format(i), 'ordbok_env_config')
+
+        with mock.patch.dict('os.environ', self.environ):
+            yaml_time = best_of(yaml_sweep)
+            fast_time = best_of(config_env._load)
+            declared_time = best_of(declared_config_env._load)
+        print('\n5000 env vars (500 namespaced): yaml {:.4f}s, '
+              'scalar fast path {:.4f}s ({:.1f}x), 50 declared keys {:.4f}s '
+              '({:.1f}x)'.format(yaml_time, fast_time, yaml_time / fast_time,
+                                 declared_time, yaml_time / declared_time))
+        self.assertLess(fast_time, yaml_time)
+        self.assertLess(declared_time, fast_time)
+
+
+@unittest.skipIf(not os.environ.get('BENCHMARK_TESTS'),
+                 'set BENCHMARK_TESTS to run benchmarks')
+@unittest.skipIf(sys.version_info < (3, 7), '-X importtime needs Python 3.7')
+class ImportBenchmarkTestCase(unittest.TestCase):
+    def test_import_ordbok(self):
+        def total(statement):
+            return min(sum(t for _, t in import_times(statement))
+                       for _ in range(5))
+
+        lazy = total('import ordbok')
+        backends = total('import yaml, simplecrypt')
+        load = total('from ordbok import Ordbok')
+        print('\nimport ordbok {:.4f}s, from ordbok import Ordbok {:.4f}s, '
+              'yaml and simplecrypt {:.4f}s'.format(lazy, load, backends))
+        self.assertLess(lazy, backends)
+
+
+class BenchmarkSuiteTestCase(ConfigDirTestCase):
+    def test_run(self):
+        results = BenchmarkSuite(
+            self.tmp_dir, n_files=3, n_keys=20, depth=2, n_private=1,
+            n_env_vars=20, n_env_keys=2, repeat=1).run()
+        self.assertEqual(results['params']['n_files'], 3)
+        for name in ('ordbok.load', 'config_file.parse',
+                     'private_config_file.decrypt',
+                     'private_config_file.encrypt', 'config_env.load'):
+            self.assertIn(name, results['results'])
+            self.assertEqual(results['results'][name]['repeat'], 1)
+        if sys.version_info >= (3, 7):
+            self.assertIn('import.ordbok', results['results'])
+
+    def test_compare(self):
+        baseline = {'results': {
+            'a': {'min': 1.0}, 'b': {'min': 1.0}, 'c': {'min': 1.0}}}
+        results = {'results': {
+            'a': {'min': 1.1}, 'b': {'min': 2.0}, 'd': {'min': 1.0}}}
+        self.assertEqual(compare(results, baseline, threshold=0.25), [
+            ('a', 1.0, 1.1, 1.1, False),
+            ('b', 1.0, 2.0, 2.0, True),
+        ])
@@ -0,0 +1,421 @@
+'''
+Benchmark suite for the Ordbok load paths, run against a synthetic config
+tree generated in a temporary directory:
+
+    python -m tests.benchmarks --output results.json
+    python -m tests.benchmarks --compare results.json
+
+Results are written as JSON. With `--compare`, results slower than the
+baseline by more than `--threshold` are reported as regressions and the
+exit status is 1.
+'''
+from __future__ import print_function
+import os
+import sys
+import json
+import shutil
+import platform
+import argparse
+import tempfile
+import timeit
+import subprocess
+import mock
+import six
+
+from ordbok import Ordbok, ConfigFile, PrivateConfigFile, crypto
+from ordbok.config_env import ConfigEnv
+from ordbok.lookup import ConfigFileLookup
+
+BENCHMARK_VERSION = 1
+PASSWORD = 'benchmark-password'
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_IMPORTS_START = 'ordbok-benchmark-imports'
+
+
+def generate_yaml(n_keys, environments=('DEVELOPMENT', 'PRODUCTION'),
+                  extra=u''):
+    '''
+    Generate a multi-environment YAML config document with `n_keys` keys
+    spread evenly across `environments`. `extra` is appended to every
+    environment section.
+    '''
+    per_env = n_keys // len(environments)
+    lines = []
+    for env in environments:
+        lines.append(u'{}:'.format(env))
+        for i in range(per_env):
+            kind = i % 4
+            if kind == 0:
+                value = u"'value_{}'".format(i)
+            elif kind == 1:
+                value = u'{}'.format(i)
+            elif kind == 2:
+                value = u'{}'.format(i % 3 == 0).lower()
+            else:
+                value = u'[{0}, {0}.5, item_{0}]'.format(i)
+            lines.append(u'  KEY_{}: {}'.format(i, value))
+        lines.append(extra)
+    return u'\n'.join(lines) + u'\n'
+
+
+def generate_nested(depth, breadth=3, indent=2):
+    '''
+    Generate the YAML for a NESTED key `depth` dicts deep, with `breadth`
+    keys at each level.
+    '''
+    lines = [u'{}NESTED:'.format(u' ' * indent)]
+
+    def level(d, indent):
+        for i in range(breadth):
+            if d == depth:
+                lines.append(u"{}leaf_{}: 'value_{}_{}'".format(
+                    u' ' * indent, i, d, i))
+            else:
+                lines.append(u'{}level_{}_{}:'.format(u' ' * indent, d, i))
+                level(d + 1, indent + 2)
+    level(1, indent + 2)
+    return u'\n'.join(lines)
+
+
+def generate_environ(n_vars, n_ordbok_vars, namespace='ORDBOK'):
+    '''
+    Generate an environment with `n_vars` variables, `n_ordbok_vars` of
+    which are in the ordbok namespace.
+    '''
+    environ = {}
+    for i in range(n_vars - n_ordbok_vars):
+        environ['SERVICE_{}_PORT'.format(i)] = 'tcp://10.0.{}.{}:80'.format(
+            i // 256 % 256, i % 256)
+    values = ['value_{}', '{}', '{}.5', 'true', '[{0}, {0}]']
+    for i in range(n_ordbok_vars):
+        environ['{}_KEY_{}'.format(namespace, i)] = (
+            values[i % len(values)].format(i))
+    return environ
+
+
+def generate_tree(directory, n_files=10, n_keys=1000, depth=4, n_private=2,
+                  n_env_keys=10):
+    '''
+    Write a synthetic config tree to `directory`: a base file declaring
+    keys required from `n_files - 1` more files, `n_private` private files
+    (encrypted with `PASSWORD`) and `n_env_keys` env vars, each with
+    `n_keys` keys and a NESTED key `depth` dicts deep. Returns the list of
+    config files to load it with.
+    '''
+    nested = generate_nested(depth)
+    refs = [u"  REF_{0}: 'ordbok_config_{0:03d}'".format(i)
+            for i in range(1, n_files)]
+    refs += [u"  SECRET_{0}: 'ordbok_private_{0:03d}'".format(i)
+             for i in range(n_private)]
+    refs += [u"  ENV_KEY_{}: 'ordbok_env_config'".format(i)
+             for i in range(n_env_keys)]
+    config_files = ['base.yml']
+    with open(os.path.join(directory, 'base.yml'), 'w') as f:
+        f.write(generate_yaml(n_keys, extra=u'\n'.join([nested] + refs)))
+    for i in range(1, n_files):
+        filename = 'config_{:03d}.yml'.format(i)
+        config_files.append(filename)
+        with open(os.path.join(directory, filename), 'w') as f:
+            f.write(generate_yaml(n_keys, extra=u'\n'.join(
+                [nested, u"  REF_{}: 'ref_{}'".format(i, i)])))
+
+    ordbok = Ordbok(config_dir=directory)
+    ordbok['PRIVATE_KEY_ORDBOK'] = PASSWORD
+    for i in range(n_private):
+        filename = 'private_{:03d}.yml'.format(i)
+        with open(os.path.join(directory, filename), 'w') as f:
+            f.write(generate_yaml(n_keys, extra=u'\n'.join(
+                [nested, u"  SECRET_{}: 'secret_{}'".format(i, i)])))
+        private_config_file = PrivateConfigFile(
+            filename, file_format=crypto.FORMAT_ORDBOK)
+        private_config_file.init_config(ordbok)
+        private_config_file._save_encrypted_file()
+        os.remove(os.path.join(directory, filename))
+        config_files.append(private_config_file)
+    return config_files
+
+
+def tree_environ(n_vars, n_env_keys):
+    environ = generate_environ(n_vars, 0)
+    environ['ORDBOK_PRIVATE_KEY_ORDBOK'] = PASSWORD
+    environ['ORDBOK_ENVIRONMENT'] = 'development'
+    for i in range(n_env_keys):
+        environ['ORDBOK_ENV_KEY_{}'.format(i)] = 'env_value_{}'.format(i)
+    return environ
+
+
+def best_of(func, repeat=3):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def measure(func, setup=None, repeat=5):
+    '''
+    Time `func(*setup())` `repeat` times, calling `setup` untimed before
+    each run (it may return None if `func` takes no arguments).
+    '''
+    times = []
+    for _ in range(repeat):
+        args = (setup() or ()) if setup else ()
+        start = timeit.default_timer()
+        func(*args)
+        times.append(timeit.default_timer() - start)
+    times.sort()
+    return {'min': times[0], 'median': times[len(times) // 2],
+            'repeat': repeat}
+
+
+def import_times(statement='import ordbok'):
+    '''
+    Run `statement` in a new interpreter with `-X importtime` (Python 3.7
+    or later) and return `(module, cumulative seconds)` for each module it
+    imported at the top level, i.e. not counting the modules imported at
+    startup or those imported by another module in the list.
+    '''
+    process = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c',
+         'import sys; sys.stderr.write({!r}); {}'.format(
+             _IMPORTS_START + '\n', statement)],
+        cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _, stderr = process.communicate()
+    if process.returncode:
+        raise RuntimeError(stderr.decode('utf8'))
+    lines = stderr.decode('utf8').split(_IMPORTS_START + '\n', 1)[1]
+    times = []
+    for line in lines.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        if not name[1:].startswith(' '):
+            times.append((name.strip(), int(cumulative) / 1e6))
+    return times
+
+
+def measure_import(statement='import ordbok', repeat=5):
+    '''
+    Time the imports of `statement` in `repeat` new interpreters, as
+    reported by `import_times`.
+    '''
+    times = sorted(sum(t for _, t in import_times(statement))
+                   for _ in range(repeat))
+    return {'min': times[0], 'median': times[len(times) // 2],
+            'repeat': repeat}
+
+
+def clear_derived_keys():
+    with crypto._derived_keys_lock:
+        crypto._derived_keys.clear()
+
+
+class BenchmarkSuite(object):
+    def __init__(self, directory, n_files=10, n_keys=1000, depth=4,
+                 n_private=2, n_env_vars=1000, n_env_keys=10, repeat=5):
+        self.directory = directory
+        self.repeat = repeat
+        self.params = {
+            'n_files': n_files, 'n_keys': n_keys, 'depth': depth,
+            'n_private': n_private, 'n_env_vars': n_env_vars,
+            'n_env_keys': n_env_keys,
+        }
+        self.config_files = generate_tree(
+            directory, n_files, n_keys, depth, n_private, n_env_keys)
+        self.environ = tree_environ(n_env_vars, n_env_keys)
+
+    def ordbok(self):
+        return Ordbok(config_dir=self.directory, config_files=[
+            f if isinstance(f, six.string_types) else
+            PrivateConfigFile(f.filename, file_format=f.file_format)
+            for f in self.config_files])
+
+    def loaded_config_files(self, private):
+        '''
+        A fresh instance, its (initialized but not loaded) config files
+        and those of them which are, or are not, private.
+        '''
+        ordbok = self.ordbok()
+        ordbok['ENVIRONMENT'] = 'development'
+        config_files = [
+            f if isinstance(f, ConfigFile) else ConfigFile(f)
+            for f in ordbok.config_files]
+        for f in config_files:
+            f.init_config(ordbok)
+        config_files.append(ConfigEnv(ordbok))
+        lookup = ConfigFileLookup((f.keyword, f) for f in config_files)
+        for f in config_files:
+            f.config_files_lookup = lookup
+        return ordbok, config_files, [
+            f for f in config_files if not isinstance(f, ConfigEnv) and
+            isinstance(f, PrivateConfigFile) == private]
+
+    def stage_benchmarks(self, private):
+        name = 'private_config_file' if private else 'config_file'
+        _, _, config_files = self.loaded_config_files(private)
+
+        def read():
+            for f in config_files:
+                path = f.source_paths()[0]
+                with open(path, 'rb') as fp:
+                    fp.read()
+        yield name + '.read', read, None
+
+        if private:
+            encrypted = [f._load_encrypted_file() for f in config_files]
+
+            def decrypt():
+                for f, content in zip(config_files, encrypted):
+                    f._decrypt_content(content)
+            yield name + '.decrypt', decrypt, clear_derived_keys
+            yield name + '.decrypt_cached_key', decrypt, None
+            contents = [f._decrypt_content(c)
+                        for f, c in zip(config_files, encrypted)]
+
+            def encrypt():
+                for f, content in zip(config_files, contents):
+                    f._encrypt_content(content)
+            yield name + '.encrypt', encrypt, None
+        else:
+            contents = []
+            for f in config_files:
+                with open(f.config_file_path) as fp:
+                    contents.append(fp.read())
+
+        def parse():
+            for f, content in zip(config_files, contents):
+                f._parse_yaml(content)
+        yield name + '.parse', parse, None
+
+        parsed = [f._parse_yaml(c) for f, c in zip(config_files, contents)]
+
+        def select():
+            for f, c in zip(config_files, parsed):
+                f._select_environment(c)
+        yield name + '.select_environment', select, None
+
+        selected = [f._select_environment(c)
+                    for f, c in zip(config_files, parsed)]
+
+        def process(config_files):
+            for f, c in zip(config_files, selected):
+                for key, value in c.items():
+                    f._process_key_value(key, value)
+
+        def process_setup():
+            return (self.loaded_config_files(private)[2],)
+        yield name + '.process', process, process_setup
+
+    def benchmarks(self):
+        def load(ordbok):
+            ordbok.load()
+
+        def load_setup():
+            clear_derived_keys()
+            return (self.ordbok(),)
+        yield 'ordbok.load', load, load_setup
+        yield 'ordbok.load_cached_keys', load, lambda: (self.ordbok(),)
+
+        for benchmark in self.stage_benchmarks(private=False):
+            yield benchmark
+        if self.params['n_private']:
+            for benchmark in self.stage_benchmarks(private=True):
+                yield benchmark
+
+        def config_env_setup():
+            ordbok, config_files, _ = self.loaded_config_files(False)
+            return (config_files[-1],)
+        yield 'config_env.load', lambda f: f._load(), config_env_setup
+
+    def run(self):
+        results = {}
+        with mock.patch.dict('os.environ', self.environ):
+            for name, func, setup in self.benchmarks():
+                results[name] = measure(func, setup, self.repeat)
+        if sys.version_info >= (3, 7):
+            for name, statement in (
+                    ('import.ordbok', 'import ordbok'),
+                    ('import.ordbok_class', 'from ordbok import Ordbok')):
+                results[name] = measure_import(statement, self.repeat)
+        return {
+            'version': BENCHMARK_VERSION,
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'params': self.params,
+            'results': results,
+        }
+
+
+def compare(results, baseline, threshold=0.25):
+    '''
+    Compare `results` to `baseline` (both as returned by
+    `BenchmarkSuite.run`), returning a list of
+    `(name, baseline_min, min, ratio, regressed)` for every benchmark in
+    both. A benchmark has regressed if its minimum time is more than
+    `threshold` slower than the baseline's.
+    '''
+    comparison = []
+    for name in sorted(results['results']):
+        if name not in baseline['results']:
+            continue
+        base_min = baseline['results'][name]['min']
+        new_min = results['results'][name]['min']
+        ratio = new_min / base_min if base_min else float('inf')
+        comparison.append(
+            (name, base_min, new_min, ratio, ratio > 1 + threshold))
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark Ordbok load paths on a synthetic config tree.')
+    parser.add_argument('--files', type=int, default=10)
+    parser.add_argument('--keys', type=int, default=1000,
+                        help='keys per config file')
+    parser.add_argument('--depth', type=int, default=4,
+                        help='depth of the nested key in each file')
+    parser.add_argument('--private', type=int, default=2,
+                        help='number of private config files')
+    parser.add_argument('--env-vars', type=int, default=1000)
+    parser.add_argument('--env-keys', type=int, default=10,
+                        help='keys required from the environment')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write results as JSON to a file')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='compare with results from an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='slowdown reported as a regression')
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp()
+    try:
+        results = BenchmarkSuite(
+            directory, n_files=args.files, n_keys=args.keys,
+            depth=args.depth, n_private=args.private,
+            n_env_vars=args.env_vars, n_env_keys=args.env_keys,
+            repeat=args.repeat).run()
+    finally:
+        shutil.rmtree(directory)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    elif not args.compare:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('params') != results['params']:
+            print('warning: baseline was run with different parameters',
+                  file=sys.stderr)
+        regressed = False
+        for name, base_min, new_min, ratio, regression in compare(
+                results, baseline, args.threshold):
+            regressed = regressed or regression
+            print('{:<45} {:>10.6f}s {:>10.6f}s {:>6.2f}x{}'.format(
+                name, base_min, new_min, ratio,
+                '  REGRESSION' if regression else ''))
+        return 1 if regressed else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+import os
+import json
+import unittest
+import mock
+
+from ordbok import Ordbok, PrivateConfigFile, crypto
+from ordbok.cli import main
+from ordbok.compile import share_value
+from ordbok.exceptions import OrdbokMissingKeyException
+
+from tests.files import ConfigDirTestCase
+
+
+class ShareValueTestCase(unittest.TestCase):
+    def test_share_value(self):
+        replica = {'HOST': 'replica'}
+        previous = {'default': {'HOST': 'db'}, 'replica': replica}
+        shared = share_value(
+            {'default': {'HOST': 'other'}, 'replica': {'HOST': 'replica'}},
+            [previous])
+        self.assertIs(shared['replica'], replica)
+        self.assertEqual(shared['default'], {'HOST': 'other'})
+        self.assertIs(share_value(dict(previous), [previous]), previous)
+        # equal but of a different type
+        self.assertIsNot(share_value(1, [True]), True)
+
+
+class CompileEnvironmentsTestCase(ConfigDirTestCase):
+    def setUp(self):
+        super(CompileEnvironmentsTestCase, self).setUp()
+        self.write_config_file(u'config.yml', u"""
+DEVELOPMENT:
+  DEBUG: True
+  DATABASES:
+    default: {HOST: localhost}
+    replica: {HOST: replica}
+  SECRET_KEY: 'ordbok_local_config'
+PRODUCTION:
+  DEBUG: False
+  DATABASES:
+    default: {HOST: db}
+    replica: {HOST: replica}
+  SECRET_KEY: 'ordbok_private_config'
+STAGING:
+  DEBUG: False
+  SECRET_KEY: 'ordbok_private_config'
+""")
+        self.write_config_file(u'local_config.yml', u"""
+SECRET_KEY: 'dev'
+""")
+        self.write_config_file(u'private_config.yml', u"""
+PRODUCTION:
+  SECRET_KEY: 'prod'
+STAGING:
+  SECRET_KEY: 'staging'
+""")
+        private_config_file = PrivateConfigFile(
+            'private_config.yml', envs=['production', 'staging'])
+        self.ordbok = Ordbok(
+            config_dir=self.tmp_dir, include_env=False,
+            config_files=['config.yml', 'local_config.yml',
+                          private_config_file])
+        self.ordbok['PRIVATE_KEY_ORDBOK'] = 'foobarbaz'
+        private_config_file.init_config(self.ordbok)
+        private_config_file._save_encrypted_file()
+        os.remove(private_config_file.config_file_path)
+
+    def test_compile_environments(self):
+        with mock.patch.object(crypto, 'decrypt',
+                               wraps=crypto.decrypt) as decrypt:
+            with mock.patch('ordbok.config_private.decrypt', decrypt):
+                compiled = self.ordbok.compile_environments()
+        self.assertEqual(sorted(compiled),
+                         ['development', 'production', 'staging'])
+        self.assertEqual(decrypt.call_count, 1)
+        self.assertEqual(compiled['development']['SECRET_KEY'], 'dev')
+        self.assertEqual(compiled['production']['SECRET_KEY'], 'prod')
+        self.assertEqual(compiled['staging']['SECRET_KEY'], 'staging')
+        self.assertEqual(compiled['production']['ENVIRONMENT'],
+                         'production')
+        self.assertIs(compiled['production']['DATABASES']['replica'],
+                      compiled['development']['DATABASES']['replica'])
+        self.assertFalse(self.ordbok.loaded)
+
+    def test_merged_sections_are_not_environments(self):
+        self.write_config_file(u'config.yml', u"""
+COMMON: &common
+  DEBUG: False
+  SECRET_KEY: 'ordbok_private_config'
+DEVELOPMENT: &development
+  <<: *common
+  DEBUG: True
+  SECRET_KEY: 'ordbok_local_config'
+PRODUCTION:
+  <<: *common
+STAGING:
+  <<: *common
+""")
+        compiled = self.ordbok.compile_environments()
+        self.assertEqual(sorted(compiled),
+                         ['development', 'production', 'staging'])
+        self.assertEqual(compiled['production']['DEBUG'], False)
+
+    def test_compile_chosen_environments(self):
+        compiled = self.ordbok.compile_environments(['PRODUCTION'])
+        self.assertEqual(list(compiled), ['production'])
+        self.assertEqual(compiled['production']['DEBUG'], False)
+
+    def test_compile_matches_load(self):
+        compiled = self.ordbok.compile_environments(['production'])
+        ordbok = Ordbok(
+            config_dir=self.tmp_dir, include_env=False,
+            config_files=['config.yml', 'local_config.yml',
+                          PrivateConfigFile('private_config.yml',
+                                            envs=['production'])])
+        ordbok['ENVIRONMENT'] = 'production'
+        ordbok['PRIVATE_KEY_ORDBOK'] = 'foobarbaz'
+        ordbok.load()
+        self.assertEqual(compiled['production'], dict(ordbok))
+
+    def test_required_keys(self):
+        self.write_config_file(u'local_config.yml', u"""
+DEBUG: True
+""")
+        with self.assertRaises(OrdbokMissingKeyException):
+            self.ordbok.compile_environments(['development'])
+
+    @mock.patch('sys.stdout')
+    def test_cli_compile(self, mock_stdout):
+        output_dir = os.path.join(self.tmp_dir, 'out')
+        argv = ['ordbok', 'compile', '--config-dir', self.tmp_dir,
+                '--no-env', '--environment', 'development',
+                '--output-dir', output_dir]
+        with mock.patch('sys.argv', argv):
+            main()
+        with open(os.path.join(output_dir, 'development.json')) as f:
+            self.assertEqual(json.load(f)['SECRET_KEY'], 'dev')
@@ -0,0 +1,154 @@
+import base64
+import json
+import os
+import sqlite3
+import threading
+import mock
+from six.moves import BaseHTTPServer
+
+from ordbok import Ordbok, HTTPSource, ConsulSource, SQLiteSource
+from ordbok import config_source
+from ordbok.exceptions import (
+    OrdbokConfigSourceException, OrdbokMissingKeyException)
+
+from tests.files import ConfigDirTestCase
+
+
+class KVHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        status, body = self.server.routes.get(self.path, (404, b''))
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ConfigSourceTestCase(ConfigDirTestCase):
+    def setUp(self):
+        super(ConfigSourceTestCase, self).setUp()
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), KVHandler)
+        self.server.routes = {}
+        self.server.requests = []
+        self.connections = []
+        get_request = self.server.get_request
+
+        def counted_get_request():
+            request = get_request()
+            self.connections.append(request)
+            return request
+        self.server.get_request = counted_get_request
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+        self.write_config_file(u'config.yml', u"""
+DEVELOPMENT:
+  SECRET_KEY: 'ordbok_remote'
+  DEBUG: False
+""")
+
+    def tearDown(self):
+        config_source.close_pools()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def ordbok(self, source):
+        return Ordbok(config_dir=self.tmp_dir, include_env=False,
+                      config_files=['config.yml', source])
+
+    def test_http_source(self):
+        self.server.routes['/config'] = (200, json.dumps({
+            'DEVELOPMENT': {'SECRET_KEY': 'keep out!', 'DEBUG': True},
+            'PRODUCTION': {'SECRET_KEY': 'other'}}).encode('utf-8'))
+        ordbok = self.ordbok(HTTPSource('remote', self.url + '/config'))
+        ordbok.load()
+        self.assertEqual(ordbok['SECRET_KEY'], 'keep out!')
+        self.assertEqual(ordbok['DEBUG'], True)
+        self.assertNotIn('remote', ordbok.config_file_names)
+
+        # connections are pooled between loads
+        self.ordbok(HTTPSource('remote', self.url + '/config')).load()
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(len(self.connections), 1)
+
+    def test_http_source_error(self):
+        ordbok = self.ordbok(HTTPSource('remote', self.url + '/missing'))
+        with self.assertRaises(OrdbokConfigSourceException):
+            ordbok.load()
+
+    def test_required_key(self):
+        self.server.routes['/config'] = (200, b'{"DEBUG": true}')
+        with self.assertRaises(OrdbokMissingKeyException):
+            self.ordbok(HTTPSource('remote', self.url + '/config')).load()
+
+    def test_consul_source(self):
+        def entry(key, value):
+            return {'Key': key, 'Value': base64.b64encode(
+                value.encode('utf-8')).decode('ascii')}
+        self.server.routes[
+            '/v1/kv/ordbok/development/?recurse=true'] = (200, json.dumps([
+                {'Key': 'ordbok/development/', 'Value': None},
+                entry('ordbok/development/SECRET_KEY', 'keep out!'),
+                entry('ordbok/development/PORT', '8080'),
+                {'Key': 'ordbok/development/EMPTY', 'Value': None},
+            ]).encode('utf-8'))
+        ordbok = self.ordbok(ConsulSource('remote', self.url))
+        ordbok.load()
+        self.assertEqual(ordbok['SECRET_KEY'], 'keep out!')
+        self.assertEqual(ordbok['PORT'], 8080)
+        self.assertIsNone(ordbok['EMPTY'])
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_ttl(self):
+        self.server.routes['/config'] = (200, b'{"SECRET_KEY": "one"}')
+        ordbok = self.ordbok(HTTPSource('remote', self.url + '/config',
+                                        ttl=60))
+        ordbok.load()
+        self.server.routes['/config'] = (200, b'{"SECRET_KEY": "two"}')
+        self.assertFalse(ordbok.reload())
+        self.assertEqual(len(self.server.requests), 1)
+
+        with mock.patch.object(config_source, 'time') as mock_time:
+            mock_time.time.return_value = 1e12
+            diff = ordbok.reload()
+        self.assertEqual(diff.changed, set(['SECRET_KEY']))
+        self.assertEqual(ordbok['SECRET_KEY'], 'two')
+
+
+class SQLiteSourceTestCase(ConfigDirTestCase):
+    def setUp(self):
+        super(SQLiteSourceTestCase, self).setUp()
+        self.path = os.path.join(self.tmp_dir, 'config.db')
+        conn = sqlite3.connect(self.path)
+        conn.execute('CREATE TABLE config (key TEXT PRIMARY KEY, value TEXT)')
+        conn.executemany('INSERT INTO config VALUES (?, ?)', [
+            ('ordbok/development/SECRET_KEY', 'keep out!'),
+            ('ordbok/development/DEBUG', 'true'),
+            ('ordbok/production/SECRET_KEY', 'other'),
+        ])
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        config_source.close_pools()
+
+    def test_sqlite_source(self):
+        ordbok = Ordbok(config_dir=self.tmp_dir, include_env=False,
+                        config_files=[SQLiteSource('local', self.path)])
+        ordbok.load()
+        self.assertEqual(ordbok['SECRET_KEY'], 'keep out!')
+        self.assertEqual(ordbok['DEBUG'], True)
+        self.assertEqual(ordbok.watched_paths, [self.path])
+
+    def test_sqlite_source_error(self):
+        ordbok = Ordbok(config_dir=self.tmp_dir, include_env=False,
+                        config_files=[SQLiteSource('local', self.path,
+                                                   table='missing')])
+        with self.assertRaises(OrdbokConfigSourceException):
+            ordbok.load()
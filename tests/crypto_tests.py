@@ -0,0 +1,253 @@
+import os
+import stat
+import unittest
+import mock
+import simplecrypt
+
+from ordbok import Ordbok, PrivateConfigFile, crypto
+from ordbok.batch import PrivateFileBatch
+from ordbok.cli import main
+from ordbok.crypto import KeyCache, simplecrypt_decrypt, simplecrypt_encrypt
+from ordbok.exceptions import OrdbokDecryptionException
+
+from tests.files import ConfigDirTestCase
+
+
+class OrdbokKeyCacheTestCase(ConfigDirTestCase):
+    def setUp(self):
+        super(OrdbokKeyCacheTestCase, self).setUp()
+        self.path = os.path.join(self.tmp_dir, 'keys')
+        crypto._derived_keys.clear()
+
+    def tearDown(self):
+        crypto._derived_keys.clear()
+
+    def test_derive_cached_in_process(self):
+        kdf = mock.Mock(return_value=b'keys')
+        self.assertEqual(KeyCache().derive('foo', b'salt', 1, kdf), b'keys')
+        self.assertEqual(KeyCache().derive('foo', b'salt', 1, kdf), b'keys')
+        self.assertEqual(kdf.call_count, 1)
+
+    def test_derive_keyed_on_password_salt_and_params(self):
+        kdf = mock.Mock(return_value=b'keys')
+        key_cache = KeyCache()
+        key_cache.derive('foo', b'salt', 1, kdf)
+        key_cache.derive('bar', b'salt', 1, kdf)
+        key_cache.derive('foo', b'pepper', 1, kdf)
+        key_cache.derive('foo', b'salt', 2, kdf)
+        self.assertEqual(kdf.call_count, 4)
+
+    def test_derive_cached_on_host(self):
+        kdf = mock.Mock(return_value=b'keys')
+        KeyCache(self.path).derive('foo', b'salt', 1, kdf)
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        crypto._derived_keys.clear()
+        self.assertEqual(
+            KeyCache(self.path).derive('foo', b'salt', 1, kdf), b'keys')
+        self.assertEqual(kdf.call_count, 1)
+
+    def test_host_cache_loose_permissions_ignored(self):
+        kdf = mock.Mock(return_value=b'keys')
+        KeyCache(self.path).derive('foo', b'salt', 1, kdf)
+        os.chmod(self.path, 0o644)
+        crypto._derived_keys.clear()
+        KeyCache(self.path).derive('foo', b'salt', 1, kdf)
+        self.assertEqual(kdf.call_count, 2)
+
+    def test_host_cache_does_not_contain_password(self):
+        KeyCache(self.path).derive(
+            'foobarbaz', b'salt', 1, mock.Mock(return_value=b'keys'))
+        with open(self.path, 'rb') as f:
+            self.assertNotIn(b'foobarbaz', f.read())
+
+
+class OrdbokSimplecryptTestCase(unittest.TestCase):
+    def setUp(self):
+        crypto._derived_keys.clear()
+
+    def test_round_trip(self):
+        encrypted = simplecrypt_encrypt('foobarbaz', u'FOO: bar')
+        self.assertTrue(encrypted.startswith(simplecrypt.HEADER[-1]))
+        self.assertEqual(simplecrypt_decrypt('foobarbaz', encrypted),
+                         b'FOO: bar')
+
+    def test_bad_password(self):
+        encrypted = simplecrypt_encrypt('foobarbaz', u'FOO: bar')
+        with self.assertRaises(simplecrypt.DecryptionException):
+            simplecrypt_decrypt('foobar', encrypted)
+
+    def test_decrypt_uses_key_cache(self):
+        encrypted = simplecrypt_encrypt('foobarbaz', u'FOO: bar')
+        with mock.patch.object(crypto, 'pbkdf2_sha256',
+                               wraps=crypto.pbkdf2_sha256) as mock_kdf:
+            simplecrypt_decrypt('foobarbaz', encrypted)
+            simplecrypt_decrypt('foobarbaz', encrypted)
+        self.assertEqual(mock_kdf.call_count, 1)
+
+    def test_missing_password(self):
+        encrypted = simplecrypt_encrypt('foobarbaz', u'FOO: bar')
+        for password in ('', None):
+            with self.assertRaises(ValueError):
+                simplecrypt_encrypt(password, u'FOO: bar')
+            with self.assertRaises(ValueError):
+                simplecrypt_decrypt(password, encrypted)
+
+    def test_wire_compatible_with_simplecrypt(self):
+        # simplecrypt's own (slow) key derivation, with fewer iterations
+        with mock.patch.object(simplecrypt, 'EXPANSION_COUNT',
+                               (100, 100, 1000)):
+            encrypted = simplecrypt_encrypt('foobarbaz', u'FOO: bar')
+            self.assertEqual(simplecrypt.decrypt('foobarbaz', encrypted),
+                             b'FOO: bar')
+            crypto._derived_keys.clear()
+            encrypted = simplecrypt.encrypt('foobarbaz', u'FOO: bar')
+            self.assertEqual(simplecrypt_decrypt('foobarbaz', encrypted),
+                             b'FOO: bar')
+            with self.assertRaises(simplecrypt.DecryptionException):
+                simplecrypt_decrypt('foobar', encrypted)
+            with self.assertRaises(simplecrypt.DecryptionException):
+                simplecrypt.decrypt(
+                    'foobar', simplecrypt_encrypt('foobarbaz', u'FOO: bar'))
+
+    @unittest.skipIf(os.environ.get('SKIP_ENCRYPT_TEST'),
+                     'as env var to skip lengthy test')
+    def test_compatible_with_simplecrypt(self):
+        self.assertEqual(
+            simplecrypt.decrypt(
+                'foobarbaz', simplecrypt_encrypt('foobarbaz', u'FOO: bar')),
+            b'FOO: bar')
+        self.assertEqual(
+            simplecrypt_decrypt(
+                'foobarbaz', simplecrypt.encrypt('foobarbaz', u'FOO: bar')),
+            b'FOO: bar')
+
+
+class OrdbokFormatTestCase(unittest.TestCase):
+    fast_kdf_params = {
+        crypto.KDF_PBKDF2: {'iterations': 1000},
+        crypto.KDF_SCRYPT: {'n': 2 ** 10},
+    }
+
+    def setUp(self):
+        crypto._derived_keys.clear()
+
+    def encrypt(self, data, kdf=crypto.KDF_PBKDF2, **kwargs):
+        return crypto.ordbok_encrypt(
+            'foobarbaz', data, kdf=kdf,
+            kdf_params=self.fast_kdf_params[kdf], **kwargs)
+
+    def test_round_trip(self):
+        kdfs = [crypto.KDF_PBKDF2]
+        if hasattr(crypto.hashlib, 'scrypt'):
+            kdfs.append(crypto.KDF_SCRYPT)
+        for kdf in kdfs:
+            for cipher in (crypto.CIPHER_AES_GCM,
+                           crypto.CIPHER_AES_CTR_HMAC):
+                encrypted = self.encrypt(u'FOO: bar', kdf=kdf, cipher=cipher)
+                self.assertEqual(
+                    crypto.ordbok_decrypt('foobarbaz', encrypted),
+                    b'FOO: bar')
+
+    def test_header(self):
+        encrypted = self.encrypt(u'FOO: bar')
+        self.assertEqual(crypto.detect_format(encrypted),
+                         crypto.FORMAT_ORDBOK)
+        header, _, _ = crypto.read_header(encrypted)
+        self.assertEqual(header['kdf'], crypto.KDF_PBKDF2)
+        self.assertEqual(header['kdf_params'], {'iterations': 1000})
+        self.assertEqual(header['cipher'], crypto.DEFAULT_CIPHER)
+
+    def test_bad_password(self):
+        for cipher in (crypto.CIPHER_AES_GCM, crypto.CIPHER_AES_CTR_HMAC):
+            encrypted = self.encrypt(u'FOO: bar', cipher=cipher)
+            with self.assertRaises(OrdbokDecryptionException):
+                crypto.ordbok_decrypt('foobar', encrypted)
+
+    def test_header_authenticated(self):
+        encrypted = self.encrypt(u'FOO: bar')
+        tampered = encrypted.replace(b'1000', b'1001')
+        crypto._derived_keys.clear()
+        with self.assertRaises(OrdbokDecryptionException):
+            crypto.ordbok_decrypt('foobarbaz', tampered)
+
+    def test_unsupported_version(self):
+        encrypted = bytearray(self.encrypt(u'FOO: bar'))
+        encrypted[len(crypto.MAGIC)] = 2
+        with self.assertRaises(OrdbokDecryptionException):
+            crypto.ordbok_decrypt('foobarbaz', bytes(encrypted))
+
+    def test_decrypt_detects_format(self):
+        self.assertEqual(
+            crypto.decrypt('foobarbaz', self.encrypt(u'FOO: bar')),
+            b'FOO: bar')
+        self.assertEqual(
+            crypto.decrypt('foobarbaz',
+                           simplecrypt_encrypt('foobarbaz', u'FOO: bar')),
+            b'FOO: bar')
+
+
+class OrdbokPrivateFileFormatTestCase(ConfigDirTestCase):
+    content = u"""
+OAUTH_KEY: 'super_secret_key'
+"""
+
+    def setUp(self):
+        super(OrdbokPrivateFileFormatTestCase, self).setUp()
+        self.path = os.path.join(self.tmp_dir, 'private_config.yml')
+        with open(self.path, 'w') as f:
+            f.write(self.content)
+
+    def private_config_file(self, **kwargs):
+        private_config_file = PrivateConfigFile(
+            'private_config.yml', **kwargs)
+        ordbok = Ordbok(config_dir=self.tmp_dir,
+                        config_files=[private_config_file],
+                        include_env=False)
+        ordbok['PRIVATE_KEY_ORDBOK'] = 'foobarbaz'
+        private_config_file.init_config(ordbok)
+        return private_config_file
+
+    def read_encrypted(self):
+        with open(self.path + '.private', 'rb') as f:
+            return f.read()
+
+    def test_load_ordbok_format(self):
+        private_config_file = self.private_config_file(
+            file_format=crypto.FORMAT_ORDBOK, kdf=crypto.KDF_PBKDF2,
+            kdf_params={'iterations': 1000})
+        private_config_file._save_encrypted_file()
+        self.assertEqual(crypto.detect_format(self.read_encrypted()),
+                         crypto.FORMAT_ORDBOK)
+        private_config_file.config.load()
+        self.assertEqual(private_config_file.config['OAUTH_KEY'],
+                         'super_secret_key')
+
+    def test_migrate(self):
+        self.private_config_file()._save_encrypted_file()
+        self.assertEqual(crypto.detect_format(self.read_encrypted()),
+                         crypto.FORMAT_SIMPLECRYPT)
+        os.chmod(self.path + '.private', 0o644)
+        PrivateFileBatch(
+            'foobarbaz', kdf=crypto.KDF_PBKDF2,
+            kdf_params={'iterations': 1000}).migrate([self.path])
+        self.assertEqual(crypto.detect_format(self.read_encrypted()),
+                         crypto.FORMAT_ORDBOK)
+        self.assertEqual(
+            stat.S_IMODE(os.stat(self.path + '.private').st_mode), 0o644)
+        self.assertEqual(
+            self.private_config_file()._load_and_decrypt_file(),
+            self.content)
+
+    @mock.patch('sys.stdout')
+    def test_cli_encrypt_and_migrate(self, mock_stdout):
+        argv = ['ordbok', 'encrypt', self.path, 'foobarbaz']
+        with mock.patch('sys.argv', argv):
+            main()
+        self.assertFalse(os.path.exists(self.path))
+        argv = ['ordbok', 'migrate', self.path, 'foobarbaz',
+                '--iterations', '1000']
+        with mock.patch('sys.argv', argv):
+            main()
+        header, _, _ = crypto.read_header(self.read_encrypted())
+        self.assertEqual(header['kdf'], crypto.KDF_PBKDF2)
+        self.assertEqual(header['kdf_params'], {'iterations': 1000})
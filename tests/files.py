@@ -1,4 +1,7 @@
 import os
+import shutil
+import tempfile
+import unittest
 from contextlib import contextmanager
 from io import StringIO, BytesIO
 
@@ -63,3 +66,22 @@ def fake_path_exists_factory(fudged_config_files):
         file_ = fake_file_factory(fudged_config_files)(filename)
         yield file_ is not None
     return fake_exists
+
+
+class ConfigDirTestCase(unittest.TestCase):
+    '''
+    Base for tests reading config files from a temporary directory,
+    `self.tmp_dir`, which is removed after each test. Config files are
+    written to `self.config_dir`, which defaults to `self.tmp_dir`.
+    '''
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.config_dir = self.tmp_dir
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def write_config_file(self, filename, content):
+        # replaced atomically, so a reload never reads it half written
+        path = os.path.join(self.config_dir, filename)
+        with open(path + '.tmp', 'w') as f:
+            f.write(content)
+        os.rename(path + '.tmp', path)
@@ -0,0 +1,98 @@
+import pickle
+import unittest
+
+from ordbok import Ordbok
+from ordbok.frozen import FrozenDict, FrozenConfig, freeze_value
+
+from tests.files import ConfigDirTestCase
+
+
+class FrozenDictTestCase(unittest.TestCase):
+    def setUp(self):
+        self.frozen = FrozenDict({
+            'SECRET_KEY': 'keep out!',
+            'DATABASES': {'default': {'PORT': 5432}},
+            'HOSTS': ['a', 'b'],
+            'not-an-identifier': 1,
+        })
+
+    def test_mapping(self):
+        self.assertEqual(self.frozen['SECRET_KEY'], 'keep out!')
+        self.assertEqual(self.frozen.get('MISSING', 'default'), 'default')
+        self.assertIn('HOSTS', self.frozen)
+        self.assertEqual(len(self.frozen), 4)
+        self.assertEqual(self.frozen, {
+            'SECRET_KEY': 'keep out!',
+            'DATABASES': {'default': {'PORT': 5432}},
+            'HOSTS': ('a', 'b'),
+            'not-an-identifier': 1,
+        })
+
+    def test_nested_frozen(self):
+        self.assertIsInstance(self.frozen['DATABASES'], FrozenDict)
+        self.assertIsInstance(self.frozen['DATABASES']['default'], FrozenDict)
+        self.assertEqual(self.frozen['HOSTS'], ('a', 'b'))
+        self.assertEqual(freeze_value({'A': [{'B': set([1])}]}),
+                         FrozenDict({'A': (FrozenDict({'B': frozenset([1])}),)}))
+
+    def test_attribute_access(self):
+        self.assertEqual(self.frozen.SECRET_KEY, 'keep out!')
+        self.assertEqual(self.frozen.DATABASES.default.PORT, 5432)
+        self.assertFalse(hasattr(self.frozen, 'MISSING'))
+        self.assertTrue(callable(FrozenDict({'get': 1}).get))
+
+    def test_immutable(self):
+        with self.assertRaises(TypeError):
+            self.frozen['SECRET_KEY'] = 'let me in'
+        with self.assertRaises(AttributeError):
+            self.frozen.SECRET_KEY = 'let me in'
+        with self.assertRaises(AttributeError):
+            del self.frozen.SECRET_KEY
+
+    def test_hashable(self):
+        other = FrozenDict({
+            'SECRET_KEY': 'keep out!',
+            'DATABASES': {'default': {'PORT': 5432}},
+            'HOSTS': ('a', 'b'),
+            'not-an-identifier': 1,
+        })
+        self.assertEqual(hash(self.frozen), hash(other))
+        self.assertEqual(len(set([self.frozen, other])), 1)
+
+    def test_thaw(self):
+        thawed = self.frozen.thaw()
+        self.assertEqual(thawed['DATABASES'], {'default': {'PORT': 5432}})
+        self.assertEqual(thawed['HOSTS'], ['a', 'b'])
+        self.assertIs(type(thawed['DATABASES']), dict)
+
+    def test_pickle(self):
+        self.assertEqual(pickle.loads(pickle.dumps(self.frozen)), self.frozen)
+        frozen_config = FrozenConfig({'A': 1}, generation=3)
+        unpickled = pickle.loads(pickle.dumps(frozen_config))
+        self.assertEqual(unpickled, frozen_config)
+        self.assertEqual(unpickled.generation, 3)
+
+
+class OrdbokFreezeTestCase(ConfigDirTestCase):
+    def setUp(self):
+        super(OrdbokFreezeTestCase, self).setUp()
+        self.write_config_file(
+            u'config.yml', u"DEVELOPMENT:\n  HOSTS: ['a']\n")
+        self.ordbok = Ordbok(config_dir=self.tmp_dir, include_env=False)
+        self.ordbok.load()
+
+    def test_freeze(self):
+        frozen = self.ordbok.freeze()
+        self.assertIsInstance(frozen, FrozenConfig)
+        self.assertEqual(frozen.HOSTS, ('a',))
+        self.assertEqual(frozen.ENVIRONMENT, 'development')
+        self.assertEqual(frozen.generation, self.ordbok.generation)
+
+    def test_freeze_after_reload(self):
+        frozen = self.ordbok.freeze()
+        self.write_config_file(
+            u'config.yml', u"DEVELOPMENT:\n  HOSTS: ['a', 'b']\n")
+        self.ordbok.reload()
+        self.assertEqual(frozen.HOSTS, ('a',))
+        self.assertNotEqual(frozen.generation, self.ordbok.generation)
+        self.assertEqual(self.ordbok.freeze().HOSTS, ('a', 'b'))
@@ -0,0 +1,46 @@
+import sys
+import subprocess
+import unittest
+
+import ordbok
+from ordbok.ordbok import Ordbok
+from ordbok.config_source import SQLiteSource
+from tests.benchmarks import ROOT
+
+
+def imported_modules(statement):
+    output = subprocess.check_output(
+        [sys.executable, '-c',
+         '{}; import sys; print(" ".join(sys.modules))'.format(statement)],
+        cwd=ROOT)
+    return set(output.decode('utf8').split())
+
+
+class LazyImportTestCase(unittest.TestCase):
+    backends = set(['yaml', 'simplecrypt', 'Crypto', 'sqlite3'])
+
+    def test_import_does_not_load_backends(self):
+        modules = imported_modules('import ordbok')
+        if sys.version_info >= (3, 7):
+            self.assertNotIn('ordbok.ordbok', modules)
+        self.assertFalse(self.backends & modules)
+        modules = imported_modules(
+            'from ordbok import Ordbok; Ordbok(config_dir=".")')
+        self.assertFalse(self.backends & modules)
+
+    def test_backends_load_on_use(self):
+        modules = imported_modules(
+            'from ordbok import crypto; crypto.default_cipher()')
+        self.assertIn('simplecrypt', modules)
+        modules = imported_modules(
+            'from ordbok.schema import coerce_dict; coerce_dict("{A: 1}")')
+        self.assertIn('yaml', modules)
+
+    def test_public_api(self):
+        self.assertIs(ordbok.Ordbok, Ordbok)
+        self.assertIs(ordbok.SQLiteSource, SQLiteSource)
+        for name in ordbok.__all__:
+            self.assertIn(name, dir(ordbok))
+            self.assertTrue(hasattr(ordbok, name))
+        with self.assertRaises(AttributeError):
+            ordbok.NotOrdbok
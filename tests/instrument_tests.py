@@ -0,0 +1,110 @@
+import os
+import unittest
+import mock
+import fudge
+
+from ordbok import Ordbok, ConfigFile, PrivateConfigFile
+from ordbok.crypto import FORMAT_ORDBOK, KDF_PBKDF2
+from ordbok.instrument import STAGES, statsd_exporter
+
+from tests.files import (
+    fudged_config_files, fake_file_factory, ConfigDirTestCase)
+
+
+class OrdbokInstrumentTestCase(unittest.TestCase):
+    @fudge.patch('six.moves.builtins.open')
+    def test_disabled(self, fudged_open):
+        fudged_open.is_callable().calls(fake_file_factory(fudged_config_files))
+        ordbok = Ordbok()
+        ordbok.load()
+        self.assertIsNone(ordbok.load_report)
+        for config_file in ordbok.config_files:
+            self.assertNotIn('load', vars(config_file))
+
+    @fudge.patch('six.moves.builtins.open')
+    def test_load_report(self, fudged_open):
+        fudged_open.is_callable().calls(fake_file_factory(fudged_config_files))
+        ordbok = Ordbok(instrument=True)
+        ordbok.load()
+        report = ordbok.load_report
+        self.assertEqual(list(report.files),
+                         ['config.yml', 'local_config.yml',
+                          'ordbok_env_config'])
+        config = report.files['config.yml']
+        self.assertEqual(config.bytes, len(fudged_config_files['config.yml']))
+        self.assertEqual(config.keys, 4)
+        self.assertEqual(report.files['local_config.yml'].keys, 3)
+        self.assertEqual(list(config.stages), list(STAGES))
+        self.assertGreater(config.stages['parse'], 0)
+        self.assertGreater(config.stages['validate'], 0)
+        self.assertGreaterEqual(report.total, sum(report.stages.values()))
+        self.assertEqual(report.as_dict()['files'][0]['name'], 'config.yml')
+        # the wrappers are removed once loaded
+        for config_file in ordbok.config_files:
+            self.assertNotIn('load', vars(config_file))
+            self.assertNotIn('_parse_yaml', vars(config_file))
+
+    @fudge.patch('six.moves.builtins.open')
+    def test_exporter(self, fudged_open):
+        fudged_open.is_callable().calls(fake_file_factory(fudged_config_files))
+        ordbok = Ordbok()
+        exporter = mock.Mock()
+        ordbok.add_exporter(exporter)
+        ordbok.load()
+        exporter.assert_called_once_with(ordbok.load_report)
+
+    @fudge.patch('six.moves.builtins.open')
+    def test_statsd_exporter(self, fudged_open):
+        fudged_open.is_callable().calls(fake_file_factory(fudged_config_files))
+        client = mock.Mock()
+        ordbok = Ordbok()
+        ordbok.add_exporter(statsd_exporter(client, prefix='app'))
+        ordbok.load()
+        timings = dict(call[0] for call in client.timing.call_args_list)
+        gauges = dict(call[0] for call in client.gauge.call_args_list)
+        self.assertIn('app.load.seconds', timings)
+        self.assertIn('app.stage.seconds.stage_parse', timings)
+        self.assertIn('app.file.stage.seconds.file_config_yml.stage_read',
+                      timings)
+        self.assertEqual(gauges['app.file.keys.file_local_config_yml'], 3)
+
+
+class OrdbokInstrumentFilesTestCase(ConfigDirTestCase):
+    def setUp(self):
+        super(OrdbokInstrumentFilesTestCase, self).setUp()
+        for filename, content in fudged_config_files.items():
+            self.write_config_file(filename, content)
+
+    @mock.patch.dict('os.environ', {u'PRIVATE_KEY_ORDBOK': u'foobarbaz'})
+    def test_private_decrypt_stage(self):
+        self.write_config_file(u'private_config.yml', u"""
+OAUTH_KEY: 'super_secret_key'
+""")
+        private_config_file = PrivateConfigFile(
+            'private_config.yml', file_format=FORMAT_ORDBOK, kdf=KDF_PBKDF2,
+            kdf_params={'iterations': 1000})
+        ordbok = Ordbok(
+            config_dir=self.tmp_dir, include_env=False, instrument=True,
+            config_files=['config.yml', 'local_config.yml',
+                          private_config_file])
+        private_config_file.init_config(ordbok)
+        private_config_file._save_encrypted_file()
+
+        ordbok.load()
+        private = ordbok.load_report.files['private_config.yml']
+        self.assertGreater(private.stages['decrypt'], 0)
+        self.assertGreater(private.bytes, 0)
+        self.assertEqual(private.keys, 1)
+
+    def test_reload_report(self):
+        ordbok = Ordbok(config_dir=self.tmp_dir, include_env=False,
+                        instrument=True, provenance=True)
+        ordbok.load()
+        exporter = ordbok.add_exporter(mock.Mock())
+        first_report = ordbok.load_report
+        with mock.patch.object(ConfigFile, '_parse_yaml') as parse_yaml:
+            ordbok.reload()
+        self.assertFalse(parse_yaml.called)
+        self.assertIsNot(ordbok.load_report, first_report)
+        self.assertEqual(ordbok.load_report.stages['parse'], 0)
+        exporter.assert_called_once_with(ordbok.load_report)
@@ -0,0 +1,158 @@
+import os
+import pickle
+import unittest
+import mock
+
+from ordbok import Ordbok, PrivateConfigFile
+from ordbok.crypto import FORMAT_ORDBOK, KDF_PBKDF2, read_header
+from ordbok.lazy import build_index, select_index
+from ordbok.exceptions import (
+    OrdbokMissingKeyException, OrdbokMissingPrivateKeyException)
+
+from tests.files import ConfigDirTestCase
+
+
+class IndexTestCase(unittest.TestCase):
+    def test_build_index(self):
+        index = build_index({
+            'COMMON': 'value',
+            'DEVELOPMENT': {
+                'SECRET_KEY': 'keep out!',
+                'API_KEY': None,
+                'DATABASE_URL': 'ordbok_env_config',
+            },
+        }, 'ordbok')
+        self.assertEqual(select_index(index, 'development'), {
+            'SECRET_KEY': 1, 'API_KEY': 0,
+            'DATABASE_URL': 'ordbok_env_config'})
+        self.assertEqual(select_index(index, 'production'),
+                         {'COMMON': 1, 'DEVELOPMENT': 1})
+        self.assertIsNone(select_index(index, 'common'))
+
+
+class OrdbokLazyTestCase(ConfigDirTestCase):
+    def setUp(self):
+        self.environ = mock.patch.dict(
+            'os.environ', {u'PRIVATE_KEY_ORDBOK': u'foobarbaz'})
+        self.environ.start()
+        super(OrdbokLazyTestCase, self).setUp()
+        self.write_config_file(u'config.yml', u"""
+DEVELOPMENT:
+  SECRET_KEY: 'not so secret'
+  OAUTH_KEY: 'ordbok_private_config'
+  DEBUG: True
+""")
+        self.write_config_file(u'local_config.yml', u"""
+DEBUG: False
+""")
+        self.write_private_config_file(u"""
+DEVELOPMENT:
+  SECRET_KEY: 'keep out!'
+  OAUTH_KEY: 'super_secret_key'
+  DEBUG: True
+""")
+
+    def tearDown(self):
+        self.environ.stop()
+
+    def private_config_file(self, index=True):
+        return PrivateConfigFile(
+            'private_config.yml', file_format=FORMAT_ORDBOK, kdf=KDF_PBKDF2,
+            kdf_params={'iterations': 1000}, index=index)
+
+    def write_private_config_file(self, content, index=True):
+        self.write_config_file(u'private_config.yml', content)
+        private_config_file = self.private_config_file(index)
+        private_config_file.init_config(self.ordbok())
+        private_config_file._save_encrypted_file()
+        os.remove(private_config_file.config_file_path)
+
+    def ordbok(self, **kwargs):
+        kwargs.setdefault('config_dir', self.tmp_dir)
+        kwargs.setdefault('include_env', False)
+        return Ordbok(config_files=[
+            'config.yml', self.private_config_file(), 'local_config.yml'],
+            **kwargs)
+
+    def test_index_in_header(self):
+        with open(os.path.join(
+                self.tmp_dir, u'private_config.yml.private'), 'rb') as f:
+            header = read_header(f.read())[0]
+        self.assertEqual(header['index']['sections']['DEVELOPMENT'], {
+            'SECRET_KEY': 1, 'OAUTH_KEY': 1, 'DEBUG': 1})
+
+    @mock.patch.object(PrivateConfigFile, '_decrypt_content',
+                       autospec=True, side_effect=PrivateConfigFile.
+                       _decrypt_content)
+    def test_lazy_load(self, decrypt_content):
+        eager = self.ordbok()
+        eager.load()
+        self.assertEqual(decrypt_content.call_count, 1)
+
+        ordbok = self.ordbok(lazy=True)
+        ordbok.load()
+        self.assertEqual(decrypt_content.call_count, 1)
+        self.assertIn('SECRET_KEY', ordbok)
+        self.assertEqual(len(ordbok), len(eager))
+        # later files still take precedence
+        self.assertEqual(ordbok['DEBUG'], False)
+        self.assertEqual(decrypt_content.call_count, 1)
+
+        self.assertEqual(ordbok['SECRET_KEY'], 'keep out!')
+        self.assertEqual(decrypt_content.call_count, 2)
+        self.assertEqual(ordbok.get('OAUTH_KEY'), 'super_secret_key')
+        self.assertEqual(decrypt_content.call_count, 2)
+        self.assertIs(type(ordbok), Ordbok)
+        self.assertEqual(ordbok, eager)
+
+    def test_materialize(self):
+        ordbok = self.ordbok(lazy=True)
+        ordbok.load()
+        self.assertIsNot(type(ordbok), Ordbok)
+        self.assertIs(ordbok.materialize(), ordbok)
+        self.assertIs(type(ordbok), Ordbok)
+        self.assertEqual(dict.get(ordbok, 'SECRET_KEY'), 'keep out!')
+
+    def test_whole_dict_operations_materialize(self):
+        ordbok = self.ordbok(lazy=True)
+        ordbok.load()
+        self.assertEqual(dict(ordbok)['OAUTH_KEY'], 'super_secret_key')
+        self.assertIs(type(ordbok), Ordbok)
+
+        ordbok = self.ordbok(lazy=True)
+        ordbok.load()
+        self.assertEqual(pickle.loads(pickle.dumps(ordbok))['SECRET_KEY'],
+                         'keep out!')
+
+    def test_set_deferred_key(self):
+        ordbok = self.ordbok(lazy=True)
+        ordbok.load()
+        ordbok['SECRET_KEY'] = 'overridden'
+        ordbok['OAUTH_KEY'] = 'overridden'
+        self.assertIs(type(ordbok), Ordbok)
+        self.assertEqual(ordbok['SECRET_KEY'], 'overridden')
+
+    def test_required_keys(self):
+        self.write_private_config_file(u"""
+DEVELOPMENT:
+  SECRET_KEY: 'keep out!'
+  OAUTH_KEY: null
+""")
+        with self.assertRaises(OrdbokMissingKeyException):
+            self.ordbok(lazy=True).load()
+
+    def test_missing_private_key(self):
+        with mock.patch.dict('os.environ', clear=True):
+            with self.assertRaises(OrdbokMissingPrivateKeyException):
+                self.ordbok(lazy=True).load()
+
+    def test_no_index(self):
+        self.write_private_config_file(u"""
+DEVELOPMENT:
+  SECRET_KEY: 'keep out!'
+  OAUTH_KEY: 'super_secret_key'
+""", index=False)
+        ordbok = self.ordbok(lazy=True)
+        ordbok.load()
+        self.assertIs(type(ordbok), Ordbok)
+        self.assertEqual(dict.get(ordbok, 'SECRET_KEY'), 'keep out!')
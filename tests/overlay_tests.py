@@ -0,0 +1,85 @@
+import unittest
+
+from ordbok import Ordbok
+from ordbok.overlay import ConfigOverlay, merge_value
+
+from tests.files import ConfigDirTestCase
+
+
+class MergeValueTestCase(unittest.TestCase):
+    def test_merge_value(self):
+        base = {'default': {'HOST': 'db', 'PORT': 5432},
+                'replica': {'HOST': 'replica'}}
+        merged = merge_value(base, {'default': {'PORT': 6543}})
+        self.assertEqual(merged['default'], {'HOST': 'db', 'PORT': 6543})
+        self.assertIs(merged['replica'], base['replica'])
+        self.assertEqual(base['default']['PORT'], 5432)
+        self.assertEqual(merge_value(base, 'sqlite://'), 'sqlite://')
+
+
+class ConfigOverlayTestCase(ConfigDirTestCase):
+    def setUp(self):
+        super(ConfigOverlayTestCase, self).setUp()
+        self.write_config_file(u'config.yml', u"""
+DEVELOPMENT:
+  DEBUG: False
+  DATABASES:
+    default: {HOST: db, PORT: 5432}
+    replica: {HOST: replica}
+""")
+        self.ordbok = Ordbok(config_dir=self.tmp_dir, include_env=False)
+        self.ordbok.load()
+
+    def test_overlay(self):
+        overlay = self.ordbok.overlay({
+            'DEBUG': True, 'DATABASES': {'default': {'PORT': 6543}}})
+        self.assertIsInstance(overlay, ConfigOverlay)
+        self.assertEqual(overlay['DEBUG'], True)
+        self.assertEqual(overlay['DATABASES']['default'],
+                         {'HOST': 'db', 'PORT': 6543})
+        self.assertIs(overlay['DATABASES']['replica'],
+                      self.ordbok['DATABASES']['replica'])
+        self.assertEqual(overlay['ENVIRONMENT'], 'development')
+        self.assertEqual(self.ordbok['DEBUG'], False)
+        self.assertEqual(sorted(overlay),
+                         ['DATABASES', 'DEBUG', 'ENVIRONMENT'])
+        self.assertEqual(overlay.overrides['DEBUG'], True)
+
+    def test_layers(self):
+        tenant = self.ordbok.overlay({'DEBUG': True})
+        user = tenant.overlay({'DATABASES': {'replica': {'PORT': 1}}})
+        self.assertEqual(user['DEBUG'], True)
+        self.assertEqual(user['DATABASES']['replica'],
+                         {'HOST': 'replica', 'PORT': 1})
+        tenant['DEBUG'] = 'tenant'
+        self.assertEqual(user['DEBUG'], 'tenant')
+        del tenant['DEBUG']
+        self.assertNotIn('DEBUG', tenant)
+        self.assertNotIn('DEBUG', user)
+        with self.assertRaises(KeyError):
+            user['DEBUG']
+        self.assertEqual(len(user), 2)
+        user['DEBUG'] = 'user'
+        self.assertEqual(dict(user)['DEBUG'], 'user')
+
+    def test_cached_view(self):
+        overlay = self.ordbok.overlay({'DEBUG': True})
+        view = overlay._view()
+        self.assertIs(overlay._view(), view)
+        overlay['NEW'] = 1
+        self.assertIsNot(overlay._view(), view)
+        self.assertEqual(overlay.copy()['NEW'], 1)
+
+    def test_follows_reload(self):
+        overlay = self.ordbok.overlay({'DATABASES': {'default': {'PORT': 1}}})
+        self.assertEqual(overlay['DATABASES']['default']['HOST'], 'db')
+        self.write_config_file(u'config.yml', u"""
+DEVELOPMENT:
+  DEBUG: True
+  DATABASES:
+    default: {HOST: other, PORT: 5432}
+""")
+        self.ordbok.reload()
+        self.assertEqual(overlay['DEBUG'], True)
+        self.assertEqual(overlay['DATABASES'], {
+            'default': {'HOST': 'other', 'PORT': 1}})
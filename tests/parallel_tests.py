@@ -0,0 +1,108 @@
+import os
+import unittest
+import mock
+import fudge
+from copy import deepcopy
+
+from ordbok import Ordbok, ConfigFile, PrivateConfigFile
+from ordbok.crypto import FORMAT_ORDBOK, KDF_PBKDF2
+from ordbok.exceptions import OrdbokMissingKeyException
+
+from tests.files import (
+    fudged_config_files, fake_file_factory, ConfigDirTestCase)
+
+
+class OrdbokParallelTestCase(unittest.TestCase):
+    @fudge.patch('six.moves.builtins.open')
+    def test_parallel_load(self, fudged_open):
+        fudged_open.is_callable().calls(fake_file_factory(fudged_config_files))
+        ordbok = Ordbok()
+        ordbok.load()
+        parallel_ordbok = Ordbok(parallel='thread')
+        parallel_ordbok.load()
+        self.assertEqual(dict(ordbok), dict(parallel_ordbok))
+
+    @fudge.patch('six.moves.builtins.open')
+    def test_parallel_load_uses_prefetched(self, fudged_open):
+        fudged_open.is_callable().calls(fake_file_factory(fudged_config_files))
+        ordbok = Ordbok(parallel='thread')
+        with mock.patch.object(ConfigFile, '_load_content',
+                               wraps=lambda: {}) as mock_load_content:
+            ordbok.load()
+        self.assertEqual(mock_load_content.call_count, 2)
+
+    @fudge.patch('six.moves.builtins.open')
+    def test_parallel_missing_key(self, fudged_open):
+        fudged_config_files_copy = deepcopy(fudged_config_files)
+        fudged_config_files_copy.update({
+            u'config.yml': u"""
+            FOO: 'ordbok_local_config'
+            """})
+        fudged_open.is_callable().calls(
+            fake_file_factory(fudged_config_files_copy))
+        with self.assertRaises(OrdbokMissingKeyException):
+            Ordbok(parallel='thread').load()
+
+    def test_parallel_invalid(self):
+        with self.assertRaises(ValueError):
+            Ordbok(parallel='fork', config_files=['config.yml']).load()
+
+    def test_stale_prefetch_ignored(self):
+        ordbok = Ordbok()
+        ordbok['ENVIRONMENT'] = 'development'
+        config_file = ConfigFile('config.yml')
+        config_file.init_config(ordbok)
+        config_file._prefetched = ('production', None, {'FOO': 'bar'})
+        with mock.patch.object(ConfigFile, '_load_content',
+                               return_value={'FOO': 'baz'}):
+            self.assertEqual(config_file._load_prefetched(), {'FOO': 'baz'})
+        config_file._prefetched = ('development', None, {'FOO': 'bar'})
+        self.assertEqual(config_file._load_prefetched(), {'FOO': 'bar'})
+
+    def test_prefetch_skipped_environment(self):
+        ordbok = Ordbok()
+        ordbok['ENVIRONMENT'] = 'development'
+        private_config_file = PrivateConfigFile(
+            'private_config.yml', envs=['production'])
+        private_config_file.init_config(ordbok)
+        self.assertIsNone(private_config_file.prefetch())
+
+
+class OrdbokParallelFilesTestCase(ConfigDirTestCase):
+    def setUp(self):
+        super(OrdbokParallelFilesTestCase, self).setUp()
+        for filename, content in fudged_config_files.items():
+            self.write_config_file(filename, content)
+
+    def test_process_load(self):
+        ordbok = Ordbok(config_dir=self.tmp_dir, include_env=False)
+        ordbok.load()
+        parallel_ordbok = Ordbok(config_dir=self.tmp_dir, include_env=False,
+                                 parallel='process', max_workers=2)
+        parallel_ordbok.load()
+        self.assertEqual(dict(ordbok), dict(parallel_ordbok))
+
+    @mock.patch.dict('os.environ', {u'PRIVATE_KEY_ORDBOK': u'wrong'})
+    def test_private_key_from_earlier_file(self):
+        self.write_config_file(u'private_config.yml', u"""
+OAUTH_KEY: 'super_secret_key'
+""")
+        self.write_config_file(u'local_config.yml', u"""
+SQLALCHEMY_DATABASE_URL: 'sqlite:///tmp/database.db'
+TEST_BOOLEAN_VAR: False
+PRIVATE_KEY_ORDBOK: 'foobarbaz'
+""")
+        private_config_file = PrivateConfigFile(
+            'private_config.yml', file_format=FORMAT_ORDBOK, kdf=KDF_PBKDF2,
+            kdf_params={'iterations': 1000})
+        ordbok = Ordbok(
+            config_dir=self.tmp_dir, include_env=False, parallel='thread',
+            config_files=['config.yml', 'local_config.yml',
+                          private_config_file])
+        ordbok['PRIVATE_KEY_ORDBOK'] = 'foobarbaz'
+        private_config_file.init_config(ordbok)
+        private_config_file._save_encrypted_file()
+        del ordbok['PRIVATE_KEY_ORDBOK']
+
+        ordbok.load()
+        self.assertEqual(ordbok['OAUTH_KEY'], 'super_secret_key')
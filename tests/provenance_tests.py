@@ -0,0 +1,125 @@
+import os
+import unittest
+import mock
+
+from ordbok import Ordbok, ConfigFile
+from ordbok.cli import main
+from ordbok.provenance import Provenance, value_at
+
+from tests.files import ConfigDirTestCase
+
+
+class ProvenanceTestCase(unittest.TestCase):
+    def test_setters(self):
+        provenance = Provenance()
+        provenance.set('FOO', 'ordbok_config', 1)
+        provenance.set('BAR', 'ordbok_config', 2)
+        provenance.set('FOO', 'ordbok_local_config', 3)
+        self.assertEqual(provenance.setters('FOO'), [
+            ('ordbok_config', 1), ('ordbok_local_config', 3)])
+        self.assertEqual(provenance.setters('BAZ'), [])
+        self.assertIn('BAR', provenance)
+        self.assertEqual(len(provenance), 2)
+
+    def test_update(self):
+        provenance = Provenance()
+        for i in range(10):
+            provenance.set('KEY_{}'.format(i), 'ordbok_config', i)
+        order = {'ordbok_config': 0, 'ordbok_local_config': 1}
+        setters = provenance.replace(
+            ['KEY_0', 'KEY_1', 'NEW'],
+            {'ordbok_local_config': {'KEY_0': 'a', 'NEW': 'b'}}, order)
+        self.assertEqual(setters['KEY_0'], [
+            ('ordbok_config', 0), ('ordbok_local_config', 'a')])
+        self.assertEqual(value_at(setters['KEY_0'], 0, order), 0)
+        provenance.update(setters)
+        self.assertEqual(provenance.setters('NEW'),
+                         [('ordbok_local_config', 'b')])
+
+        provenance.update(dict(('KEY_{}'.format(i), []) for i in range(10)))
+        # dropped values are compacted away
+        self.assertEqual(len(provenance._values), 1)
+        self.assertNotIn('KEY_0', provenance)
+        self.assertEqual(provenance.setters('NEW'),
+                         [('ordbok_local_config', 'b')])
+
+
+class OrdbokExplainTestCase(ConfigDirTestCase):
+    def setUp(self):
+        super(OrdbokExplainTestCase, self).setUp()
+        self.write_config_file(u'config.yml', u"""
+DEVELOPMENT:
+  DEBUG: True
+  SQLALCHEMY_DATABASE_URL: 'ordbok_local_config'
+  SECRET_KEY: 'ordbok_env_config'
+""")
+        self.write_config_file(u'local_config.yml', u"""
+DEBUG: False
+SQLALCHEMY_DATABASE_URL: 'sqlite:///tmp/database.db'
+""")
+        self.environ = mock.patch.dict('os.environ', {
+            u'ORDBOK_SECRET_KEY': u'keep out!', u'ORDBOK_DEBUG': u'true'})
+        self.environ.start()
+
+    def tearDown(self):
+        self.environ.stop()
+
+    def test_explain(self):
+        ordbok = Ordbok(config_dir=self.tmp_dir, provenance=True)
+        ordbok.load()
+        with mock.patch.object(ConfigFile, '_load_yaml',
+                               autospec=True,
+                               side_effect=ConfigFile._load_yaml) as ly:
+            explanation = ordbok.explain('DEBUG')
+            ordbok.explain('DEBUG')
+        # each file's environment section is only looked up once
+        self.assertEqual(ly.call_count, 2)
+        self.assertEqual(explanation.value, True)
+        self.assertEqual(
+            [tuple(origin) for origin in explanation.origins],
+            [('config.yml', 'DEVELOPMENT', True),
+             ('local_config.yml', None, False),
+             ('ordbok_env_config', 'ORDBOK_DEBUG', True)])
+
+        explanation = ordbok.explain('SECRET_KEY')
+        self.assertEqual(explanation.required,
+                         [('ordbok_env_config', 'config.yml')])
+        self.assertIn('required in ordbok_env_config by config.yml',
+                      str(explanation))
+
+        explanation = ordbok.explain('ENVIRONMENT')
+        self.assertEqual(explanation.origins[0].source, 'defaults')
+        self.assertEqual(ordbok.explain('MISSING').origins, [])
+
+    def test_explain_after_reload(self):
+        ordbok = Ordbok(config_dir=self.tmp_dir, provenance=True)
+        ordbok.load()
+        self.write_config_file(u'local_config.yml', u"""
+SQLALCHEMY_DATABASE_URL: 'sqlite:///tmp/database.db'
+""")
+        ordbok.reload()
+        self.assertEqual(
+            [origin.source for origin in ordbok.explain('DEBUG').origins],
+            ['config.yml', 'ordbok_env_config'])
+
+    def test_explain_without_provenance(self):
+        ordbok = Ordbok(config_dir=self.tmp_dir)
+        ordbok.load()
+        with self.assertRaises(Exception):
+            ordbok.explain('DEBUG')
+
+    @mock.patch('sys.stdout')
+    def test_cli_explain(self, mock_stdout):
+        argv = ['ordbok', 'explain', 'SQLALCHEMY_DATABASE_URL',
+                '--config-dir', self.tmp_dir, '--environment', 'development']
+        with mock.patch('sys.argv', argv):
+            main()
+        output = ''.join(
+            call[0][0] for call in mock_stdout.write.call_args_list)
+        self.assertIn("set by: local_config.yml: 'sqlite:///tmp/database.db'",
+                      output)
+
+        argv = ['ordbok', 'explain', 'MISSING', '--config-dir', self.tmp_dir]
+        with mock.patch('sys.argv', argv):
+            with self.assertRaises(SystemExit):
+                main()
@@ -0,0 +1,244 @@
+import os
+import time
+import pickle
+import threading
+import unittest
+import mock
+
+from ordbok import Ordbok, ConfigFile, PrivateConfigFile
+from ordbok.crypto import FORMAT_ORDBOK, KDF_PBKDF2
+from ordbok.reload import ConfigDiff, InotifyWatcher
+from ordbok.exceptions import (
+    OrdbokLowercaseKeyException, OrdbokMissingKeyException)
+
+from tests.files import ConfigDirTestCase
+
+
+class OrdbokReloadTestCase(ConfigDirTestCase):
+    def setUp(self):
+        super(OrdbokReloadTestCase, self).setUp()
+        self.write_config_file(u'config.yml', u"""
+DEVELOPMENT:
+  COMMON_BOOLEAN: true
+  COMMON_INT: 1
+  SQLALCHEMY_DATABASE_URL: 'ordbok_local_config'
+""")
+        self.write_config_file(u'local_config.yml', u"""
+SQLALCHEMY_DATABASE_URL: 'sqlite:///tmp/database.db'
+""")
+        self.ordbok = Ordbok(config_dir=self.tmp_dir, include_env=False,
+                             provenance=True)
+        self.ordbok.load()
+
+    def test_reload_unchanged(self):
+        with mock.patch.object(ConfigFile, '_load_content') as load_content:
+            diff = self.ordbok.reload()
+        self.assertFalse(diff)
+        self.assertFalse(load_content.called)
+        self.assertEqual(self.ordbok.generation, 1)
+
+    def test_reload_changed(self):
+        self.write_config_file(u'local_config.yml', u"""
+SQLALCHEMY_DATABASE_URL: 'postgresql://localhost/db'
+NEW_KEY: 'new'
+""")
+        with mock.patch.object(ConfigFile, '_load_content',
+                               autospec=True,
+                               side_effect=ConfigFile._load_content) as lc:
+            diff = self.ordbok.reload()
+        self.assertEqual([call[0][0].filename for call in lc.call_args_list],
+                         ['local_config.yml'])
+        self.assertEqual(diff, ConfigDiff(
+            added={'NEW_KEY'}, removed=set(),
+            changed={'SQLALCHEMY_DATABASE_URL'}))
+        self.assertEqual(self.ordbok['SQLALCHEMY_DATABASE_URL'],
+                         'postgresql://localhost/db')
+        self.assertEqual(self.ordbok['NEW_KEY'], 'new')
+        self.assertEqual(self.ordbok.generation, 2)
+
+    def test_reload_removed(self):
+        self.write_config_file(u'config.yml', u"""
+DEVELOPMENT:
+  COMMON_BOOLEAN: true
+  SQLALCHEMY_DATABASE_URL: 'ordbok_local_config'
+""")
+        diff = self.ordbok.reload()
+        self.assertEqual(diff.removed, {'COMMON_INT'})
+        self.assertNotIn('COMMON_INT', self.ordbok)
+        self.assertEqual(self.ordbok['ENVIRONMENT'], 'development')
+
+    def test_reload_invalid_keeps_config(self):
+        before = dict(self.ordbok)
+        self.write_config_file(u'local_config.yml', u"""
+sqlalchemy_database_url: 'postgresql://localhost/db'
+""")
+        with self.assertRaises(OrdbokLowercaseKeyException):
+            self.ordbok.reload()
+        self.assertEqual(dict(self.ordbok), before)
+        self.assertEqual(self.ordbok.generation, 1)
+
+        self.write_config_file(u'local_config.yml', u"""
+SQLALCHEMY_DATABASE_URL: 'postgresql://localhost/db'
+""")
+        self.assertTrue(self.ordbok.reload())
+
+    def test_reload_not_loaded(self):
+        with self.assertRaises(Exception):
+            Ordbok(config_dir=self.tmp_dir).reload()
+
+    def test_reload_incremental(self):
+        self.write_config_file(u'local_config.yml', u"""
+SQLALCHEMY_DATABASE_URL: 'postgresql://localhost/db'
+COMMON_INT: 2
+""")
+        with mock.patch.object(Ordbok, '_reload_all') as reload_all:
+            diff = self.ordbok.reload()
+        self.assertFalse(reload_all.called)
+        self.assertEqual(diff.changed, {'SQLALCHEMY_DATABASE_URL',
+                                        'COMMON_INT'})
+        self.assertEqual(self.ordbok['COMMON_INT'], 2)
+
+        # the earlier file's value applies again once a later file drops it
+        self.write_config_file(u'local_config.yml', u"""
+SQLALCHEMY_DATABASE_URL: 'postgresql://localhost/db'
+""")
+        with mock.patch.object(Ordbok, '_reload_all') as reload_all:
+            diff = self.ordbok.reload()
+        self.assertFalse(reload_all.called)
+        self.assertEqual(diff.changed, {'COMMON_INT'})
+        self.assertEqual(self.ordbok['COMMON_INT'], 1)
+
+    def test_sources_kept_for_reloads(self):
+        ordbok = Ordbok(config_dir=self.tmp_dir, include_env=False)
+        ordbok.load()
+        self.assertEqual([f._source for f in ordbok.config_files],
+                         [None, None])
+        ordbok.subscribe(mock.Mock())
+        ordbok.reload()
+        with mock.patch.object(ConfigFile, '_load_content') as load_content:
+            self.assertFalse(ordbok.reload())
+        self.assertFalse(load_content.called)
+
+    def test_reload_incremental_required_key(self):
+        before = dict(self.ordbok)
+        self.write_config_file(u'local_config.yml', u"""
+SQLALCHEMY_DATABASE_URL: null
+""")
+        with self.assertRaises(OrdbokMissingKeyException):
+            self.ordbok.reload()
+        self.assertEqual(dict(self.ordbok), before)
+
+    def test_reload_references_changed(self):
+        self.write_config_file(u'config.yml', u"""
+DEVELOPMENT:
+  COMMON_BOOLEAN: true
+  COMMON_INT: 'ordbok_local_config'
+  SQLALCHEMY_DATABASE_URL: 'ordbok_local_config'
+""")
+        with self.assertRaises(OrdbokMissingKeyException):
+            self.ordbok.reload()
+        self.write_config_file(u'local_config.yml', u"""
+SQLALCHEMY_DATABASE_URL: 'sqlite:///tmp/database.db'
+COMMON_INT: 3
+""")
+        self.assertEqual(self.ordbok.reload().changed, {'COMMON_INT'})
+        self.assertEqual(self.ordbok['COMMON_INT'], 3)
+
+    @mock.patch.dict('os.environ', {u'PRIVATE_KEY_ORDBOK': u'foobarbaz'})
+    def test_reload_skips_private_files(self):
+        self.write_config_file(u'private_config.yml', u"""
+SECRET_KEY: 'keep out!'
+""")
+        private_config_file = PrivateConfigFile(
+            'private_config.yml', file_format=FORMAT_ORDBOK, kdf=KDF_PBKDF2,
+            kdf_params={'iterations': 1000})
+        ordbok = Ordbok(
+            config_dir=self.tmp_dir, include_env=False, provenance=True,
+            config_files=['config.yml', private_config_file,
+                          'local_config.yml'])
+        private_config_file.init_config(ordbok)
+        private_config_file._save_encrypted_file()
+        ordbok.load()
+
+        self.write_config_file(u'local_config.yml', u"""
+SQLALCHEMY_DATABASE_URL: 'postgresql://localhost/db'
+""")
+        with mock.patch.object(PrivateConfigFile, '_decrypt_content') as dc:
+            self.assertTrue(ordbok.reload())
+        self.assertFalse(dc.called)
+        self.assertEqual(ordbok['SECRET_KEY'], 'keep out!')
+
+    def test_subscribers(self):
+        calls = []
+        callback = self.ordbok.subscribe(
+            lambda ordbok, diff: calls.append((ordbok, diff)))
+        self.ordbok.reload()
+        self.assertEqual(calls, [])
+
+        self.write_config_file(u'config.yml', u"""
+DEVELOPMENT:
+  COMMON_BOOLEAN: false
+  COMMON_INT: 1
+  SQLALCHEMY_DATABASE_URL: 'ordbok_local_config'
+""")
+        self.ordbok.reload()
+        self.assertEqual(len(calls), 1)
+        self.assertIs(calls[0][0], self.ordbok)
+        self.assertEqual(calls[0][1].changed, {'COMMON_BOOLEAN'})
+
+        self.ordbok.unsubscribe(callback)
+        self.write_config_file(u'config.yml', u"""
+DEVELOPMENT:
+  COMMON_BOOLEAN: true
+  COMMON_INT: 1
+  SQLALCHEMY_DATABASE_URL: 'ordbok_local_config'
+""")
+        self.ordbok.reload()
+        self.assertEqual(len(calls), 1)
+
+    def test_pickle(self):
+        self.ordbok.subscribe(lambda ordbok, diff: None)
+        ordbok = pickle.loads(pickle.dumps(self.ordbok))
+        self.assertEqual(dict(ordbok), dict(self.ordbok))
+        self.assertEqual(ordbok._subscribers, [])
+
+    def wait_for_reload(self, use_inotify):
+        reloaded = threading.Event()
+        self.ordbok.subscribe(lambda ordbok, diff: reloaded.set())
+        watcher = self.ordbok.watch(interval=0.05, use_inotify=use_inotify)
+        try:
+            time.sleep(0.1)
+            self.write_config_file(u'local_config.yml', u"""
+SQLALCHEMY_DATABASE_URL: 'postgresql://localhost/db'
+""")
+            self.assertTrue(reloaded.wait(5))
+        finally:
+            watcher.stop()
+        self.assertFalse(watcher.is_alive())
+        self.assertEqual(self.ordbok._watchers, [])
+        self.assertEqual(self.ordbok['SQLALCHEMY_DATABASE_URL'],
+                         'postgresql://localhost/db')
+        return watcher
+
+    def test_watch_polling(self):
+        self.wait_for_reload(use_inotify=False)
+
+    def test_watch_inotify(self):
+        try:
+            InotifyWatcher([]).close()
+        except (OSError, AttributeError):
+            raise unittest.SkipTest('inotify not available')
+        watcher = self.wait_for_reload(use_inotify=True)
+        self.assertIsInstance(watcher.watcher, InotifyWatcher)
+
+
+class ConfigDiffTestCase(unittest.TestCase):
+    def test_compare(self):
+        diff = ConfigDiff.compare({'A': 1, 'B': 2, 'C': 3},
+                                  {'A': 1, 'B': 4, 'D': 5})
+        self.assertEqual(diff.added, {'D'})
+        self.assertEqual(diff.removed, {'C'})
+        self.assertEqual(diff.changed, {'B'})
+        self.assertEqual(diff.keys, {'B', 'C', 'D'})
+        self.assertTrue(diff)
+        self.assertFalse(ConfigDiff.compare({'A': 1}, {'A': 1}))
@@ -0,0 +1,126 @@
+import os
+import unittest
+import mock
+
+from ordbok import Ordbok
+from ordbok.schema import Schema, Field, coerce_bool, coerce_list
+from ordbok.exceptions import (
+    OrdbokSchemaException, OrdbokMissingKeyException,
+    OrdbokInvalidValueException, OrdbokRequiredValueException)
+
+from tests.files import ConfigDirTestCase
+
+
+class SchemaTestCase(unittest.TestCase):
+    def test_coercers(self):
+        self.assertIs(coerce_bool('Yes'), True)
+        self.assertIs(coerce_bool('0'), False)
+        with self.assertRaises(ValueError):
+            coerce_bool('maybe')
+        self.assertEqual(coerce_list('a, b,,c'), ['a', 'b', 'c'])
+
+    def test_coerce(self):
+        schema = Schema({
+            'PORT': int,
+            'DEBUG': Field(bool, default=False),
+            'HOSTS': list,
+            'TIMEOUT': Field(float, required=True),
+            'SECRET_KEY': Field(str, required=True),
+        })
+        errors = []
+        coerced = schema.coerce({'PORT': '8080', 'HOSTS': 'a,b',
+                                 'TIMEOUT': 'soon'}, errors)
+        self.assertEqual(coerced, {'PORT': 8080, 'DEBUG': False,
+                                   'HOSTS': ['a', 'b']})
+        self.assertEqual(
+            [(type(e), e.key) for e in errors],
+            [(OrdbokRequiredValueException, 'SECRET_KEY'),
+             (OrdbokInvalidValueException, 'TIMEOUT')])
+
+
+class OrdbokSchemaTestCase(ConfigDirTestCase):
+    def setUp(self):
+        super(OrdbokSchemaTestCase, self).setUp()
+        self.write_config_file(u'config.yml', u"""
+DEVELOPMENT:
+  PORT: 'ordbok_env_config_port'
+  WORKERS: '4'
+  DEBUG: 'ordbok_env_config'
+""")
+        self.write_config_file(u'local_config.yml', u"""
+HOSTS: 'a, b'
+""")
+        self.environ = mock.patch.dict('os.environ', {
+            u'PORT': u'8080', u'ORDBOK_DEBUG': u'yes'})
+        self.environ.start()
+        self.schema = {
+            'PORT': int,
+            'WORKERS': Field(int, required=True),
+            'DEBUG': bool,
+            'HOSTS': list,
+            'TIMEOUT': Field(float, default=1.5),
+        }
+
+    def tearDown(self):
+        self.environ.stop()
+
+    def test_typed_values(self):
+        ordbok = Ordbok(config_dir=self.tmp_dir, schema=self.schema)
+        ordbok.load()
+        self.assertEqual(ordbok['PORT'], 8080)
+        self.assertEqual(ordbok['WORKERS'], 4)
+        self.assertIs(ordbok['DEBUG'], True)
+        self.assertEqual(ordbok['HOSTS'], ['a', 'b'])
+        self.assertEqual(ordbok['TIMEOUT'], 1.5)
+
+    def test_errors_are_batched(self):
+        self.write_config_file(u'config.yml', u"""
+DEVELOPMENT:
+  PORT: 'ordbok_env_config_missing_port'
+  WORKERS: 'many'
+  DEBUG: 'ordbok_local_config'
+""")
+        ordbok = Ordbok(config_dir=self.tmp_dir, schema=self.schema)
+        with self.assertRaises(OrdbokSchemaException) as cm:
+            ordbok.load()
+        errors = cm.exception.errors
+        self.assertEqual(len(errors), 3)
+        self.assertIsInstance(errors[0], OrdbokMissingKeyException)
+        self.assertEqual(errors[0].key, 'DEBUG')
+        self.assertIn('WORKERS config key must be a valid int',
+                      repr(cm.exception))
+        self.assertIn('DEBUG config key should be specified in',
+                      repr(cm.exception))
+
+    def test_without_schema(self):
+        ordbok = Ordbok(config_dir=self.tmp_dir)
+        ordbok.load()
+        self.assertEqual(ordbok['PORT'], '8080')
+        self.write_config_file(u'config.yml', u"""
+DEBUG: 'ordbok_local_config'
+""")
+        with self.assertRaises(OrdbokMissingKeyException):
+            Ordbok(config_dir=self.tmp_dir).load()
+
+    def test_reload(self):
+        ordbok = Ordbok(config_dir=self.tmp_dir, schema=self.schema)
+        ordbok.load()
+        self.write_config_file(u'local_config.yml', u"""
+HOSTS: 'a, b, c'
+""")
+        diff = ordbok.reload()
+        self.assertEqual(diff.changed, set(['HOSTS']))
+        self.assertEqual(ordbok['HOSTS'], ['a', 'b', 'c'])
+        self.assertEqual(ordbok['WORKERS'], 4)
+
+        self.write_config_file(u'local_config.yml', u"""
+WORKERS: 'none'
+""")
+        with self.assertRaises(OrdbokSchemaException):
+            ordbok.reload()
+        self.assertEqual(ordbok['WORKERS'], 4)
+
+    def test_compile(self):
+        ordbok = Ordbok(config_dir=self.tmp_dir, schema=self.schema)
+        compiled = ordbok.compile_environments(['development'])
+        self.assertEqual(compiled['development']['PORT'], 8080)
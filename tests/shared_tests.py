@@ -0,0 +1,199 @@
+import os
+import datetime
+import mock
+from flask import Flask
+
+from ordbok import Ordbok, ConfigFile
+from ordbok.flask_helper import FlaskOrdbok
+from ordbok.shared import SharedConfig, publish
+from ordbok.schema import Field
+from ordbok.exceptions import (
+    OrdbokSharedConfigException, OrdbokSchemaException)
+
+from tests.files import ConfigDirTestCase
+
+
+class SharedConfigTestCase(ConfigDirTestCase):
+    def setUp(self):
+        super(SharedConfigTestCase, self).setUp()
+        self.path = os.path.join(self.tmp_dir, 'ordbok.shm')
+
+    def test_publish_attach(self):
+        config = {
+            'ENVIRONMENT': 'production',
+            'DATABASES': {'default': {'PORT': 5432}},
+            'HOSTS': ['a', 'b'],
+            'RELEASED': datetime.date(2015, 1, 1),
+        }
+        publish(config, self.path, generation=3)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+        shared_config = SharedConfig(self.path)
+        self.assertEqual(shared_config.generation, 3)
+        self.assertEqual(sorted(shared_config), sorted(config))
+        self.assertEqual(shared_config._values, {})
+        self.assertEqual(shared_config['HOSTS'], ['a', 'b'])
+        self.assertEqual(list(shared_config._values), ['HOSTS'])
+        self.assertEqual(dict(shared_config), config)
+
+    def test_attach_invalid(self):
+        with self.assertRaises(OrdbokSharedConfigException):
+            SharedConfig(self.path)
+        with open(self.path, 'wb') as f:
+            f.write(b'not a shared config segment')
+        with self.assertRaises(OrdbokSharedConfigException):
+            SharedConfig(self.path)
+
+
+class OrdbokSharedTestCase(ConfigDirTestCase):
+    def setUp(self):
+        super(OrdbokSharedTestCase, self).setUp()
+        self.write_config_file(u'config.yml', u"""
+DEVELOPMENT:
+  SECRET_KEY: 'keep out!'
+""")
+        self.environ = mock.patch.dict('os.environ')
+        self.environ.start()
+        self.shared_path = os.path.join(self.tmp_dir, 'ordbok.shm')
+
+    def tearDown(self):
+        self.environ.stop()
+
+    def test_load_shared(self):
+        master = Ordbok(config_dir=self.tmp_dir, include_env=False)
+        master.load()
+        self.assertEqual(master.share(self.shared_path), self.shared_path)
+        self.assertEqual(os.environ['ORDBOK_SHARED_CONFIG'], self.shared_path)
+
+        worker = Ordbok(config_dir=self.tmp_dir, include_env=False,
+                        shared=True)
+        with mock.patch.object(ConfigFile, '_load_content') as load_content:
+            worker.load()
+        self.assertFalse(load_content.called)
+        self.assertEqual(dict(worker), dict(master))
+        self.assertEqual(worker.shared_config.path, self.shared_path)
+
+    def test_attach_with_other_options(self):
+        self.write_config_file(u'local_config.yml', u"""
+SECRET_KEY: 'let me in'
+""")
+        master = Ordbok(config_dir=self.tmp_dir, include_env=False,
+                        config_files=['config.yml'])
+        master.load()
+        master.share(self.shared_path)
+        worker = Ordbok(config_dir=self.tmp_dir, include_env=False,
+                        shared=True)
+        worker.load()
+        self.assertIsNone(worker.shared_config)
+        self.assertEqual(worker['SECRET_KEY'], 'let me in')
+        os.remove(worker.shared_path)
+
+    def test_attach_with_schema(self):
+        self.write_config_file(u'config.yml', u"""
+DEVELOPMENT:
+  SECRET_KEY: 'keep out!'
+  PORT: 8080
+""")
+        master = Ordbok(config_dir=self.tmp_dir, include_env=False)
+        master.load()
+        master.share(self.shared_path)
+        worker = Ordbok(config_dir=self.tmp_dir, include_env=False,
+                        shared=True, schema={
+                            'PORT': str,
+                            'WORKERS': Field(int, default=4)})
+        worker.load()
+        self.assertIsNotNone(worker.shared_config)
+        self.assertEqual(worker['PORT'], '8080')
+        self.assertEqual(worker['WORKERS'], 4)
+
+        worker = Ordbok(config_dir=self.tmp_dir, include_env=False,
+                        shared=True, schema={
+                            'WORKERS': Field(int, required=True)})
+        with self.assertRaises(OrdbokSchemaException):
+            worker.load()
+
+    def test_attach_is_lazy(self):
+        self.write_config_file(u'config.yml', u"""
+DEVELOPMENT:
+  SECRET_KEY: 'keep out!'
+  HOSTS: ['a', 'b']
+  DEBUG: null
+""")
+        master = Ordbok(config_dir=self.tmp_dir, include_env=False)
+        master.load()
+        master.share(self.shared_path)
+        worker = Ordbok(config_dir=self.tmp_dir, include_env=False,
+                        shared=True)
+        worker.load()
+        self.assertEqual(worker.shared_config._values, {})
+        self.assertEqual(dict.__len__(worker), 0)
+        self.assertIn('HOSTS', worker)
+        self.assertEqual(len(worker), len(master))
+        self.assertEqual(worker['HOSTS'], ['a', 'b'])
+        self.assertEqual(list(worker.shared_config._values), ['HOSTS'])
+        self.assertTrue(worker._has_value('SECRET_KEY'))
+        self.assertFalse(worker._has_value('DEBUG'))
+
+        self.write_config_file(u'config.yml', u"""
+DEVELOPMENT:
+  SECRET_KEY: 'let me in'
+  HOSTS: ['a', 'b']
+""")
+        master.reload()
+        diff = worker.reload()
+        self.assertEqual(diff.changed, set(['SECRET_KEY']))
+        self.assertEqual(diff.removed, set(['DEBUG']))
+        self.assertEqual(worker.shared_config._values, {})
+        self.assertEqual(worker['HOSTS'], ['a', 'b'])
+        self.assertEqual(worker['SECRET_KEY'], 'let me in')
+        self.assertEqual(dict(worker), dict(master))
+
+    def test_load_shared_publishes(self):
+        master = Ordbok(config_dir=self.tmp_dir, include_env=False,
+                        shared=True)
+        master.load()
+        path = os.environ['ORDBOK_SHARED_CONFIG']
+        self.assertEqual(path, master.shared_path)
+        self.assertIsNone(master.shared_config)
+        self.assertEqual(dict(SharedConfig(path)), dict(master))
+        os.remove(path)
+
+    def test_load_shared_missing_segment(self):
+        os.environ['ORDBOK_SHARED_CONFIG'] = self.shared_path
+        worker = Ordbok(config_dir=self.tmp_dir, include_env=False,
+                        shared=True)
+        worker.load()
+        self.assertEqual(worker['SECRET_KEY'], 'keep out!')
+        self.assertNotEqual(worker.shared_path, self.shared_path)
+        os.remove(worker.shared_path)
+
+    def test_reload_republishes(self):
+        master = Ordbok(config_dir=self.tmp_dir, include_env=False)
+        master.load()
+        master.share(self.shared_path)
+        worker = Ordbok(config_dir=self.tmp_dir, include_env=False,
+                        shared=True)
+        worker.load()
+
+        self.write_config_file(u'config.yml', u"""
+DEVELOPMENT:
+  SECRET_KEY: 'let me in'
+""")
+        self.assertFalse(worker.reload())
+        self.assertTrue(master.reload())
+        self.assertEqual(SharedConfig(self.shared_path)['SECRET_KEY'],
+                         'let me in')
+        self.assertEqual(worker.reload().changed, set(['SECRET_KEY']))
+        self.assertEqual(worker['SECRET_KEY'], 'let me in')
+        self.assertEqual(worker.watched_paths, [self.shared_path])
+
+    def test_flask_init_app(self):
+        master = Ordbok(config_dir=self.tmp_dir, include_env=False)
+        master.load()
+        master.share(self.shared_path)
+
+        app = Flask(__name__)
+        ordbok = FlaskOrdbok(config_dir=self.tmp_dir, include_env=False)
+        ordbok.init_app(app, shared=True)
+        ordbok.load()
+        self.assertIsNotNone(ordbok.shared_config)
+        self.assertEqual(ordbok['SECRET_KEY'], 'keep out!')